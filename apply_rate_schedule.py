@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+
+import argparse
+import socket
+import time
+
+from sipp import load_profile
+
+
+# Step a running sipp (started with -cp <port>) through a rate schedule using its remote control socket
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a rate_schedule.csv against a running SIPp instance through its remote control port")
+
+    parser.add_argument("-i", "--schedule", help="rate_schedule.csv written by convert_capture.py --load_profile",
+                        required=True)
+    parser.add_argument("--host", help="SIPp remote control address (optional)",
+                        default="127.0.0.1")
+    parser.add_argument("--port", help="SIPp remote control port, sipp -cp (optional)",
+                        type=int, default=load_profile.CONTROL_PORT)
+    parser.add_argument("-rp", "--rate_period", help="Rate period (ms) sipp was started with (optional)",
+                        type=int, default=1000)
+    parser.add_argument("--speed", help="Replay the schedule this many times faster than captured (optional)",
+                        type=float, default=1.0)
+    args = parser.parse_args()
+
+    schedule = load_profile.read_schedule(args.schedule)
+    control = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    start = time.monotonic()
+    for offset, calls_per_second in schedule:
+        delay = offset / args.speed - (time.monotonic() - start)
+        if delay > 0:
+            time.sleep(delay)
+
+        rate = round(calls_per_second * args.rate_period / 1000, 3)
+        control.sendto(f"cset rate {rate}".encode(), (args.host, args.port))
+        print(f"{offset:>10.1f}s rate {rate} calls / {args.rate_period}ms")
+
+    control.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sipp.agent as agent
+import sipp.capture as capture
+from sipp import synthetic
+from sipp.parser import SIP_Parser
+
+# Metrics where a bigger number is a regression
+LOWER_IS_BETTER = ["load_seconds", "render_seconds", "total_seconds", "peak_rss_mb"]
+# Stages taking less than this (seconds) in the baseline are too noisy to compare
+MIN_STAGE_SECONDS = 0.05
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in KB on linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# Runs inside a fresh worker process so the peak RSS belongs to this case alone
+def run_case(capture_file, backend, per_dialog, output_directory, packets, dialogs):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        parser = SIP_Parser(synthetic.CLIENT_ADDRESS, synthetic.SERVER_ADDRESS, False, backend,
+                            per_dialog, output_directory=output_directory)
+
+        start = time.perf_counter()
+        parser.load_pcap_as_dict(capture_file)
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if per_dialog:
+            parser.save_dialogs_to_xml("999912344321", "888812344321", "benchmark")
+        else:
+            parser.save_pcap_to_xml("999912344321", "888812344321", "benchmark")
+        render_seconds = time.perf_counter() - start
+
+    messages = sum(len(parser.pcap_dict[role]) for role in [agent.CLIENT, agent.SERVER])
+    total_seconds = load_seconds + render_seconds
+    return {
+        "backend": backend,
+        "per_dialog": per_dialog,
+        "dialogs": dialogs,
+        "packets": packets,
+        "messages": messages,
+        "load_seconds": round(load_seconds, 4),
+        "render_seconds": round(render_seconds, 4),
+        "total_seconds": round(total_seconds, 4),
+        "packets_per_second": round(packets / load_seconds, 1) if load_seconds else None,
+        "dialogs_per_second": round(dialogs / total_seconds, 1) if total_seconds else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": parser.metrics.as_dict()["stages"],
+    }
+
+
+def case_name(result):
+    return f"{result['backend']}/{result['dialogs']}{'/per_dialog' if result['per_dialog'] else ''}"
+
+
+# Compare against a stored baseline, returns a list of human readable regressions
+def compare(results, baseline, tolerance):
+    regressions = []
+    previous = {case_name(result): result for result in baseline["results"]}
+    for result in results:
+        base = previous.get(case_name(result))
+        if base is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if base.get(metric) and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{case_name(result)} {metric}: {result[metric]} vs baseline {base[metric]} "
+                    f"(+{(result[metric] / base[metric] - 1) * 100:.0f}%)")
+        for stage, timing in result.get("stages", {}).items():
+            base_seconds = base.get("stages", {}).get(stage, {}).get("seconds", 0)
+            if base_seconds >= MIN_STAGE_SECONDS and timing["seconds"] > base_seconds * (1 + tolerance):
+                regressions.append(
+                    f"{case_name(result)} {stage} stage: {timing['seconds']}s vs baseline {base_seconds}s "
+                    f"(+{(timing['seconds'] / base_seconds - 1) * 100:.0f}%)")
+    return regressions
+
+
+def stage_line(result):
+    return " ".join(f"{stage} {timing['seconds']:.3f}s" for stage, timing in result["stages"].items()
+                    if timing["calls"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the converter against synthetic SIP captures")
+
+    parser.add_argument("-d", "--dialogs", help="Comma separated list of dialog counts to benchmark (optional)",
+                        default="100,1000")
+    parser.add_argument("-m", "--mix", help="Call flow mix, i.e. basic=70,prack=10,cancel=10,reject=10 (optional)",
+                        default=None)
+    parser.add_argument("--sdp_lines", help="Extra attribute lines added to every SDP (optional)",
+                        type=int, default=0)
+    parser.add_argument("--proxies", help="Number of proxy hops between the client and server (optional)",
+                        type=int, default=0)
+    parser.add_argument("--rtp_packets", help="RTP packets per direction for every answered call (optional)",
+                        type=int, default=0)
+    parser.add_argument("--format", help="Capture format (optional)",
+                        choices=["pcap", "pcapng"], default="pcapng")
+    parser.add_argument("--backends", help="Comma separated capture backends to benchmark (optional)",
+                        default=capture.NATIVE)
+    parser.add_argument("--per_dialog", help="Also benchmark per dialog output",
+                        default=False, action="store_true")
+    parser.add_argument("-o", "--output", help="Write results as JSON to this file (optional)",
+                        default=None)
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against (optional)",
+                        default=None)
+    parser.add_argument("--tolerance", help="Allowed slowdown against the baseline before failing, 0.2 = 20%% (optional)",
+                        type=float, default=0.2)
+    args = parser.parse_args()
+
+    mix = synthetic.parse_mix(args.mix) if args.mix else None
+    backends = args.backends.split(",")
+    modes = [False, True] if args.per_dialog else [False]
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        for dialogs in [int(count) for count in args.dialogs.split(",")]:
+            capture_file = os.path.join(work_directory, f"synthetic_{dialogs}.{args.format}")
+            start = time.perf_counter()
+            packets = synthetic.write_capture(capture_file, dialogs, mix, args.sdp_lines, args.proxies,
+                                              rtp_packets=args.rtp_packets)
+            print(f"Generated {dialogs} dialogs / {packets} packets ({os.path.getsize(capture_file)} bytes) "
+                  f"in {time.perf_counter() - start:.2f}s")
+
+            for backend in backends:
+                for per_dialog in modes:
+                    output_directory = os.path.join(work_directory, f"{backend}_{dialogs}_{per_dialog}")
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        result = pool.submit(run_case, capture_file, backend, per_dialog,
+                                             output_directory, packets, dialogs).result()
+                    results.append(result)
+                    print(f"{case_name(result):<28} load {result['load_seconds']:>8.3f}s "
+                          f"render {result['render_seconds']:>8.3f}s "
+                          f"{result['packets_per_second']:>10} packets/s "
+                          f"{result['dialogs_per_second']:>9} dialogs/s "
+                          f"peak {result['peak_rss_mb']:>7} MB")
+                    print(f"{'':<28} {stage_line(result)}")
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "mix": mix or synthetic.DEFAULT_MIX,
+            "sdp_lines": args.sdp_lines,
+            "proxies": args.proxies,
+            "rtp_packets": args.rtp_packets,
+            "format": args.format,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+
+import argparse
+
+from sipp import service
+
+
+# Serve conversions over HTTP (or a Unix socket) from a pool of worker processes that are started up front
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local conversion service, POST a capture to /convert and get the SIPp scenarios back")
+
+    parser.add_argument("--host", help="Address to listen on (optional)",
+                        default=service.DEFAULT_HOST)
+    parser.add_argument("--port", help="Port to listen on (optional)",
+                        type=int, default=service.DEFAULT_PORT)
+    parser.add_argument("--unix_socket", "--unix-socket", help="Listen on this Unix domain socket instead of TCP (optional)",
+                        default=None)
+    parser.add_argument("-w", "--workers", help="Worker processes, conversions running at the same time (optional, defaults to the cpu count)",
+                        type=int, default=service.DEFAULT_WORKERS)
+    parser.add_argument("--max_capture_size", help="Largest capture accepted in MB (optional)",
+                        type=int, default=service.DEFAULT_MAX_CAPTURE_BYTES // (1024 * 1024))
+    parser.add_argument("--dissector_pool", "--dissector-pool", help="Keep a tshark running in every worker for backend=tshark requests instead of starting one per request",
+                        default=False, action="store_true")
+    args = parser.parse_args()
+
+    pool = service.Worker_Pool(args.workers, args.dissector_pool)
+    server = service.create_server(pool, args.host, args.port, args.unix_socket,
+                                   args.max_capture_size * 1024 * 1024)
+    print(f"Serving conversions on {args.unix_socket or f'{args.host}:{args.port}'} with {args.workers} warm workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+import argparse
+import sys
+from convert_capture import add_conversion_arguments, create_capture_filter, extra_roles, header_whitelist
+from sipp.parser import SIP_Parser
+from sipp import batch
+from sipp.capture import dissector_pool
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a directory (or glob) of pcap files to xml for SIPp in parallel")
+
+    parser.add_argument("-i", "--input",
+                        help="directory or glob pattern (quote it) of pcap input files", required=True)
+    parser.add_argument("-o", "--output_directory",
+                        help="root directory for the per capture output directories (optional)",
+                        default=SIP_Parser.OUTPUT_DIRECTORY)
+    parser.add_argument("-j", "--jobs", help="number of worker processes (optional, defaults to the cpu count)",
+                        type=int, default=None)
+    parser.add_argument("--dissector_pool", "--dissector-pool", help="With --backend tshark, keep one tshark running per worker and stream every capture through it instead of starting a new one per file",
+                        default=False, action="store_true")
+    parser.add_argument("--dissector_max_files", help="With --dissector_pool, captures handled by a tshark before it is restarted (optional)",
+                        type=int, default=dissector_pool.DEFAULT_MAX_FILES)
+    add_conversion_arguments(parser)
+    args = parser.parse_args()
+
+    files = batch.find_captures(args.input)
+    if len(files) == 0:
+        raise Exception(f"No capture files found matching {args.input}!")
+
+    options = {
+        "client": args.client,
+        "server": args.server,
+        "a_number": args.a_number,
+        "b_number": args.b_number,
+        "scen_name": args.scen_name,
+        "proxy": args.proxy,
+        "backend": args.backend,
+        "per_dialog": args.per_dialog,
+        "unique_flows": args.unique_flows,
+        "media": args.media,
+        "cache_directory": None if args.no_cache else args.cache_directory,
+        "cache_size": args.cache_size * 1024 * 1024,
+        "capture_filter": create_capture_filter(args),
+        "time_scale": args.time_scale,
+        "pause_threshold": args.pause_threshold,
+        "quiet": args.quiet,
+        "keep_headers": header_whitelist(args),
+        "roles": extra_roles(args),
+        "dissector_pool": args.dissector_pool,
+        "dissector_max_files": args.dissector_max_files,
+        "load_profile": args.load_profile,
+        "load_interval": args.load_interval
+    }
+
+    summary = batch.run_batch(files, args.output_directory, options, args.jobs)
+    print(
+        f"Converted {summary['succeeded']}/{summary['files']} captures ({summary['failed']} failed) in {summary['wall_seconds']}s")
+
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
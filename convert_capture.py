@@ -1,19 +1,30 @@
 #!/usr/bin/python3
 
 import argparse
-from sipp.parser import SIP_Parser
+import cProfile
+import os
+import pstats
+import sys
+import sipp.capture as capture
+from sipp import cache
+from sipp import live
+from sipp import load_profile
+from sipp import loopback
+from sipp import roles
+from sipp import timing
+from sipp.capture import follow
+from sipp.capture.capture_filter import Capture_Filter, parse_frame_range
+from sipp.parser import SIP_Parser, DEFAULT_HEADER_WHITELIST
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Convert pcap file to xml for SIPp")
-
-    parser.add_argument("-i", "--input_file",
-                        help="path to pcap input file", required=True)
+# Options shared by single file and batch conversion
+def add_conversion_arguments(parser):
     parser.add_argument("-c", "--client",
-                        help="IP address of the A Party Caller", required=True)
+                        help="IP address of the A Party Caller, or a comma separated list of addresses / CIDR ranges", required=True)
     parser.add_argument("-s", "--server",
-                        help="IP address of the B Party Caller", required=True)
+                        help="IP address of the B Party Caller, or a comma separated list of addresses / CIDR ranges", required=True)
+    parser.add_argument("--role", help="Extra role as LABEL=ADDRESS[,ADDRESS|CIDR...] i.e. a proxy leg or trunk, extracted in the same pass into its own LABEL.xml scenario (repeatable, optional)",
+                        action="append", default=[])
     parser.add_argument("-a", "--a_number", help="A number (optional)",
                         default="999912344321")
     parser.add_argument("-b", "--b_number", help="B number (optional)",
@@ -22,13 +33,180 @@ def main():
                         default="SIPp Scenario")
     parser.add_argument("-p", "--proxy", help="Flag to enable proxy support in generated XML, for use with kamailio or some other SIP proxy in between A/B parties",
                         default=False, action="store_true")
+    parser.add_argument("--backend", help="Capture backend, pyshark (tshark dissection), tshark (single tshark process streaming only the required fields) or native (built in pcap / pcapng reader, no tshark required)",
+                        choices=capture.BACKENDS, default=capture.PYSHARK)
+    parser.add_argument("-d", "--per_dialog", help="Write one UAC/UAS scenario pair per dialog (Call-ID) plus an index.json instead of a single pair",
+                        default=False, action="store_true")
+    parser.add_argument("-u", "--unique_flows", "--unique-flows", help="Per dialog output, but only render one scenario pair per distinct call flow, flows.json lists every flow with its count and sample Call-IDs (implies --per_dialog)",
+                        default=False, action="store_true")
+    parser.add_argument("--media", help="Copy every call's RTP / RTCP out of the capture into per call pcap files and replay them from the scenarios (play_pcap_audio / play_pcap_video after the ACK)",
+                        default=False, action="store_true")
+    parser.add_argument("--load_profile", "--load-profile", help="Also derive call rates, concurrency and durations from the capture, writes load_profile.json (recommended sipp -r/-rp/-l/-m) and rate_schedule.csv",
+                        default=False, action="store_true")
+    parser.add_argument("--load_interval", help="Seconds per bucket when measuring call arrival rates for --load_profile (optional)",
+                        type=float, default=load_profile.DEFAULT_INTERVAL)
+    parser.add_argument("--no_cache", "--no-cache", help="Always dissect the capture, don't read or write the parse cache",
+                        default=False, action="store_true")
+    parser.add_argument("--cache_directory", help="Parse cache location (optional)",
+                        default=cache.DEFAULT_DIRECTORY)
+    parser.add_argument("--cache_size", help="Parse cache size limit in MB, least recently used entries are evicted (optional)",
+                        type=int, default=cache.DEFAULT_MAX_BYTES // (1024 * 1024))
+
+    parser.add_argument("--sip_ports", help="Comma separated UDP ports carrying SIP, other traffic is never dissected (optional)",
+                        default=None)
+    parser.add_argument("--start_time", help="Ignore packets earlier than this many seconds from the start of the capture (optional)",
+                        type=float, default=None)
+    parser.add_argument("--end_time", help="Ignore packets later than this many seconds from the start of the capture (optional)",
+                        type=float, default=None)
+    parser.add_argument("--frame_range", help="Only process frames START-END (1 based, either end may be omitted) (optional)",
+                        default=None)
+    parser.add_argument("--time_scale", "--time-scale", help="Scale the pauses taken from the capture timestamps, 1 replays at real speed, 0.01 squeezes a 3 minute call into ~2 seconds, 0 disables pauses (optional)",
+                        type=float, default=timing.DEFAULT_TIME_SCALE)
+    parser.add_argument("--pause_threshold", help="Only pause for (scaled) gaps of at least this many milliseconds (optional)",
+                        type=int, default=timing.DEFAULT_PAUSE_THRESHOLD_MS)
+    parser.add_argument("--keep_headers", "--keep-headers", help="Comma separated SIP headers kept on every parsed message, any others are dropped while parsing (optional)",
+                        default=",".join(DEFAULT_HEADER_WHITELIST))
+    parser.add_argument("-q", "--quiet", help="Don't log every packet as it is captured",
+                        default=False, action="store_true")
+
+
+# Build the dissector filter for the selected endpoints / ports / time window
+def create_capture_filter(args):
+    ports = [int(port) for port in args.sip_ports.split(",")] if args.sip_ports else None
+    first_frame, last_frame = parse_frame_range(args.frame_range)
+    return Capture_Filter(roles.Role_Index(args.client, args.server, extra_roles(args)).addresses(),
+                          ports, args.start_time, args.end_time, first_frame, last_frame)
+
+
+def extra_roles(args):
+    return [roles.parse_role(role) for role in args.role]
+
+
+def header_whitelist(args):
+    return tuple(name.strip() for name in args.keep_headers.split(",") if name.strip())
+
+
+# Build the parse cache requested on the command line, None when caching is disabled
+def create_cache(args):
+    if args.no_cache:
+        return None
+    return cache.Parse_Cache(args.cache_directory, args.cache_size * 1024 * 1024)
+
+
+# Load and parse pcap file, then write the scenarios
+def convert(args):
+    parser = SIP_Parser(args.client, args.server, args.proxy, args.backend,
+                        args.per_dialog, cache=create_cache(args),
+                        capture_filter=create_capture_filter(args),
+                        time_scale=args.time_scale, pause_threshold=args.pause_threshold,
+                        quiet=args.quiet, unique_flows=args.unique_flows,
+                        extract_media=args.media,
+                        memory_limit=args.memory_limit * 1024 * 1024 if args.memory_limit else None,
+                        spill_directory=args.spill_directory, spill_buckets=args.spill_buckets,
+                        header_whitelist=header_whitelist(args), jobs=args.jobs, roles=extra_roles(args))
+    if args.follow or args.interface:
+        parser.follow_pcap(args.input_file, args.a_number, args.b_number, args.scen_name,
+                           args.interface, args.idle_timeout, args.max_dialogs,
+                           args.poll_interval, args.exit_after_idle)
+        return parser
+    if args.pipeline and (args.per_dialog or args.unique_flows) and not args.memory_limit:
+        parser.pipeline_to_xml(args.input_file, args.a_number, args.b_number, args.scen_name)
+        return parser
+
+    parser.load_pcap_as_dict(args.input_file, args.pipeline)
+    if args.memory_limit:
+        parser.save_spilled_to_xml(args.a_number, args.b_number, args.scen_name)
+    elif args.per_dialog or args.unique_flows:
+        parser.save_dialogs_to_xml(args.a_number, args.b_number,
+                                   args.scen_name)
+    else:
+        parser.save_pcap_to_xml(args.a_number, args.b_number,
+                                args.scen_name)
+    if args.load_profile:
+        parser.save_load_profile(args.load_interval)
+    return parser
+
+
+# Play the scenarios just written against each other over loopback UDP, True when every pair passed. This
+# only shows each UAC / UAS pair is self consistent, not that it matches the call in the capture
+def validate(args, parser):
+    if args.per_dialog or args.unique_flows or args.memory_limit:
+        pairs = loopback.index_pairs(os.path.join(parser.output_directory, "index.json"))
+    else:
+        pairs = [(parser.output_directory, os.path.join(parser.output_directory, "UAC.xml"),
+                  os.path.join(parser.output_directory, "UAS.xml"))]
+    summary, results = loopback.Loopback_Runner().run(pairs)
+    print(loopback.summary_text(summary, results, verbose=False))
+    return summary["passed_pairs"] == summary["pairs"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert pcap file to xml for SIPp")
+
+    parser.add_argument("-i", "--input_file",
+                        help="path to pcap input file, with --follow a growing file or a quoted glob of rotating ring buffer files")
+    add_conversion_arguments(parser)
+    parser.add_argument("-f", "--follow", help="Keep reading the input as it grows, writing every call as soon as it finishes",
+                        default=False, action="store_true")
+    parser.add_argument("--interface", help="Capture live from this interface (dumpcap ring buffer) instead of reading a file, implies --follow (optional)",
+                        default=None)
+    parser.add_argument("--idle_timeout", help="With --follow, write out calls that have been quiet for this many seconds (optional)",
+                        type=float, default=live.DEFAULT_IDLE_TIMEOUT)
+    parser.add_argument("--max_dialogs", help="With --follow, calls in progress kept in memory before the least recently active is written out (optional)",
+                        type=int, default=live.DEFAULT_MAX_DIALOGS)
+    parser.add_argument("--poll_interval", help="With --follow, seconds between checks for new data (optional)",
+                        type=float, default=follow.POLL_INTERVAL)
+    parser.add_argument("--exit_after_idle", help="With --follow, stop once nothing new has been read for this many seconds (optional)",
+                        type=float, default=None)
+    parser.add_argument("--memory_limit", "--memory-limit", help="Bounded memory mode for very large captures, parsed messages beyond this many MB are spilled to disk in Call-ID buckets which are then rendered one at a time (implies --per_dialog, output goes to scenarios/bucket_NNNN/)",
+                        type=int, default=None)
+    parser.add_argument("--spill_directory", help="With --memory_limit, where the buckets are written (optional, defaults to a temporary directory)",
+                        default=None)
+    parser.add_argument("--spill_buckets", help="With --memory_limit, number of buckets (optional, defaults to enough for each to fit the limit)",
+                        type=int, default=None)
+    parser.add_argument("-j", "--jobs", help="Worker processes parsing chunks of the capture in parallel (native backend) and, with --memory_limit, rendering buckets (optional)",
+                        type=int, default=1)
+    parser.add_argument("--pipeline", help="Read, parse (on --jobs worker processes) and write as overlapping stages with bounded queues, with --per_dialog / --unique_flows every call is written as soon as it finishes while the capture is still being read (native / tshark backends)",
+                        default=False, action="store_true")
+    parser.add_argument("--metrics", help="Print a per stage timing / counter summary once the conversion is done",
+                        default=False, action="store_true")
+    parser.add_argument("--metrics_json", "--metrics-json", help="Write per stage timings / counters as JSON to this file (optional)",
+                        default=None)
+    parser.add_argument("--profile", help="Run the conversion under cProfile and dump the stats to this file (optional)",
+                        default=None)
+    parser.add_argument("--validate", help="Once converted, play every UAC scenario against its UAS over loopback UDP (see validate_scenarios.py) and exit non zero if any pair can't be played through. Only checks each pair is self consistent and loads, not that it matches the capture",
+                        default=False, action="store_true")
     args = parser.parse_args()
 
-    # Load and parse pcap file
-    parser = SIP_Parser(args.client, args.server, args.proxy)
-    parser.load_pcap_as_dict(args.input_file)
-    parser.save_pcap_to_xml(args.a_number, args.b_number,
-                            args.scen_name)
+    if args.input_file is None and args.interface is None:
+        parser.error("one of -i/--input_file or --interface is required")
+    if args.memory_limit and (args.follow or args.interface or args.unique_flows or args.media or args.load_profile):
+        parser.error("--memory_limit can't be combined with --follow, --interface, --unique_flows, --media or --load_profile")
+    if args.pipeline and (args.follow or args.interface):
+        parser.error("--pipeline can't be combined with --follow or --interface, which already write calls as they finish")
+    if args.pipeline and args.backend == capture.PYSHARK:
+        parser.error("--pipeline needs the native or tshark backend")
+    if args.pipeline and (args.per_dialog or args.unique_flows) and (args.media or args.load_profile):
+        parser.error("--pipeline with --per_dialog / --unique_flows can't be combined with --media or --load_profile, they need the whole capture parsed first")
+    if args.validate and (args.follow or args.interface):
+        parser.error("--validate can't be combined with --follow or --interface, run validate_scenarios.py on the output instead")
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        parser = profiler.runcall(convert, args)
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(25)
+        print(f"Profile written to {args.profile}")
+    else:
+        parser = convert(args)
+
+    if args.metrics:
+        print(parser.metrics.summary())
+    if args.metrics_json:
+        parser.metrics.save(args.metrics_json)
+    if args.validate and not validate(args, parser):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -1,2 +1,4 @@
 CLIENT = "UAC"
 SERVER = "UAS"
+# Default roles, a Role_Index (see sipp.roles) can add more
+ROLES = (CLIENT, SERVER)
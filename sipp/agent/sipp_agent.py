@@ -1,17 +1,20 @@
 import sipp.agent
+from sipp.agent.xml_writer import Scenario_Writer, formatted_action
+from sipp.metrics import Metrics, FORMAT, RENDER
 from sipp.sip_methods import Methods
 
-import xmlformatter
+import time
 
 # This agent class works to convert the dictionary information passed from the parser into XML that SIPP can understand
 class SIPP_Agent:
-    def __init__(self, number, scenario_name, proxy, is_uac):
+    def __init__(self, number, scenario_name, proxy, is_uac, metrics=None):
 
         self.number = number
         self.scenario_name = scenario_name
 
-        # SIPP Scenario container
+        # SIPP Scenario container (formatted actions), unused once the agent is streaming straight to an output
         self.scenario = []
+        self.writer = None
 
         # XML Generators
         self.sip_methods = Methods()
@@ -22,8 +25,48 @@ class SIPP_Agent:
         self.first_invite = True
         self.is_uas = not is_uac
 
+        # Render / format / write timings, usually shared with the parser
+        self.metrics = metrics if metrics is not None else Metrics()
+
     def add_scenario(self, content):
-        self.scenario.append(content)
+        start = time.perf_counter()
+        text = formatted_action(content)
+        self.metrics.add(FORMAT, time.perf_counter() - start, len(content), len(text))
+        self.add_formatted(text)
+
+    # Add an action that is already formatted i.e. a rendered sip_methods template
+    def add_formatted(self, text):
+        if self.writer is not None:
+            self.writer.write(text)
+        else:
+            self.scenario.append(text)
+
+    # Write every action straight to the sink (path or writable text / bytes object) as it is produced,
+    # must be finished with close()
+    def stream(self, sink):
+        self.writer = Scenario_Writer(sink, self.metrics)
+        self.writer.begin(self.scenario_name)
+
+        # Flush anything queued before streaming started
+        for action in self.scenario:
+            self.writer.write(action)
+        self.scenario = []
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.writer.end()
+        self.writer.close()
+        self.writer = None
+
+    # Write the whole scenario to outfile (path or writable text / bytes object) in one go
+    def save(self, outfile):
+        self.stream(outfile)
+        self.close()
+
+    # Re-indent a raw action the way it is written out, see xml_writer.format_action
+    def parse_scenario(self, scen):
+        return formatted_action(scen)
 
     # Keep track of our method increments, useful for responding to correct branch
     def increment(self):
@@ -36,14 +79,15 @@ class SIPP_Agent:
     def is_method(self, method):
         return method in self.sip_methods.call
 
-    def send(self, method, arguments):
+    # start_rtd names a response time measurement that the matching recv_response stops
+    def send(self, method, arguments, start_rtd=None):
         arguments["proxy"] = self.proxy
-        self.add_scenario(f"""
-        <send>
-            {self.sip_methods.call[method](self, arguments)}
-        </send>
-        """)
-    
+        start = time.perf_counter()
+        action = self.sip_methods.render(method, self, arguments)
+        if start_rtd is not None:
+            action = action.replace("<send>", f"<send start_rtd=\"{start_rtd}\">", 1)
+        self.metrics.add(RENDER, time.perf_counter() - start, bytes_out=len(action))
+        self.add_formatted(action)
         self.increment()
 
     def recv(self, method):
@@ -63,7 +107,7 @@ class SIPP_Agent:
         """)
         self.increment()
 
-    def recv_response(self, response_code, optional="false"):
+    def recv_response(self, response_code, optional="false", rtd=None):
         if (response_code in ["180", "183", "200"]) and self.proxy:
             rrs = "rrs=\"true\""
         else:
@@ -72,6 +116,9 @@ class SIPP_Agent:
         if (response_code in ["100"]):
             optional = "true"
 
+        if rtd is not None:
+            rrs = f"{rrs} rtd=\"{rtd}\"".strip()
+
         self.add_scenario(f"""
         <recv response="{response_code}" optional="{optional}" {rrs}></recv>
         """)
@@ -82,85 +129,26 @@ class SIPP_Agent:
             contact = "[$req_to][local_ip]:[local_port];transport=[transport]"
         else:
             contact = "<sip:[local_ip]:[local_port];transport=[transport]>"
-        self.add_scenario(f"""
-        <send>
-            <![CDATA[
-                {response_code}
-                {"[last_Via:]" if self.proxy else ""}
-                [last_From:]
-                [last_To:];tag=[call_number]
-                [last_Call-ID:]
-                [last_CSeq:]
-                {"[last_Record-Route:]" if self.proxy else ""}
-                Contact: {contact} 
-                {"Content-Type: application/sdp" if arguments["sdp"] != "" else ""}
-                Content-Length: [len]
-                
-                {arguments["sdp"]}
-            ]]>
-        </send>
-        """)
+        arguments = dict(arguments, proxy=self.proxy, response_code=response_code, contact=contact)
+        start = time.perf_counter()
+        action = self.sip_methods.render(None, self, arguments)
+        self.metrics.add(RENDER, time.perf_counter() - start, bytes_out=len(action))
+        self.add_formatted(action)
 
         self.increment()
 
+    # Replay a pcap captured for this call (play_pcap_audio / play_pcap_video), SIPp streams it in the
+    # background while the scenario carries on
+    def play_media(self, action, path):
+        self.add_scenario(f"""
+        <nop>
+            <action>
+                <exec {action}="{path}"/>
+            </action>
+        </nop>
+        """)
+
     def wait(self, time_ms):
         self.add_scenario(f"""
         <pause milliseconds="{time_ms}"/>
         """)
-
-    # Parse a line and format if required
-    def parse_scenario(self, scen):
-        CDATA = False
-        INDENTATION = 4
-
-        current_indentation = 0
-        output = ""
-        pre_sdp = True
-        sdp_start = 0
-        index = -1
-
-        for line in scen.splitlines():
-            index += 1
-
-            if "<![CDATA[" in line:
-                CDATA = True
-                current_indentation = len(line) - len(line.lstrip())
-                output += '\n' + (' ' * current_indentation + line.lstrip())
-            elif CDATA and "]]>" in line:
-                CDATA = False
-                output += '\n' + (' ' * current_indentation + line.lstrip())
-            elif CDATA:
-                # Log where sdp starts so we can strip extra whitespace
-                if "Content-Length: [len]" in line:
-                    pre_sdp = False
-                    sdp_start = index + 1
-
-                # Strip empty lines pre sdp
-                if pre_sdp and (line.isspace() or len(line.lstrip()) == 0):
-                    continue
-                # Strip empty lines after sdp starts
-                elif index > sdp_start and (line.isspace() or len(line.lstrip()) == 0):
-                    continue
-                else:
-                    output += '\n' + \
-                        (' ' * (current_indentation + INDENTATION) + line.lstrip())
-            else:
-                output += '\n' + (line.lstrip())
-
-        return output
-
-    def save(self, outfile):
-        xml_header = "<?xml version=\"1.0\" encoding=\"ISO-8859-1\" ?>\n\n"
-        header = f"<scenario name=\"{self.scenario_name}\">"
-        header_close = "\n</scenario>"
-
-        output_string = ""
-        output_string += xml_header
-        output_string += header
-        # Write each scenario action
-        for action in self.scenario:
-            output_string += self.parse_scenario(action)
-        output_string += header_close
-
-        with open(outfile, 'w') as output:
-            output.write(output_string)
@@ -0,0 +1,103 @@
+from sipp.metrics import Metrics, WRITE
+
+from functools import lru_cache
+import io
+import time
+
+XML_HEADER = "<?xml version=\"1.0\" encoding=\"ISO-8859-1\" ?>\n\n"
+ENCODING = "ISO-8859-1"
+BUFFER_SIZE = 1024 * 1024
+
+CDATA_INDENTATION = 4
+
+FORMAT_CACHE_SIZE = 1024
+
+
+# Re-indent a single scenario action line by line, yields output chunks instead of building a string
+def format_action(scen):
+    CDATA = False
+
+    current_indentation = 0
+    pre_sdp = True
+    sdp_start = 0
+
+    for index, line in enumerate(scen.splitlines()):
+        if "<![CDATA[" in line:
+            CDATA = True
+            current_indentation = len(line) - len(line.lstrip())
+            yield '\n' + ' ' * current_indentation + line.lstrip()
+        elif CDATA and "]]>" in line:
+            CDATA = False
+            yield '\n' + ' ' * current_indentation + line.lstrip()
+        elif CDATA:
+            # Log where sdp starts so we can strip extra whitespace
+            if "Content-Length: [len]" in line:
+                pre_sdp = False
+                sdp_start = index + 1
+
+            # Strip empty lines pre sdp
+            if pre_sdp and (line.isspace() or len(line.lstrip()) == 0):
+                continue
+            # Strip empty lines after sdp starts
+            elif index > sdp_start and (line.isspace() or len(line.lstrip()) == 0):
+                continue
+            else:
+                yield '\n' + ' ' * (current_indentation + CDATA_INDENTATION) + line.lstrip()
+        else:
+            yield '\n' + line.lstrip()
+
+
+# Formatted action as a single string, small recurring actions (<recv>, <pause>) are memoized
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def formatted_action(scen):
+    return "".join(format_action(scen))
+
+
+# Streams a scenario document to a path or any writable (text or bytes) sink as actions are produced,
+# nothing but the current action is ever held in memory
+class Scenario_Writer:
+
+    def __init__(self, sink, metrics=None):
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.owned = False
+        self.wrapped = False
+        if isinstance(sink, (str, bytes)) or hasattr(sink, "__fspath__"):
+            self.output = open(sink, 'w', encoding=ENCODING, errors="replace", buffering=BUFFER_SIZE)
+            self.owned = True
+        elif isinstance(sink, io.TextIOBase):
+            self.output = sink
+        else:
+            # Binary sink (file opened with "wb", BytesIO, socket file...)
+            self.output = io.TextIOWrapper(sink, encoding=ENCODING, errors="replace")
+            self.wrapped = True
+
+        self.closed = False
+
+    def begin(self, scenario_name):
+        self.write(XML_HEADER)
+        self.write(f"<scenario name=\"{scenario_name}\">")
+
+    # Write an action that has already been formatted
+    def write(self, text):
+        start = time.perf_counter()
+        self.output.write(text)
+        self.metrics.add(WRITE, time.perf_counter() - start, bytes_out=len(text))
+
+    def end(self):
+        self.write("\n</scenario>")
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        start = time.perf_counter()
+        if self.owned:
+            self.output.close()
+        elif self.wrapped:
+            # Leave the caller's binary sink open
+            self.output.flush()
+            self.output.detach()
+        else:
+            self.output.flush()
+        self.metrics.add(WRITE, time.perf_counter() - start, calls=0)
@@ -0,0 +1,78 @@
+import sipp.capture as capture
+from sipp.parser import SIP_Parser
+
+import contextlib
+import io
+import os
+import tempfile
+
+DEFAULT_A_NUMBER = "999912344321"
+DEFAULT_B_NUMBER = "888812344321"
+DEFAULT_SCENARIO_NAME = "SIPp Scenario"
+
+
+# Capture content from a path, bytes or a readable binary file object: a path is passed on as is,
+# anything else ends up as bytes
+def read_capture(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, str) or hasattr(source, "__fspath__"):
+        return os.fspath(source)
+    if hasattr(source, "read"):
+        return source.read()
+    raise ValueError(f"Unsupported capture source {type(source).__name__}, expected a path, bytes or a file object")
+
+
+# Path or bytes the selected backend can read, tshark (without a dissector pool) / pyshark need a file so
+# in memory captures are spooled to a temporary one for them
+@contextlib.contextmanager
+def backend_input(source, backend, pooled=False):
+    data = read_capture(source)
+    if isinstance(data, str) or backend == capture.NATIVE or (backend == capture.TSHARK and pooled):
+        yield data
+        return
+
+    spool = tempfile.NamedTemporaryFile(suffix=".pcap", delete=False)
+    try:
+        with spool:
+            spool.write(data)
+        yield spool.name
+    finally:
+        os.remove(spool.name)
+
+
+# Parse a capture without writing anything, the parser's own logging goes to log (a text stream, discarded
+# by default)
+def load(source, client, server, proxy=False, backend=capture.NATIVE, per_dialog=False, log=None, **options):
+    options.setdefault("quiet", True)
+    parser = SIP_Parser(client, server, proxy, backend, per_dialog, log=log if log is not None else io.StringIO(),
+                        **options)
+    with backend_input(source, backend, options.get("dissector_pool") is not None) as capture_input:
+        parser.load_pcap_as_dict(capture_input)
+    return parser
+
+
+# Stream the UAC / UAS pair into sinks ({role: path or writable text / binary stream}), returns the parser
+def stream(source, sinks, client, server, a_number=DEFAULT_A_NUMBER, b_number=DEFAULT_B_NUMBER,
+           scenario_name=DEFAULT_SCENARIO_NAME, log=None, **options):
+    parser = load(source, client, server, log=log, **options)
+    parser.stream_pcap_to_xml(sinks, a_number, b_number, scenario_name)
+    return parser
+
+
+# Convert a capture (path, bytes or file object) to {role: scenario XML bytes or None}, one entry per role
+# (UAC, UAS and any extra roles). Nothing touches the disk unless a non native backend needs the capture as
+# a file
+def convert(source, client, server, a_number=DEFAULT_A_NUMBER, b_number=DEFAULT_B_NUMBER,
+            scenario_name=DEFAULT_SCENARIO_NAME, log=None, **options):
+    parser = load(source, client, server, log=log, **options)
+    sinks = {role: io.BytesIO() for role in parser.roles}
+    parser.stream_pcap_to_xml(sinks, a_number, b_number, scenario_name)
+    return {role: sink.getvalue() if parser.pcap_dict[role] else None for role, sink in sinks.items()}
+
+
+# Per dialog equivalent of convert, a list of (dialog description, {role: scenario XML bytes or None})
+def convert_dialogs(source, client, server, a_number=DEFAULT_A_NUMBER, b_number=DEFAULT_B_NUMBER,
+                    scenario_name=DEFAULT_SCENARIO_NAME, log=None, **options):
+    parser = load(source, client, server, per_dialog=True, log=log, **options)
+    return list(parser.dialogs_to_xml_bytes(a_number, b_number, scenario_name))
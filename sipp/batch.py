@@ -0,0 +1,139 @@
+from sipp.cache import Parse_Cache
+from sipp.parser import SIP_Parser, DEFAULT_HEADER_WHITELIST
+from sipp.capture import dissector_pool
+import sipp.capture as capture
+from sipp import timing
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import glob
+import json
+import os
+import time
+import traceback
+
+CAPTURE_EXTENSIONS = (".pcap", ".pcapng", ".cap")
+
+
+# Resolve a directory or glob pattern into a sorted list of capture files
+def find_captures(source):
+    if os.path.isdir(source):
+        files = [os.path.join(source, name) for name in os.listdir(source)
+                 if name.lower().endswith(CAPTURE_EXTENSIONS)]
+    else:
+        files = glob.glob(source, recursive=True)
+
+    return sorted(path for path in files if os.path.isfile(path))
+
+
+# Give every capture its own output directory, rotated captures can share a base name
+def output_directories(files, output_root):
+    directories = {}
+    used = set()
+    for path in files:
+        name = os.path.basename(path)
+        for extension in CAPTURE_EXTENSIONS:
+            if name.lower().endswith(extension):
+                name = name[:-len(extension)]
+                break
+
+        candidate = name
+        counter = 1
+        while candidate in used:
+            candidate = f"{name}_{counter}"
+            counter += 1
+        used.add(candidate)
+        directories[path] = os.path.join(output_root, candidate)
+
+    return directories
+
+
+# tshark kept running in this worker process across the captures it converts, when asked for
+def worker_dissector_pool(options):
+    if not options.get("dissector_pool") or options["backend"] != capture.TSHARK:
+        return None
+    return dissector_pool.shared_pool(1, options.get("dissector_max_files", dissector_pool.DEFAULT_MAX_FILES))
+
+
+# Worker entry point, runs a full conversion for a single capture inside its own process
+def convert_file(input_file, output_directory, options):
+    result = {
+        "input": input_file,
+        "output": output_directory,
+        "status": "ok",
+        "error": None,
+        "seconds": 0.0,
+        "packets": {}
+    }
+
+    start = time.perf_counter()
+    os.makedirs(output_directory, exist_ok=True)
+
+    # Per packet logging goes to a log file next to the scenarios rather than interleaving on stdout
+    with open(os.path.join(output_directory, "convert.log"), 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            cache = None
+            if options.get("cache_directory") is not None:
+                cache = Parse_Cache(options["cache_directory"], options["cache_size"])
+
+            parser = SIP_Parser(options["client"], options["server"], options["proxy"],
+                                options["backend"], options["per_dialog"],
+                                output_directory=output_directory, cache=cache,
+                                capture_filter=options.get("capture_filter"),
+                                time_scale=options.get("time_scale", timing.DEFAULT_TIME_SCALE),
+                                pause_threshold=options.get("pause_threshold", timing.DEFAULT_PAUSE_THRESHOLD_MS),
+                                quiet=options.get("quiet", False),
+                                unique_flows=options.get("unique_flows", False),
+                                extract_media=options.get("media", False),
+                                header_whitelist=options.get("keep_headers", DEFAULT_HEADER_WHITELIST),
+                                dissector_pool=worker_dissector_pool(options),
+                                roles=options.get("roles", ()))
+            parser.load_pcap_as_dict(input_file)
+            if options["per_dialog"] or options.get("unique_flows"):
+                parser.save_dialogs_to_xml(options["a_number"], options["b_number"],
+                                           options["scen_name"])
+            else:
+                parser.save_pcap_to_xml(options["a_number"], options["b_number"],
+                                        options["scen_name"])
+            if options.get("load_profile"):
+                parser.save_load_profile(options["load_interval"])
+            result["packets"] = {role: len(messages) for role, messages in parser.pcap_dict.items()}
+            result["metrics"] = parser.metrics.as_dict()
+        except Exception as e:
+            traceback.print_exc(file=log)
+            result["status"] = "failed"
+            result["error"] = str(e)
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+# Spread the captures over a process pool and write a summary.json into the output root
+def run_batch(files, output_root, options, jobs=None):
+    directories = output_directories(files, output_root)
+    os.makedirs(output_root, exist_ok=True)
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(convert_file, path, directories[path], options) for path in files]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{len(results)}/{len(files)}] {result['status']:<6} {result['seconds']:>8.2f}s {result['input']}")
+
+    results.sort(key=lambda result: result["input"])
+    summary = {
+        "files": len(results),
+        "succeeded": sum(1 for result in results if result["status"] == "ok"),
+        "failed": sum(1 for result in results if result["status"] != "ok"),
+        "jobs": jobs or os.cpu_count(),
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "cpu_seconds": round(sum(result["seconds"] for result in results), 3),
+        "results": results
+    }
+
+    with open(os.path.join(output_root, "summary.json"), 'w') as output:
+        json.dump(summary, output, indent=4)
+
+    return summary
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "sippConverter")
+DEFAULT_MAX_BYTES = 2048 * 1024 * 1024
+
+HASH_CHUNK = 1024 * 1024
+CACHE_EXTENSION = ".cache"
+
+
+# Hash of the capture contents, read in chunks so multi GB files don't need to fit in memory
+def content_hash(input_file):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(input_file, "rb") as capture:
+        for chunk in iter(lambda: capture.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Persistent cache of parsed per role message lists, evicted least recently used first once the
+# cache directory grows past max_bytes. Entries are zlib compressed pickles
+class Parse_Cache:
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    # Build the cache key, any change to the capture, the endpoints or the parser invalidates the entry
+    def key(self, input_file, *parameters):
+        stat = os.stat(input_file)
+        digest = hashlib.blake2b(digest_size=20)
+        for part in (stat.st_size, stat.st_mtime_ns, content_hash(input_file)) + parameters:
+            digest.update(repr(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def get(self, key):
+        path = self.__path(key)
+        try:
+            with open(path, "rb") as entry:
+                data = pickle.loads(zlib.decompress(entry.read()))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("Discarding unreadable cache entry!", e)
+            self.__remove(path)
+            return None
+
+        # Touch the entry so it counts as recently used
+        os.utime(path)
+        return data
+
+    def put(self, key, data):
+        payload = zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        if len(payload) > self.max_bytes:
+            return
+
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "wb") as entry:
+            entry.write(payload)
+        os.replace(temp_path, self.__path(key))
+
+        self.evict()
+
+    # Remove least recently used entries until the cache fits within max_bytes
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.__remove(path)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(CACHE_EXTENSION):
+                self.__remove(os.path.join(self.directory, name))
+
+    def __remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
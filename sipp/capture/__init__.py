@@ -0,0 +1,5 @@
+PYSHARK = "pyshark"
+NATIVE = "native"
+TSHARK = "tshark"
+
+BACKENDS = [PYSHARK, NATIVE, TSHARK]
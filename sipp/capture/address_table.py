@@ -0,0 +1,98 @@
+import ipaddress
+import socket
+
+# Addresses remembered per table, the cache is simply dropped when it fills up
+MAX_CACHED = 65536
+
+
+# Normalize an IPv4 address or CIDR range, a single address (or /32) stays a plain address
+def parse_endpoint(text):
+    try:
+        network = ipaddress.IPv4Network(text.strip(), strict=False)
+    except ValueError:
+        raise ValueError(f"Invalid endpoint {text!r}, expected an IPv4 address or CIDR range")
+    if network.prefixlen == 32:
+        return str(network.network_address)
+    return str(network)
+
+
+# Comma separated string or list of (comma separated) endpoints -> list of normalized endpoints, duplicates
+# dropped
+def parse_endpoints(endpoints):
+    if isinstance(endpoints, str):
+        endpoints = [endpoints]
+    parsed = []
+    for endpoint in (part for entry in endpoints for part in entry.split(",")):
+        if not endpoint.strip():
+            continue
+        endpoint = parse_endpoint(endpoint)
+        if endpoint not in parsed:
+            parsed.append(endpoint)
+    if not parsed:
+        raise ValueError("Expected at least one IPv4 address or CIDR range")
+    return parsed
+
+
+def is_network(endpoint):
+    return "/" in endpoint
+
+
+# IPv4 addresses and CIDR ranges mapped to values. Single addresses are one dict lookup, ranges are looked
+# up by masking the address once per distinct prefix length, and every answer is cached per address
+class Address_Table:
+
+    def __init__(self):
+        # packed address -> [values]
+        self.exact = {}
+        # prefix length -> (mask, {network as int: [values]}), longest prefix first
+        self.networks = {}
+        self.masks = []
+        self.cache = {}
+
+    def __bool__(self):
+        return bool(self.exact or self.networks)
+
+    def add(self, endpoint, value):
+        endpoint = parse_endpoint(endpoint)
+        if is_network(endpoint):
+            network = ipaddress.IPv4Network(endpoint)
+            _, table = self.networks.setdefault(network.prefixlen, (int(network.netmask), {}))
+            values = table.setdefault(int(network.network_address), [])
+            self.masks = [self.networks[length] for length in sorted(self.networks, reverse=True)]
+        else:
+            values = self.exact.setdefault(socket.inet_aton(endpoint), [])
+        if value not in values:
+            values.append(value)
+        self.cache.clear()
+
+    # Values of every entry matching a packed (4 byte) address, in the order they were added
+    def lookup_packed(self, packed):
+        values = self.cache.get(packed)
+        if values is not None:
+            return values
+
+        values = list(self.exact.get(packed, ()))
+        if self.masks:
+            number = int.from_bytes(packed, "big")
+            for mask, table in self.masks:
+                for value in table.get(number & mask, ()):
+                    if value not in values:
+                        values.append(value)
+
+        values = tuple(values)
+        if len(self.cache) >= MAX_CACHED:
+            self.cache.clear()
+        self.cache[packed] = values
+        return values
+
+    # Same for a dotted address, anything that isn't IPv4 matches nothing
+    def lookup(self, address):
+        values = self.cache.get(address)
+        if values is not None:
+            return values
+        try:
+            values = self.lookup_packed(socket.inet_aton(address))
+        except (OSError, TypeError):
+            values = ()
+        self.cache[address] = values
+        return values
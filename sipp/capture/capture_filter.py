@@ -0,0 +1,100 @@
+from sipp.capture.address_table import Address_Table, parse_endpoints, is_network
+
+import socket
+
+
+# Endpoint / port / time window / frame range restrictions, pushed down to tshark as a display filter
+# or applied to raw frames by the native backend before any SIP decoding takes place. Addresses may be
+# CIDR ranges
+class Capture_Filter:
+
+    def __init__(self, addresses, ports=None, start_time=None, end_time=None, first_frame=None, last_frame=None):
+        self.addresses = parse_endpoints(addresses) if addresses else []
+        self.ports = list(ports) if ports else []
+        # Seconds relative to the first frame of the capture (wireshark's default time display)
+        self.start_time = start_time
+        self.end_time = end_time
+        self.first_frame = first_frame
+        self.last_frame = last_frame
+
+        self.packed_addresses = frozenset(socket.inet_aton(address) for address in self.addresses
+                                          if not is_network(address))
+        self.networks = Address_Table()
+        for address in self.addresses:
+            if is_network(address):
+                self.networks.add(address, True)
+        self.port_set = frozenset(self.ports)
+        self.first_timestamp = None
+
+    # Forget the capture start time, called before each capture is read. Readers starting part way through
+    # a capture pass in its start time
+    def reset(self, first_timestamp=None):
+        self.first_timestamp = first_timestamp
+
+    # tshark display filter equivalent of this filter
+    def display_filter(self):
+        clauses = ["sip"]
+        if self.addresses:
+            clauses.append("(" + " || ".join(f"ip.addr == {address}" for address in self.addresses) + ")")
+        if self.ports:
+            clauses.append("(" + " || ".join(f"udp.port == {port}" for port in self.ports) + ")")
+        if self.start_time is not None:
+            clauses.append(f"frame.time_relative >= {self.start_time}")
+        if self.end_time is not None:
+            clauses.append(f"frame.time_relative <= {self.end_time}")
+        if self.first_frame is not None:
+            clauses.append(f"frame.number >= {self.first_frame}")
+        if self.last_frame is not None:
+            clauses.append(f"frame.number <= {self.last_frame}")
+        return " && ".join(clauses)
+
+    # Capture (BPF) filter for live capture, ports are left out as they would drop IP fragments
+    def capture_filter(self):
+        clauses = ["udp"]
+        if self.addresses:
+            clauses.append("(" + " or ".join(f"net {address}" if is_network(address) else f"host {address}"
+                                             for address in self.addresses) + ")")
+        return " and ".join(clauses)
+
+    # Frame number / time window check, done before the frame is decoded
+    def accepts_frame(self, number, timestamp):
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+
+        if self.first_frame is not None and number < self.first_frame:
+            return False
+        if self.last_frame is not None and number > self.last_frame:
+            return False
+
+        relative = timestamp - self.first_timestamp
+        if self.start_time is not None and relative < self.start_time:
+            return False
+        if self.end_time is not None and relative > self.end_time:
+            return False
+        return True
+
+    # Frames are numbered in order, nothing past the last frame can ever match
+    def past_end(self, number):
+        return self.last_frame is not None and number > self.last_frame
+
+    # Endpoint / port check on the decoded UDP datagram, done before the payload is parsed as SIP
+    def accepts_datagram(self, datagram):
+        if self.addresses and datagram.src not in self.packed_addresses \
+                and datagram.dst not in self.packed_addresses:
+            if not self.networks or not (self.networks.lookup_packed(datagram.src)
+                                         or self.networks.lookup_packed(datagram.dst)):
+                return False
+        if self.port_set and datagram.sport not in self.port_set and datagram.dport not in self.port_set:
+            return False
+        return True
+
+
+# Parse a frame range argument of the form "START-END", "START-" or "-END"
+def parse_frame_range(frame_range):
+    if frame_range is None:
+        return None, None
+
+    first, separator, last = frame_range.partition("-")
+    if separator == "":
+        raise ValueError(f"Invalid frame range {frame_range}, expected START-END")
+    return (int(first) if first else None), (int(last) if last else None)
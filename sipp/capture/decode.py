@@ -0,0 +1,145 @@
+import struct
+
+# Link layer types we know how to strip
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_VLAN = (0x8100, 0x88a8, 0x9100)
+
+IPPROTO_UDP = 17
+
+# Upper bound for datagrams waiting on missing fragments
+MAX_PENDING_FRAGMENTS = 1024
+
+
+# Decoded UDP datagram, addresses are kept packed (4 bytes) to keep the hot path cheap
+class Datagram:
+    __slots__ = ("src", "dst", "sport", "dport", "payload")
+
+    def __init__(self, src, dst, sport, dport, payload):
+        self.src = src
+        self.dst = dst
+        self.sport = sport
+        self.dport = dport
+        self.payload = payload
+
+
+# Return the offset of the IPv4 header inside a frame, or None if it is not IPv4
+def ipv4_offset(linktype, data):
+    if linktype == LINKTYPE_ETHERNET:
+        if len(data) < 14:
+            return None
+        offset = 12
+        ethertype = (data[offset] << 8) | data[offset + 1]
+        # Strip any number of (stacked) VLAN tags
+        while ethertype in ETHERTYPE_VLAN:
+            offset += 4
+            if len(data) < offset + 2:
+                return None
+            ethertype = (data[offset] << 8) | data[offset + 1]
+        return offset + 2 if ethertype == ETHERTYPE_IPV4 else None
+
+    if linktype == LINKTYPE_RAW or linktype == LINKTYPE_IPV4:
+        return 0 if len(data) and (data[0] >> 4) == 4 else None
+
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None
+        return 16 if ((data[14] << 8) | data[15]) == ETHERTYPE_IPV4 else None
+
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if len(data) < 20:
+            return None
+        return 20 if ((data[0] << 8) | data[1]) == ETHERTYPE_IPV4 else None
+
+    if linktype == LINKTYPE_NULL:
+        if len(data) < 4:
+            return None
+        family = struct.unpack_from("<I", data, 0)[0]
+        if family > 0xffff:
+            family = struct.unpack_from(">I", data, 0)[0]
+        return 4 if family == 2 else None
+
+    return None
+
+
+# Reassembles fragmented IPv4 datagrams, large INVITEs regularly exceed the MTU over UDP
+class IPv4_Reassembler:
+
+    def __init__(self, max_pending=MAX_PENDING_FRAGMENTS):
+        self.max_pending = max_pending
+        self.pending = {}
+
+    def add(self, key, frag_offset, more_fragments, payload):
+        entry = self.pending.get(key)
+        if entry is None:
+            if len(self.pending) >= self.max_pending:
+                # Drop the oldest incomplete datagram
+                del self.pending[next(iter(self.pending))]
+            entry = self.pending[key] = {"parts": {}, "total": None}
+
+        entry["parts"][frag_offset] = bytes(payload)
+        if not more_fragments:
+            entry["total"] = frag_offset + len(payload)
+
+        if entry["total"] is None:
+            return None
+
+        # Check we have contiguous coverage of the whole datagram
+        covered = 0
+        for offset in sorted(entry["parts"]):
+            if offset > covered:
+                return None
+            covered = max(covered, offset + len(entry["parts"][offset]))
+        if covered < entry["total"]:
+            return None
+
+        del self.pending[key]
+        data = bytearray(entry["total"])
+        for offset, part in entry["parts"].items():
+            data[offset:offset + len(part)] = part
+        return memoryview(data)
+
+
+# Decode a captured frame down to its UDP payload, returns None for anything that isn't IPv4 / UDP
+def decode_udp(linktype, data, reassembler=None):
+    ip = ipv4_offset(linktype, data)
+    if ip is None or len(data) < ip + 20:
+        return None
+
+    version_ihl = data[ip]
+    if (version_ihl >> 4) != 4 or data[ip + 9] != IPPROTO_UDP:
+        return None
+
+    header_len = (version_ihl & 0x0f) * 4
+    total_len = (data[ip + 2] << 8) | data[ip + 3]
+    ip_end = min(ip + total_len, len(data)) if total_len else len(data)
+    src = bytes(data[ip + 12:ip + 16])
+    dst = bytes(data[ip + 16:ip + 20])
+
+    flags_offset = (data[ip + 6] << 8) | data[ip + 7]
+    more_fragments = flags_offset & 0x2000
+    frag_offset = (flags_offset & 0x1fff) * 8
+    segment = data[ip + header_len:ip_end]
+
+    if more_fragments or frag_offset:
+        if reassembler is None:
+            return None
+        ident = (data[ip + 4] << 8) | data[ip + 5]
+        segment = reassembler.add((src, dst, ident), frag_offset, more_fragments, segment)
+        if segment is None:
+            return None
+
+    if len(segment) < 8:
+        return None
+
+    sport = (segment[0] << 8) | segment[1]
+    dport = (segment[2] << 8) | segment[3]
+    udp_len = (segment[4] << 8) | segment[5]
+    udp_end = min(udp_len, len(segment)) if udp_len >= 8 else len(segment)
+    return Datagram(src, dst, sport, dport, segment[8:udp_end])
@@ -0,0 +1,333 @@
+from sipp.capture.pcap_reader import Pcap_Reader
+from sipp.capture.decode import Datagram
+from sipp.capture import tshark_source
+
+import queue
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+
+# Captures streamed through one tshark before it is replaced, keeps its per stream state from piling up
+DEFAULT_MAX_FILES = 500
+DEFAULT_POOL_SIZE = 1
+# Seconds to wait for tshark to produce the next line before it is considered hung
+DEFAULT_TIMEOUT = 60.0
+HEALTH_TIMEOUT = 5.0
+
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_IDB = 0x00000001
+PCAPNG_EPB = 0x00000006
+LINKTYPE_RAW = 101
+
+# Every capture is followed by a marker datagram, its line in the output tells where that capture ends
+MARKER_ADDRESS = "127.0.0.253"
+MARKER_PORT = 9
+MARKER_PAYLOAD = b"sippConverter end of capture"
+
+
+def pcapng_block(block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = 12 + len(body)
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def section_header():
+    return pcapng_block(PCAPNG_SHB, struct.pack("<IHHq", 0x1a2b3c4d, 1, 0, -1))
+
+
+def interface_block(linktype):
+    return pcapng_block(PCAPNG_IDB, struct.pack("<HHI", linktype, 0, 0))
+
+
+# Microsecond resolution enhanced packet block
+def packet_block(interface, timestamp, data):
+    ticks = int(round(timestamp * 1000000))
+    return pcapng_block(PCAPNG_EPB, struct.pack("<IIIII", interface, ticks >> 32, ticks & 0xffffffff,
+                                                len(data), len(data)) + bytes(data))
+
+
+def marker_packet():
+    address = socket.inet_aton(MARKER_ADDRESS)
+    udp = struct.pack(">HHHH", MARKER_PORT, MARKER_PORT, 8 + len(MARKER_PAYLOAD), 0) + MARKER_PAYLOAD
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0, address, address)
+    return ip + udp
+
+
+def is_marker(columns):
+    return len(columns) > 4 and columns[2] == MARKER_ADDRESS and columns[4] == str(MARKER_PORT)
+
+
+def marker_blocks(interface):
+    return interface_block(LINKTYPE_RAW) + packet_block(interface, 0.0, marker_packet())
+
+
+# Stream a capture (path or bytes) as one pcapng section, always finished with the marker even when the
+# capture can't be read
+def capture_section(input_file):
+    yield section_header()
+    interfaces = {}
+    try:
+        with Pcap_Reader(input_file) as reader:
+            for frame in reader:
+                interface = interfaces.get(frame.linktype)
+                if interface is None:
+                    interface = interfaces[frame.linktype] = len(interfaces)
+                    yield interface_block(frame.linktype)
+                yield packet_block(interface, frame.timestamp, frame.data)
+    except Exception:
+        yield marker_blocks(len(interfaces))
+        raise
+    yield marker_blocks(len(interfaces))
+
+
+# One long lived tshark reading a pcapng stream from stdin, captures are written to it one section at a
+# time and its fields output is read back up to each capture's marker. Only SIP (and the marker) is
+# dissected, endpoint / port / time window restrictions are applied to the output instead since tshark's
+# frame numbers and relative times run on across captures
+class Tshark_Dissector:
+
+    def __init__(self, tshark=None, max_files=DEFAULT_MAX_FILES, timeout=DEFAULT_TIMEOUT):
+        tshark = tshark or shutil.which("tshark")
+        if tshark is None:
+            raise Exception("tshark not found! install wireshark-cli or use the native backend")
+        self.tshark = tshark
+        self.max_files = max_files
+        self.timeout = timeout
+
+        self.process = None
+        self.payload = False
+        self.lines = queue.Queue()
+        self.stderr = None
+        self.files = 0
+        self.restarts = 0
+        # tshark numbers frames across the whole stream, the frames of a capture count on from here
+        self.frames = 0
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    # (Re)start tshark, returns the new process
+    def start(self):
+        self.stop()
+        self.payload = self.tshark in tshark_source.PAYLOAD_NEEDED
+        command = tshark_source.tshark_command(
+            "-", f"sip || (ip.src == {MARKER_ADDRESS} && udp.port == {MARKER_PORT})", self.tshark, self.payload)
+        command.insert(1, "-l")
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=self.stderr)
+        self.lines = queue.Queue()
+        threading.Thread(target=self.__read_output, args=(self.process.stdout, self.lines), daemon=True).start()
+        self.files = 0
+        self.frames = 0
+        self.restarts += 1
+        return self.process
+
+    def stop(self):
+        process, stderr = self.process, self.stderr
+        if process is None or stderr is None:
+            return
+        try:
+            process.stdin.close()  # type: ignore
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=HEALTH_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        stderr.close()
+        self.process = None
+
+    # Output lines are read on their own thread so waits can time out
+    def __read_output(self, stdout, lines):
+        for line in stdout:
+            lines.put(line.decode("utf-8", "replace"))
+        lines.put(None)
+
+    def __feed(self, stdin, input_file, errors):
+        try:
+            for block in capture_section(input_file):
+                stdin.write(block)
+        except Exception as e:
+            errors.append(e)
+        try:
+            stdin.flush()
+        except Exception:
+            pass
+
+    def __next_line(self):
+        process, stderr = self.process, self.stderr
+        if process is None or stderr is None:
+            raise Exception("tshark is not running")
+        try:
+            line = self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            process.kill()
+            raise Exception(f"tshark produced nothing for {self.timeout}s, restarting it")
+        if line is None:
+            process.wait()
+            stderr.seek(0)
+            raise Exception(f"tshark exited ({process.returncode}): "
+                            f"{stderr.read().decode(errors='replace').strip()}")
+        return line
+
+    # SIP_Packets of one capture (path or bytes) with their frame numbers relative to that capture. A tshark
+    # found not to print message bodies is restarted with the payload fields and the capture fed again, from
+    # the frame the first pass stopped at
+    def dissect(self, input_file, capture_filter=None):
+        done = last = 0
+        while True:
+            try:
+                for packet in self.__dissect(input_file, capture_filter):
+                    number = packet.number or 0
+                    if number <= done:
+                        continue
+                    last = number
+                    yield packet
+                return
+            except tshark_source.Body_Unavailable:
+                if self.payload:
+                    raise
+                tshark_source.PAYLOAD_NEEDED.add(self.tshark)
+                done = last
+
+    def __dissect(self, input_file, capture_filter):
+        process = self.process
+        # Restarted as well once any dissector found this tshark to need the payload fields
+        payload = self.tshark in tshark_source.PAYLOAD_NEEDED
+        if process is None or process.poll() is not None or self.payload != payload:
+            process = self.start()
+
+        if capture_filter is not None:
+            with Pcap_Reader(input_file) as reader:
+                capture_filter.reset(next((frame.timestamp for frame in reader), None))
+
+        errors = []
+        feeder = threading.Thread(target=self.__feed, args=(process.stdin, input_file, errors),
+                                  daemon=True)
+        feeder.start()
+
+        finished = False
+        try:
+            while True:
+                line = self.__next_line()
+                columns = line.rstrip("\n").split("\t")
+                if is_marker(columns):
+                    self.frames = int(columns[0])
+                    break
+
+                for packet in tshark_source.parse_line(line, self.payload):
+                    packet.number -= self.frames
+                    if capture_filter is not None and not self.__accepts(capture_filter, packet):
+                        continue
+                    yield packet
+            finished = True
+        finally:
+            # Whatever is left of an abandoned capture would be read as the next one's
+            if not finished:
+                process.kill()
+            feeder.join()
+            if not finished:
+                self.stop()
+
+        if errors:
+            raise errors[0]
+        self.files += 1
+        if self.files >= self.max_files:
+            self.stop()
+
+    def __accepts(self, capture_filter, packet):
+        if not capture_filter.accepts_frame(packet.number, packet.timestamp):
+            return False
+        try:
+            datagram = Datagram(socket.inet_aton(packet.src), socket.inet_aton(packet.dst),
+                                packet.sport, packet.dport, None)
+        except OSError:
+            return False
+        return capture_filter.accepts_datagram(datagram)
+
+    # Round trip an empty capture, False (and the process replaced on next use) when tshark doesn't answer
+    def healthy(self):
+        if not self.alive():
+            return False
+        process = self.process
+        if process is None:
+            return False
+        timeout = self.timeout
+        self.timeout = HEALTH_TIMEOUT
+        try:
+            process.stdin.write(section_header() + marker_blocks(0))  # type: ignore
+            process.stdin.flush()  # type: ignore
+            while True:
+                columns = self.__next_line().rstrip("\n").split("\t")
+                if is_marker(columns):
+                    self.frames = int(columns[0])
+                    return True
+        except Exception:
+            self.stop()
+            return False
+        finally:
+            self.timeout = timeout
+
+
+# Bounded set of long lived dissectors, at most size captures are dissected at the same time and callers
+# wait for a free dissector beyond that. Dissectors are started on first use
+class Dissector_Pool:
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_files=DEFAULT_MAX_FILES, tshark=None, timeout=DEFAULT_TIMEOUT):
+        self.size = size
+        self.idle = queue.LifoQueue()
+        for _ in range(size):
+            self.idle.put(Tshark_Dissector(tshark, max_files, timeout))
+        self.all = list(self.idle.queue)
+
+    # Same interface as tshark_source.read_sip_packets, the dissector is held until the capture is read
+    def read_sip_packets(self, input_file, capture_filter=None):
+        dissector = self.idle.get()
+        try:
+            yield from dissector.dissect(input_file, capture_filter)
+        finally:
+            self.idle.put(dissector)
+
+    # Ping every idle dissector, returns how many answered
+    def check_health(self):
+        healthy = 0
+        checked = []
+        while True:
+            try:
+                dissector = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            checked.append(dissector)
+            if dissector.alive() and dissector.healthy():
+                healthy += 1
+        for dissector in checked:
+            self.idle.put(dissector)
+        return healthy
+
+    def status(self):
+        return {
+            "size": self.size,
+            "running": sum(1 for dissector in self.all if dissector.alive()),
+            "files": sum(dissector.files for dissector in self.all),
+            "starts": sum(dissector.restarts for dissector in self.all)
+        }
+
+    def close(self):
+        for dissector in self.all:
+            dissector.stop()
+
+
+SHARED_POOL = None
+
+
+# Pool kept for the life of the process, lets batch / service workers reuse their tshark across captures
+def shared_pool(size=DEFAULT_POOL_SIZE, max_files=DEFAULT_MAX_FILES):
+    global SHARED_POOL
+    if SHARED_POOL is None:
+        SHARED_POOL = Dissector_Pool(size, max_files)
+    return SHARED_POOL
@@ -0,0 +1,102 @@
+from sipp.capture.pcap_reader import Pcap_Reader
+
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+POLL_INTERVAL = 0.5
+# Smallest file worth opening, a pcap file header (a pcapng section header is larger)
+MINIMUM_CAPTURE_SIZE = 24
+
+RING_BUFFER_FILE = "live.pcapng"
+
+
+# Capture files matching a path or glob pattern, oldest first. dumpcap ring buffer files carry a
+# sequence number and timestamp in their names so name order is capture order
+def capture_files(source):
+    if glob.has_magic(source):
+        return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+    return [source] if os.path.isfile(source) else []
+
+
+# Yield frames from a growing capture file, or from a set of rotating files (glob pattern), as they are
+# written. None is yielded every time there is nothing new so the caller can run its timers. A file is
+# finished once a newer file shows up, stops after idle_exit seconds without new data (never when None)
+def follow_frames(source, poll_interval=POLL_INTERVAL, idle_exit=None):
+    finished = set()
+    reader = None
+    number = 0
+    last_data = time.monotonic()
+
+    try:
+        while True:
+            progressed = False
+
+            if reader is None:
+                for path in capture_files(source):
+                    if path in finished:
+                        continue
+                    if os.path.getsize(path) >= MINIMUM_CAPTURE_SIZE:
+                        reader = Pcap_Reader(path)
+                        print(f"Following {path}")
+                    break
+
+            if reader is not None:
+                reader.refresh()
+                for frame in reader.new_frames():
+                    progressed = True
+                    frame.number += number
+                    yield frame
+
+                # Rotated, anything left in the old file was read above
+                newer = [path for path in capture_files(source)
+                         if path not in finished and path != reader.input_file]
+                if newer and not reader.refresh():
+                    finished.add(reader.input_file)
+                    number += reader.number
+                    reader.close()
+                    reader = None
+                    continue
+
+            if progressed:
+                last_data = time.monotonic()
+                continue
+            if idle_exit is not None and time.monotonic() - last_data >= idle_exit:
+                return
+
+            yield None
+            time.sleep(poll_interval)
+    finally:
+        if reader is not None:
+            reader.close()
+
+
+# Capture from a network interface with dumpcap into a ring buffer and follow it, the ring buffer is
+# removed when following stops
+def follow_interface(interface, capture_filter=None, ring_files=10, ring_megabytes=64,
+                     poll_interval=POLL_INTERVAL, dumpcap="dumpcap"):
+    directory = tempfile.mkdtemp(prefix="sippConverter-")
+    command = [dumpcap, "-q", "-i", interface, "-w", os.path.join(directory, RING_BUFFER_FILE),
+               "-b", f"filesize:{ring_megabytes * 1024}", "-b", f"files:{ring_files}"]
+    if capture_filter:
+        command += ["-f", capture_filter]
+
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    except FileNotFoundError:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise Exception(f"{dumpcap} not found, is wireshark / tshark installed?")
+
+    try:
+        for frame in follow_frames(os.path.join(directory, "live_*.pcapng"), poll_interval):
+            if frame is None and process.poll() is not None:
+                raise Exception(f"{dumpcap} exited with code {process.returncode}")
+            yield frame
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(directory, ignore_errors=True)
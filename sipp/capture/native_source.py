@@ -0,0 +1,99 @@
+from sipp.capture.pcap_reader import Pcap_Reader
+from sipp.capture.decode import decode_udp, IPv4_Reassembler
+from sipp.capture.sip_decoder import parse_datagram
+from sipp.capture import follow
+from sipp.metrics import FRAMES_READ, FRAMES_FILTERED
+
+# Smallest capture chunk worth handing to a worker process
+MIN_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+# Decode frames into SIP packets, frames rejected by the (optional) capture filter are dropped before
+# they are decoded. None entries (follow mode idle ticks) are passed straight through. keep_headers are the
+# (sip_decoder.header_keys) headers held on to besides the essential ones
+def decode_frames(frames, capture_filter=None, metrics=None, keep_headers=frozenset(), first_timestamp=None):
+    reassembler = IPv4_Reassembler()
+    if capture_filter is not None:
+        capture_filter.reset(first_timestamp)
+
+    frames_read = 0
+    frames_filtered = 0
+    try:
+        for frame in frames:
+            if frame is None:
+                yield None
+                continue
+
+            frames_read += 1
+            if capture_filter is not None:
+                if capture_filter.past_end(frame.number):
+                    break
+                if not capture_filter.accepts_frame(frame.number, frame.timestamp):
+                    frames_filtered += 1
+                    continue
+
+            datagram = decode_udp(frame.linktype, frame.data, reassembler)
+            if datagram is None:
+                frames_filtered += 1
+                continue
+            if capture_filter is not None and not capture_filter.accepts_datagram(datagram):
+                frames_filtered += 1
+                continue
+
+            packet = parse_datagram(datagram, keep_headers)
+            if packet is None:
+                frames_filtered += 1
+                continue
+
+            packet.number = frame.number
+            packet.timestamp = frame.timestamp
+            yield packet
+    finally:
+        if metrics is not None:
+            metrics.count(FRAMES_READ, frames_read)
+            metrics.count(FRAMES_FILTERED, frames_filtered)
+
+
+# Frames of a reader, releasing the mapped pages already read every release_interval bytes
+def released_frames(reader, release_interval):
+    released = 0
+    for frame in reader:
+        yield frame
+        if frame.offset - released >= release_interval:
+            reader.release(frame.offset)
+            released = frame.offset
+
+
+# Stream SIP packets out of a pcap / pcapng file without going through tshark, with release_interval
+# (bytes) the part of the capture already read doesn't stay resident
+def read_sip_packets(input_file, capture_filter=None, metrics=None, release_interval=None,
+                     keep_headers=frozenset()):
+    with Pcap_Reader(input_file) as reader:
+        frames = reader if release_interval is None else released_frames(reader, release_interval)
+        yield from decode_frames(frames, capture_filter, metrics, keep_headers)
+
+
+# Split a capture into about count chunks (see Pcap_Reader.chunks) that can be read independently
+def capture_chunks(input_file, count):
+    with Pcap_Reader(input_file) as reader:
+        return reader.chunks(count)
+
+
+# Stream the SIP packets of a single chunk, IP fragments split across chunks are lost
+def read_chunk_packets(input_file, chunk, capture_filter=None, metrics=None, keep_headers=frozenset()):
+    with Pcap_Reader(input_file) as reader:
+        yield from decode_frames(reader.chunk_frames(chunk), capture_filter, metrics, keep_headers,
+                                 chunk.first_timestamp)
+
+
+# Stream SIP packets out of a growing capture / rotating capture files (glob pattern) or, when interface
+# is given, a live dumpcap ring buffer. None is yielded whenever there is nothing new to read
+def follow_sip_packets(source, capture_filter=None, metrics=None, poll_interval=follow.POLL_INTERVAL,
+                       idle_exit=None, interface=None, keep_headers=frozenset()):
+    if interface is not None:
+        frames = follow.follow_interface(
+            interface, capture_filter.capture_filter() if capture_filter is not None else None,
+            poll_interval=poll_interval)
+    else:
+        frames = follow.follow_frames(source, poll_interval, idle_exit)
+    yield from decode_frames(frames, capture_filter, metrics, keep_headers)
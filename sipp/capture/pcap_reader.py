@@ -0,0 +1,323 @@
+import mmap
+import os
+import struct
+
+# Libpcap magic numbers (microsecond / nanosecond resolution)
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+
+# Pcapng block types
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+# Interface description options
+IF_TSRESOL = 9
+IF_TSOFFSET = 14
+
+
+# Single captured record, data is a zero-copy view into the mapped capture file
+class Frame:
+    __slots__ = ("number", "timestamp", "linktype", "offset", "length", "data")
+
+    def __init__(self, number, timestamp, linktype, offset, length, data):
+        self.number = number
+        self.timestamp = timestamp
+        self.linktype = linktype
+        # Byte offset / length of the whole record (header included) in the capture file
+        self.offset = offset
+        self.length = length
+        self.data = data
+
+
+# Capture interface as described by a pcap header or a pcapng IDB
+class Interface:
+    __slots__ = ("linktype", "ts_divisor", "ts_offset")
+
+    def __init__(self, linktype, ts_divisor=1000000, ts_offset=0):
+        self.linktype = linktype
+        self.ts_divisor = ts_divisor
+        self.ts_offset = ts_offset
+
+
+# Byte range of a capture holding whole records, with everything needed to read it on its own: the number of
+# its first frame, the capture start time (for relative time filters) and the pcapng section state
+class Chunk:
+    __slots__ = ("start", "end", "first_number", "first_timestamp", "endian", "interfaces")
+
+    def __init__(self, start, end, first_number, first_timestamp, endian="<", interfaces=()):
+        self.start = start
+        self.end = end
+        self.first_number = first_number
+        self.first_timestamp = first_timestamp
+        self.endian = endian
+        self.interfaces = list(interfaces)
+
+
+# Memory mapped pcap / pcapng reader, records are yielded as memoryview slices of the map so
+# nothing is copied until a consumer asks for it. Frames must not be held on to after close().
+# A capture already in memory (bytes / bytearray / memoryview) is read in place instead of mapped
+class Pcap_Reader:
+
+    def __init__(self, input_file):
+        if isinstance(input_file, (bytes, bytearray, memoryview)):
+            if len(input_file) == 0:
+                raise ValueError("Capture is empty!")
+            self.input_file = None
+            self.file = None
+            self.map = input_file
+        else:
+            self.input_file = input_file
+            self.file = open(input_file, "rb")
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self.file.close()
+                raise ValueError(f"Capture file {input_file} is empty!")
+        self.view = memoryview(self.map)
+        self.size = len(self.view)
+
+        # Where the last read stopped, lets a followed (growing) capture carry on from there
+        self.next_offset = None
+        self.number = 0
+        # Pcapng section state, kept so a read can resume part way through a section
+        self.interfaces = []
+        self.section_endian = "<"
+
+        magic = self.view[0:4].tobytes()
+        if magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+            self.format = "pcap"
+            self.endian = "<"
+        elif magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+            self.format = "pcap"
+            self.endian = ">"
+        elif magic == b"\x0a\x0d\x0d\x0a":
+            self.format = "pcapng"
+            # Set per section, from each section header
+            self.endian = "<"
+        else:
+            self.close()
+            raise ValueError(f"Unsupported capture format in {self.input_file or 'capture'}!")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.frames()
+
+    def close(self):
+        if self.map is None:
+            return
+        try:
+            self.view.release()
+            if isinstance(self.map, mmap.mmap):
+                self.map.close()
+        except BufferError:
+            # A consumer still holds a frame view, the map is released once it is collected
+            pass
+        self.map = None
+        if self.file is not None:
+            self.file.close()
+
+    # Map any data appended since the file was opened, True when the file grew. Frames read before the
+    # refresh stay valid, the previous map is released once nothing refers to it
+    def refresh(self):
+        if self.file is None:
+            return False
+        size = os.fstat(self.file.fileno()).st_size
+        if size <= self.size:
+            return False
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.size = len(self.map)
+        return True
+
+    # Drop the mapped pages before offset from memory, they are read back from the file if touched again.
+    # Keeps the resident size of a single pass over a huge capture flat (no-op where madvise is missing)
+    def release(self, offset):
+        if not isinstance(self.map, mmap.mmap) or not hasattr(self.map, "madvise") or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        length = offset - offset % mmap.PAGESIZE
+        if length > 0:
+            self.map.madvise(mmap.MADV_DONTNEED, 0, length)
+
+    # Frames from start (default: the first record) up to end, numbered from first_number
+    def frames(self, start=None, end=None, first_number=1):
+        if self.format == "pcap":
+            return self.__pcap_frames(start, end, first_number)
+        return self.__pcapng_frames(start, end, first_number)
+
+    # Split the capture into about count byte ranges cut at record boundaries. Only record headers are read
+    def chunks(self, count):
+        first_timestamp = next((frame.timestamp for frame in self.frames()), None)
+        step = max(1, self.size // max(1, count))
+
+        offsets = self.__pcap_offsets() if self.format == "pcap" else self.__pcapng_offsets()
+        chunks = []
+        target = 0
+        for offset, number, endian, interfaces in offsets:
+            if offset >= target:
+                if chunks:
+                    chunks[-1].end = offset
+                chunks.append(Chunk(offset, self.size, number, first_timestamp, endian, interfaces))
+                target = offset + step
+        return chunks
+
+    # Chunk reading, resumes part way through the file with the chunk's section state
+    def chunk_frames(self, chunk):
+        self.section_endian = chunk.endian
+        self.interfaces = list(chunk.interfaces)
+        return self.frames(chunk.start, chunk.end, chunk.first_number)
+
+    # (record offset, number of the first frame at or after it, endian, interfaces) for every record
+    def __pcap_offsets(self):
+        view = self.view
+        length = struct.Struct(self.endian + "I")
+        offset = 24
+        number = 1
+        while offset + 16 <= self.size:
+            yield offset, number, self.endian, ()
+            offset += 16 + length.unpack_from(view, offset + 8)[0]
+            number += 1
+
+    def __pcapng_offsets(self):
+        view = self.view
+        endian = "<"
+        interfaces = []
+        offset = 0
+        number = 1
+        while offset + 12 <= self.size:
+            block_type, = struct.unpack_from(endian + "I", view, offset)
+            if block_type == PCAPNG_SHB:
+                bom = view[offset + 8:offset + 12].tobytes()
+                endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            block_len, = struct.unpack_from(endian + "I", view, offset + 4)
+            if block_len < 12 or offset + block_len > self.size:
+                break
+
+            # Chunks may only start on a packet block, any section state before it is carried along
+            if block_type == PCAPNG_SHB:
+                interfaces = []
+            elif block_type == PCAPNG_IDB:
+                interfaces.append(self.__read_interface(view, offset, block_len, endian))
+            elif block_type in (PCAPNG_EPB, PCAPNG_PB, PCAPNG_SPB):
+                yield offset, number, endian, interfaces
+                number += 1
+            offset += block_len
+
+    # Frames appended since the last read stopped, numbering carries on where it left off
+    def new_frames(self):
+        return self.frames(self.next_offset, None, self.number + 1)
+
+    def __pcap_frames(self, start, end, first_number):
+        view = self.view
+        magic, = struct.unpack_from(self.endian + "I", view, 0)
+        linktype, = struct.unpack_from(self.endian + "I", view, 20)
+        divisor = 1000000000 if magic == PCAP_MAGIC_NS else 1000000
+        record = struct.Struct(self.endian + "IIII")
+
+        offset = start if start is not None else 24
+        end = self.size if end is None else min(end, self.size)
+        number = first_number - 1
+        self.next_offset = offset
+        while offset + 16 <= end:
+            ts_sec, ts_frac, incl_len, _ = record.unpack_from(view, offset)
+            data_start = offset + 16
+            data_end = data_start + incl_len
+            if data_end > self.size:
+                # Truncated capture, tshark also stops at the last complete record
+                break
+            number += 1
+            self.next_offset = data_end
+            self.number = number
+            yield Frame(number, ts_sec + ts_frac / divisor, linktype,
+                        offset, 16 + incl_len, view[data_start:data_end])
+            offset = data_end
+
+    def __pcapng_frames(self, start, end, first_number):
+        view = self.view
+        if not start:
+            self.section_endian = "<"
+            self.interfaces = []
+        endian = self.section_endian
+        interfaces = self.interfaces
+        offset = start if start is not None else 0
+        end = self.size if end is None else min(end, self.size)
+        number = first_number - 1
+        self.next_offset = offset
+
+        while offset + 12 <= end:
+            block_type, = struct.unpack_from(endian + "I", view, offset)
+
+            # Section header blocks define the byte order for everything that follows
+            if block_type == PCAPNG_SHB:
+                bom = view[offset + 8:offset + 12].tobytes()
+                endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+
+            block_len, = struct.unpack_from(endian + "I", view, offset + 4)
+            if block_len < 12 or offset + block_len > self.size:
+                break
+            self.next_offset = offset + block_len
+
+            if block_type == PCAPNG_SHB:
+                self.section_endian = endian
+                interfaces = self.interfaces = []
+
+            if block_type == PCAPNG_IDB:
+                interfaces.append(self.__read_interface(view, offset, block_len, endian))
+
+            elif block_type == PCAPNG_EPB or block_type == PCAPNG_PB:
+                if block_type == PCAPNG_EPB:
+                    if_id, ts_high, ts_low, cap_len = struct.unpack_from(
+                        endian + "IIII", view, offset + 8)
+                else:
+                    if_id, _, ts_high, ts_low, cap_len = struct.unpack_from(
+                        endian + "HHIII", view, offset + 8)
+                data_start = offset + 28
+                interface = interfaces[if_id] if if_id < len(interfaces) else Interface(1)
+                timestamp = ((ts_high << 32) | ts_low) / interface.ts_divisor + interface.ts_offset
+                number += 1
+                self.number = number
+                yield Frame(number, timestamp, interface.linktype, offset, block_len,
+                            view[data_start:data_start + min(cap_len, block_len - 32)])
+
+            elif block_type == PCAPNG_SPB:
+                orig_len, = struct.unpack_from(endian + "I", view, offset + 8)
+                interface = interfaces[0] if interfaces else Interface(1)
+                number += 1
+                self.number = number
+                # Simple packet blocks carry no timestamp
+                yield Frame(number, 0.0, interface.linktype, offset, block_len,
+                            view[offset + 12:offset + 12 + min(orig_len, block_len - 16)])
+
+            offset += block_len
+
+    def __read_interface(self, view, offset, block_len, endian):
+        linktype, = struct.unpack_from(endian + "H", view, offset + 8)
+        interface = Interface(linktype)
+
+        # Walk the option list for timestamp resolution / offset
+        option = offset + 16
+        block_end = offset + block_len - 4
+        while option + 4 <= block_end:
+            code, length = struct.unpack_from(endian + "HH", view, option)
+            if code == 0:
+                break
+            value = option + 4
+            if code == IF_TSRESOL and length >= 1:
+                resolution = view[value]
+                if resolution & 0x80:
+                    interface.ts_divisor = 2 ** (resolution & 0x7f)
+                else:
+                    interface.ts_divisor = 10 ** resolution
+            elif code == IF_TSOFFSET and length >= 8:
+                interface.ts_offset, = struct.unpack_from(endian + "q", view, value)
+            option = value + ((length + 3) & ~3)
+
+        return interface
@@ -0,0 +1,224 @@
+import re
+import socket
+import sys
+
+from sipp.sip_methods import SIP_HEADERS
+
+# RFC 3261 compact header forms
+COMPACT_HEADERS = {
+    "i": "Call-ID",
+    "m": "Contact",
+    "e": "Content-Encoding",
+    "l": "Content-Length",
+    "c": "Content-Type",
+    "f": "From",
+    "s": "Subject",
+    "k": "Supported",
+    "t": "To",
+    "v": "Via",
+    "o": "Event",
+    "r": "Refer-To",
+    "b": "Referred-By",
+    "u": "Allow-Events",
+}
+
+# Headers every packet needs (dialog matching, sdp detection), decoded up front. Keyed on the lowercased
+# raw name, compact forms included
+ESSENTIAL_HEADERS = {
+    b"call-id": "Call-ID", b"i": "Call-ID",
+    b"cseq": "CSeq",
+    b"content-type": "Content-Type", b"c": "Content-Type",
+    b"content-length": "Content-Length", b"l": "Content-Length",
+    b"from": "From", b"f": "From",
+    b"to": "To", b"t": "To",
+}
+
+# Dotted addresses are shared by every packet from / to the same host instead of allocated per packet
+MAX_ADDRESSES = 65536
+ADDRESSES = {}
+
+REQUEST_LINE = re.compile(rb"^([A-Z]+) (\S+) SIP/2\.0\r?$")
+STATUS_LINE = re.compile(rb"^SIP/2\.0 (\d{3})(?: (.*?))?\r?$")
+
+TAG_PARAM = re.compile(r";\s*tag=([^;>,\s]+)", re.IGNORECASE)
+
+# Quick rejection of non SIP payloads before we do any real work
+SIP_PREFIXES = tuple(method.encode() + b" " for method in SIP_HEADERS) + (b"SIP/2.0 ",)
+
+
+# SIP message decoded straight from a UDP payload, mirrors the fields we read from the tshark sip layer
+class SIP_Packet:
+    __slots__ = ("number", "timestamp", "src", "dst", "sport", "dport",
+                 "method", "status_code", "status_line", "headers", "body", "from_tag", "to_tag",
+                 "raw_headers")
+
+    def __init__(self, number=None, timestamp=None, src=None, dst=None, sport=None, dport=None, method=None,
+                 status_code=None, status_line=None, headers=None, body=b"", from_tag=None, to_tag=None,
+                 raw_headers=None):
+        self.number = number
+        self.timestamp = timestamp
+        self.src = src
+        self.dst = dst
+        self.sport = sport
+        self.dport = dport
+        self.method = method
+        self.status_code = status_code
+        self.status_line = status_line
+        self.headers = {} if headers is None else headers
+        self.body = body
+        self.from_tag = from_tag
+        self.to_tag = to_tag
+        # Undecoded lines of the headers asked to be kept (see header_keys), None when there are none
+        self.raw_headers = raw_headers
+
+    def header(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+# Canonical header name i.e. "call-id" / "i" -> "Call-ID"
+def canonical_header(name):
+    if len(name) == 1:
+        return COMPACT_HEADERS.get(name.lower(), name)
+    lowered = name.lower()
+    if lowered == "call-id":
+        return "Call-ID"
+    if lowered == "cseq":
+        return "CSeq"
+    if lowered == "www-authenticate":
+        return "WWW-Authenticate"
+    return "-".join(part.capitalize() for part in name.split("-"))
+
+
+# Lowercased raw names (compact forms included) for a list of header names, what parse_sip matches on
+def header_keys(names):
+    keys = set()
+    for name in names:
+        keys.add(name.lower().encode("ascii"))
+        keys.update(compact.encode("ascii") for compact, full in COMPACT_HEADERS.items() if full == name)
+    return frozenset(keys)
+
+
+# Decode header lines kept by parse_sip into a {canonical name: value} dict
+def parse_headers(raw_headers):
+    headers = {}
+    for line in raw_headers.split(b"\n"):
+        colon = line.find(b":")
+        if colon <= 0:
+            continue
+        name = canonical_header(line[:colon].strip().decode("ascii", "replace"))
+        value = line[colon + 1:].strip().decode("utf-8", "replace")
+        if name in headers:
+            headers[name] += ", " + value
+        else:
+            headers[name] = value
+    return headers
+
+
+def address_name(packed):
+    name = ADDRESSES.get(packed)
+    if name is None:
+        if len(ADDRESSES) >= MAX_ADDRESSES:
+            ADDRESSES.clear()
+        name = ADDRESSES[packed] = socket.inet_ntoa(packed)
+    return name
+
+
+# Extract the tag parameter from a From / To header value
+def header_tag(value):
+    if value is None:
+        return None
+    match = TAG_PARAM.search(value)
+    return match.group(1) if match else None
+
+
+def looks_like_sip(payload):
+    return bytes(payload[:10]).startswith(SIP_PREFIXES)
+
+
+# Decode a SIP payload into a SIP_Packet, returns None if the payload is not SIP. Only the essential headers
+# are decoded, lines of the headers named in keep (see header_keys) are held on to undecoded
+def parse_sip(payload, keep=frozenset()):
+    if not looks_like_sip(payload):
+        return None
+
+    raw = bytes(payload)
+    separator = raw.find(b"\r\n\r\n")
+    if separator != -1:
+        head, body = raw[:separator], raw[separator + 4:]
+    else:
+        separator = raw.find(b"\n\n")
+        if separator != -1:
+            head, body = raw[:separator], raw[separator + 2:]
+        else:
+            head, body = raw, b""
+
+    lines = head.split(b"\n")
+    packet = SIP_Packet()
+
+    start_line = lines[0]
+    request = REQUEST_LINE.match(start_line)
+    if request is not None:
+        packet.method = sys.intern(request.group(1).decode("ascii"))
+    else:
+        status = STATUS_LINE.match(start_line)
+        if status is None:
+            return None
+        packet.status_code = sys.intern(status.group(1).decode("ascii"))
+        packet.status_line = sys.intern(start_line.rstrip(b"\r").decode("utf-8", "replace"))
+
+    headers = packet.headers
+    kept = []
+    name = None
+    keeping = False
+    for line in lines[1:]:
+        line = line.rstrip(b"\r")
+        if not line:
+            continue
+        # Folded continuation line
+        if line[:1] in (b" ", b"\t"):
+            if name is not None:
+                headers[name] += " " + line.strip().decode("utf-8", "replace")
+            if keeping:
+                kept[-1] += b" " + line.strip()
+            continue
+        colon = line.find(b":")
+        if colon <= 0:
+            name = None
+            keeping = False
+            continue
+        key = line[:colon].strip().lower()
+        keeping = key in keep
+        if keeping:
+            kept.append(line)
+        name = ESSENTIAL_HEADERS.get(key)
+        if name is None:
+            continue
+        value = line[colon + 1:].strip().decode("utf-8", "replace")
+        # Repeated headers (Via, Record-Route ...) are equivalent to a comma separated list
+        if name in headers:
+            headers[name] += ", " + value
+        else:
+            headers[name] = value
+
+    content_length = headers.get("Content-Length")
+    if content_length is not None and content_length.isdigit():
+        body = body[:int(content_length)]
+    packet.body = body
+    if kept:
+        packet.raw_headers = b"\n".join(kept)
+
+    packet.from_tag = header_tag(headers.get("From"))
+    packet.to_tag = header_tag(headers.get("To"))
+    return packet
+
+
+# Decode a UDP datagram carrying SIP, addresses are returned in dotted notation like tshark
+def parse_datagram(datagram, keep=frozenset()):
+    packet = parse_sip(datagram.payload, keep)
+    if packet is None:
+        return None
+    packet.src = address_name(datagram.src)
+    packet.dst = address_name(datagram.dst)
+    packet.sport = datagram.sport
+    packet.dport = datagram.dport
+    return packet
@@ -0,0 +1,193 @@
+from sipp.capture.sip_decoder import SIP_Packet
+
+import shutil
+import subprocess
+import tempfile
+
+# Only the fields the converter consumes, in output column order
+FIELDS = [
+    "frame.number",
+    "frame.time_epoch",
+    "ip.src",
+    "ip.dst",
+    "udp.srcport",
+    "udp.dstport",
+    "sip.Method",
+    "sip.Status-Code",
+    "sip.Status-Line",
+    "sip.Call-ID",
+    "sip.CSeq",
+    "sip.from.tag",
+    "sip.to.tag",
+    "sip.Content-Type",
+    "sip.Content-Length",
+    "sip.msg_body",
+]
+
+# sip.msg_body is a protocol field, some tshark versions print it empty (or as its label) under -T fields.
+# The body is then cut out of the raw payload of the message instead, which roughly doubles the output so
+# these are only requested once a tshark has been seen doing that
+PAYLOAD_FIELDS = [
+    "udp.payload",
+    "tcp.payload",
+]
+
+# tshark executables known to need PAYLOAD_FIELDS
+PAYLOAD_NEEDED = set()
+
+# Multiple occurrences of a field (i.e. tunnelled ip layers) are joined with this character
+AGGREGATOR = "\x1f"
+
+
+# A message has a body (Content-Length) that sip.msg_body didn't give, the capture needs reading again with
+# PAYLOAD_FIELDS
+class Body_Unavailable(Exception):
+    pass
+
+
+def tshark_command(input_file, display_filter, tshark="tshark", payload=False):
+    command = [tshark, "-n", "-r", input_file, "-Y", display_filter, "-T", "fields",
+               "-E", "header=n", "-E", "separator=/t", "-E", "quote=n",
+               "-E", "occurrence=a", "-E", f"aggregator={AGGREGATOR}"]
+    for field in FIELDS + (PAYLOAD_FIELDS if payload else []):
+        command += ["-e", field]
+    return command
+
+
+# tshark prints byte fields as hex, with or without ':' separators depending on the version. None when
+# the value isn't hex at all
+def decode_bytes(value):
+    if not value:
+        return b""
+    try:
+        return bytes.fromhex(value.replace(":", ""))
+    except ValueError:
+        return None
+
+
+def first(value):
+    return value.split(AGGREGATOR, 1)[0] if value else None
+
+
+# Innermost occurrence, the outer ones belong to any tunnel the message was carried in
+def last(value):
+    return value.rsplit(AGGREGATOR, 1)[-1] if value else None
+
+
+# Message body from sip.msg_body, or everything after the headers of the raw payload (up to
+# Content-Length) when tshark didn't print the body field. payload is None when it wasn't requested
+def message_body(msg_body, content_length, payload):
+    body = decode_bytes(first(msg_body))
+    if body:
+        return body
+
+    length = first(content_length)
+    if payload is None:
+        if length is not None and length.isdigit() and int(length) > 0:
+            raise Body_Unavailable()
+        return b""
+
+    payload = decode_bytes(last(payload))
+    if not payload:
+        return b""
+    separator = payload.find(b"\r\n\r\n")
+    if separator < 0:
+        return b""
+    body = payload[separator + 4:]
+    if length is not None and length.isdigit():
+        body = body[:int(length)]
+    return body
+
+
+# Turn one line of fields output (with PAYLOAD_FIELDS when payload) into a SIP_Packet per ip layer
+def parse_line(line, payload=False):
+    columns = line.rstrip("\n").split("\t")
+    if len(columns) < len(FIELDS) + (len(PAYLOAD_FIELDS) if payload else 0):
+        return []
+
+    (number, time_epoch, ip_src, ip_dst, src_port, dst_port, method, status_code, status_line,
+     call_id, cseq, from_tag, to_tag, content_type, content_length, msg_body) = columns[:len(FIELDS)]
+    raw_payload = None
+    if payload:
+        udp_payload, tcp_payload = columns[len(FIELDS):len(FIELDS) + len(PAYLOAD_FIELDS)]
+        raw_payload = udp_payload or tcp_payload
+
+    headers = {}
+    if first(call_id) is not None:
+        headers["Call-ID"] = first(call_id)
+    if first(cseq) is not None:
+        headers["CSeq"] = first(cseq)
+    if first(content_type) is not None:
+        headers["Content-Type"] = first(content_type)
+    body = message_body(msg_body, content_length, raw_payload)
+
+    packets = []
+    # We can have multiple ip layers...
+    sport, dport = first(src_port), first(dst_port)
+    for src, dst in zip(ip_src.split(AGGREGATOR), ip_dst.split(AGGREGATOR)):
+        packets.append(SIP_Packet(
+            number=int(number) if number else None,
+            timestamp=float(time_epoch) if time_epoch else None,
+            src=src,
+            dst=dst,
+            sport=int(sport) if sport else None,
+            dport=int(dport) if dport else None,
+            method=first(method),
+            status_code=first(status_code),
+            status_line=first(status_line),
+            headers=headers,
+            body=body,
+            from_tag=first(from_tag),
+            to_tag=first(to_tag)
+        ))
+
+    return packets
+
+
+# Run a single tshark process in fields mode and stream its line oriented output, memory stays flat
+# regardless of capture size as nothing but the current line is ever held. When tshark turns out not to
+# print message bodies it is run again with PAYLOAD_FIELDS, from the frame the first run stopped at
+def read_sip_packets(input_file, display_filter="sip", tshark=None):
+    tshark = tshark or shutil.which("tshark")
+    if tshark is None:
+        raise Exception("tshark not found! install wireshark-cli or use the native backend")
+
+    done = last = 0
+    while True:
+        payload = tshark in PAYLOAD_NEEDED
+        try:
+            for packet in run_tshark(input_file, display_filter, tshark, payload):
+                # Frames up to the last one of the previous run were all read already
+                number = packet.number or 0
+                if number <= done:
+                    continue
+                last = number
+                yield packet
+            return
+        except Body_Unavailable:
+            if payload:
+                raise
+            PAYLOAD_NEEDED.add(tshark)
+            done = last
+
+
+def run_tshark(input_file, display_filter, tshark, payload):
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(tshark_command(input_file, display_filter, tshark, payload),
+                                   stdout=subprocess.PIPE, stderr=stderr,
+                                   text=True, errors="replace", bufsize=1024 * 1024)
+        completed = False
+        try:
+            for line in process.stdout:  # type: ignore
+                yield from parse_line(line, payload)
+            completed = True
+        finally:
+            process.stdout.close()  # type: ignore
+            # Consumer stopped early (or failed), no point letting tshark finish the capture
+            if not completed:
+                process.kill()
+            returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise Exception(f"tshark failed ({returncode}): {stderr.read().decode(errors='replace').strip()}")
@@ -0,0 +1,94 @@
+import sipp.agent as agent
+
+import json
+import re
+
+UNSAFE_CHARACTERS = re.compile(r"[^A-Za-z0-9._-]+")
+MAX_DIRECTORY_NAME = 64
+
+
+# A single SIP dialog, messages are kept per role in capture order
+class Dialog:
+    def __init__(self, call_id, from_tag, to_tag, roles=agent.ROLES):
+        self.call_id = call_id
+        self.from_tag = from_tag
+        self.to_tag = to_tag
+        self.pcap_dict = {role: [] for role in roles}
+
+    # Filesystem friendly directory name, prefixed with a counter so Call-IDs can never collide
+    def directory_name(self, number):
+        name = UNSAFE_CHARACTERS.sub("_", self.call_id or "unknown")[:MAX_DIRECTORY_NAME]
+        return f"{number:06d}_{name}"
+
+    def as_dict(self):
+        return {
+            "call_id": self.call_id,
+            "from_tag": self.from_tag,
+            "to_tag": self.to_tag,
+            "messages": {role: len(messages) for role, messages in self.pcap_dict.items()}
+        }
+
+
+# Everything captured for one Call-ID, forked dialogs are split apart on the remote (callee) tag
+class Call:
+    def __init__(self, call_id, roles=agent.ROLES):
+        self.call_id = call_id
+        self.roles = roles
+        self.from_tag = None
+        # (role, message) in capture order
+        self.entries = []
+        # Distinct remote tags in the order they were first seen
+        self.to_tags = {}
+
+    # Tag of the far end of the dialog a message belongs to. Messages in the caller's direction (and their
+    # responses) carry it in the To header, requests sent by the callee (i.e. its BYE) in the From header,
+    # with the caller's tag in To
+    def remote_tag(self, msg):
+        if self.from_tag is not None and msg.from_tag is not None and msg.from_tag != self.from_tag:
+            return msg.from_tag
+        return msg.to_tag
+
+    def add(self, role, msg):
+        self.entries.append((role, msg))
+        if self.from_tag is None and msg.from_tag is not None:
+            self.from_tag = msg.from_tag
+        tag = self.remote_tag(msg)
+        if tag is not None and tag not in self.to_tags:
+            self.to_tags[tag] = True
+
+    def dialogs(self):
+        tags = list(self.to_tags) or [None]
+
+        for tag in tags:
+            dialog = Dialog(self.call_id, self.from_tag, tag, self.roles)
+            for role, msg in self.entries:
+                # Untagged messages (initial INVITE, 100 Trying, CANCEL...) belong to every fork
+                remote = self.remote_tag(msg)
+                if len(tags) == 1 or remote is None or remote == tag:
+                    dialog.pcap_dict[role].append(msg)
+            yield dialog
+
+
+# Hash index of Call-ID -> Call built while the capture is read
+class Dialog_Index:
+    def __init__(self, roles=agent.ROLES):
+        self.calls = {}
+        self.roles = roles
+
+    def add(self, role, msg):
+        call = self.calls.get(msg.call_id)
+        if call is None:
+            call = self.calls[msg.call_id] = Call(msg.call_id, self.roles)
+        call.add(role, msg)
+
+    def __len__(self):
+        return len(self.calls)
+
+    # Every dialog in order of first appearance
+    def dialogs(self):
+        for call in self.calls.values():
+            yield from call.dialogs()
+
+    def save(self, outfile, entries):
+        with open(outfile, 'w') as output:
+            json.dump({"dialogs": entries}, output, indent=4)
@@ -0,0 +1,84 @@
+import hashlib
+import json
+
+SAMPLE_CALL_IDS = 5
+
+
+# Short token for a message: direction, method or status code and whether it carries an SDP
+def message_token(role, msg):
+    record = msg.record
+    arrow = ">" if msg.direction.value == "SEND" else "<"
+    name = record.method if record.method is not None else record.status_code
+    return f"{role}{arrow}{name}{'(SDP)' if record.sdp else ''}"
+
+
+# Hash of the ordered message sequence of every role, dialogs with the same fingerprint render to the
+# same scenarios. The sequence itself is only built when asked for (first dialog of a flow)
+def fingerprint(pcap_dict):
+    digest = hashlib.blake2b(digest_size=12)
+    for role in pcap_dict:
+        digest.update(role.encode())
+        for msg in pcap_dict[role]:
+            digest.update(message_token(role, msg).encode())
+            digest.update(b"\x00")
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def flow_sequence(pcap_dict):
+    return {role: " ".join(message_token(role, msg)[len(role):] for msg in pcap_dict[role])
+            for role in pcap_dict}
+
+
+# Distinct call flow seen across the dialogs of a capture
+class Flow:
+    def __init__(self, digest, sequence):
+        self.digest = digest
+        self.sequence = sequence
+        self.count = 0
+        self.call_ids = []
+        # Where the representative scenarios were written
+        self.written = {}
+
+    def add(self, call_id):
+        self.count += 1
+        if len(self.call_ids) < SAMPLE_CALL_IDS:
+            self.call_ids.append(call_id)
+
+    def as_dict(self):
+        entry = {
+            "fingerprint": self.digest,
+            "count": self.count,
+            "sample_call_ids": self.call_ids,
+            "sequence": self.sequence
+        }
+        entry.update(self.written)
+        return entry
+
+
+# Streaming set of flows, only the first dialog of every flow needs rendering
+class Flow_Index:
+    def __init__(self):
+        self.flows = {}
+        self.dialogs = 0
+
+    def __len__(self):
+        return len(self.flows)
+
+    # Returns the dialog's flow and whether it has not been seen before
+    def add(self, dialog):
+        digest = fingerprint(dialog.pcap_dict)
+        flow = self.flows.get(digest)
+        is_new = flow is None
+        if is_new:
+            flow = self.flows[digest] = Flow(digest, flow_sequence(dialog.pcap_dict))
+
+        flow.add(dialog.call_id)
+        self.dialogs += 1
+        return flow, is_new
+
+    # Most common flows first
+    def save(self, outfile):
+        flows = sorted(self.flows.values(), key=lambda flow: flow.count, reverse=True)
+        with open(outfile, 'w') as output:
+            json.dump({"dialogs": self.dialogs, "flows": [flow.as_dict() for flow in flows]}, output, indent=4)
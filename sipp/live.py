@@ -0,0 +1,173 @@
+import sipp.agent as agent
+from sipp.dialogs import Call
+from sipp.timing import status_code
+
+from collections import OrderedDict, deque
+
+# Calls without session timers send nothing between the ACK and the BYE for as long as they last, only an
+# hour of silence is taken as a call whose end was never captured
+DEFAULT_IDLE_TIMEOUT = 3600.0
+DEFAULT_MAX_DIALOGS = 10000
+# Finished calls are kept around this long (capture seconds) for the ACK / retransmissions trailing them,
+# and for the copies of the final messages still crossing any proxies
+LINGER = 2.0
+# Call-IDs remembered after being written out so late messages don't open a new call
+COMPLETED_HISTORY = 10000
+
+# Why a call was written out
+COMPLETED = "completed"
+FAILED = "failed"
+TIMEOUT = "timeout"
+EVICTED = "evicted"
+FLUSHED = "flushed"
+
+
+# Call being followed, knows enough about its state to tell when it has finished
+class Live_Call(Call):
+    def __init__(self, call_id, roles=agent.ROLES):
+        super().__init__(call_id, roles)
+        self.last_seen = None
+        self.answered = False
+        self.finished_at = None
+        self.outcome = None
+
+    # A call finishes on the final response to its BYE, or on a failure response to an unanswered INVITE
+    def update(self, msg):
+        if msg.record.method is not None:
+            return
+
+        code = status_code(msg)
+        method = msg.cseq_method
+        if code is None or code < 200:
+            return
+
+        if method == "BYE" and self.outcome is None:
+            self.outcome = COMPLETED
+            self.finished_at = self.last_seen
+        elif method == "INVITE":
+            if code < 300:
+                self.answered = True
+            elif not self.answered and self.outcome is None:
+                self.outcome = FAILED
+                self.finished_at = self.last_seen
+
+
+# Calls in progress while a capture is followed. Memory is bounded by max_dialogs: the least recently
+# active call is written out early (EVICTED) once the limit is reached. With ordered, calls are only handed
+# out once they have finished, in the order they first appeared, so they come out numbered as a whole
+# capture read would number them: idle calls (and every call after them) are kept until flush, idle_timeout
+# and max_dialogs don't apply
+class Live_Dialogs:
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, max_dialogs=DEFAULT_MAX_DIALOGS, linger=LINGER,
+                 roles=agent.ROLES, ordered=False):
+        self.idle_timeout = idle_timeout
+        self.max_dialogs = max_dialogs
+        self.linger = linger
+        self.roles = roles
+        # Calls in order of first appearance when ordered
+        self.arrivals = deque() if ordered else None
+
+        # Least recently active first
+        self.calls = OrderedDict()
+        # Finished calls waiting out the linger period
+        self.finishing = {}
+        self.evicted = []
+        # Call-ID -> [outcome, late messages] of the calls already written out
+        self.completed = OrderedDict()
+        # Messages that arrived after their call was written out, and how many calls they belonged to
+        self.late_messages = 0
+        self.late_calls = 0
+
+        # Capture clock, the latest timestamp seen
+        self.now = None
+
+    def __len__(self):
+        return len(self.calls)
+
+    # Track a message, False when it belongs to a call that has already been written out. Such late messages
+    # can't be added any more, they are counted instead (see written_outcome)
+    def add(self, role, msg):
+        call_id = msg.call_id
+        written = self.completed.get(call_id)
+        if written is not None:
+            self.late_messages += 1
+            if written[1] == 0:
+                self.late_calls += 1
+            written[1] += 1
+            return False
+
+        call = self.calls.get(call_id)
+        if call is None:
+            call = self.calls[call_id] = Live_Call(call_id, self.roles)
+            if self.arrivals is not None:
+                self.arrivals.append(call)
+            elif len(self.calls) > self.max_dialogs:
+                self.evicted.append(self.__remove(next(iter(self.calls)), EVICTED))
+        else:
+            self.calls.move_to_end(call_id)
+
+        timestamp = msg.timestamp
+        if timestamp is not None and (self.now is None or timestamp > self.now):
+            self.now = timestamp
+        call.last_seen = self.now
+
+        call.add(role, msg)
+        call.update(msg)
+        if call.finished_at is not None:
+            self.finishing[call_id] = call
+        return True
+
+    def __remove(self, call_id, outcome):
+        call = self.calls.pop(call_id)
+        self.finishing.pop(call_id, None)
+        if call.outcome is None:
+            call.outcome = outcome
+
+        self.completed[call_id] = [call.outcome, 0]
+        if len(self.completed) > COMPLETED_HISTORY:
+            self.completed.popitem(last=False)
+        return call
+
+    # Remove and return every call that is finished, idle past the timeout or was evicted, now defaults to
+    # the capture clock
+    def pop_ready(self, now=None):
+        now = self.now if now is None else now
+        ready = self.evicted
+        self.evicted = []
+        if now is None:
+            return ready
+
+        if self.arrivals is not None:
+            while self.arrivals:
+                call = self.arrivals[0]
+                if call.finished_at is None or now - call.finished_at < self.linger:
+                    break
+                ready.append(self.__remove(self.arrivals.popleft().call_id, call.outcome))
+            return ready
+
+        for call_id, call in list(self.finishing.items()):
+            if now - call.finished_at >= self.linger:
+                ready.append(self.__remove(call_id, call.outcome))
+
+        while self.calls:
+            call_id, call = next(iter(self.calls.items()))
+            if call.last_seen is not None and now - call.last_seen < self.idle_timeout:
+                break
+            ready.append(self.__remove(call_id, TIMEOUT))
+
+        return ready
+
+    # Why a call that has been written out was, None when it isn't one
+    def written_outcome(self, call_id):
+        written = self.completed.get(call_id)
+        return written[0] if written is not None else None
+
+    # Remove and return everything still in progress
+    def flush(self):
+        ready = self.evicted
+        self.evicted = []
+        while self.arrivals:
+            ready.append(self.__remove(self.arrivals.popleft().call_id, FLUSHED))
+        while self.calls:
+            ready.append(self.__remove(next(iter(self.calls)), FLUSHED))
+        return ready
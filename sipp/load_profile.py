@@ -0,0 +1,238 @@
+from sipp.timing import status_code
+
+import csv
+import json
+import math
+import os
+
+# Width of the buckets call arrivals are counted in (seconds)
+DEFAULT_INTERVAL = 10.0
+PERCENTILES = [50, 90, 95, 99]
+# Call limit headroom over the observed peak concurrency
+CONCURRENCY_HEADROOM = 1.2
+# SIPp remote control port used by the rate schedule (sipp -cp)
+CONTROL_PORT = 8888
+
+PROFILE_FILE = "load_profile.json"
+SCHEDULE_FILE = "rate_schedule.csv"
+
+
+# Timestamps of interest for a single Call-ID
+class Call_Timing:
+    __slots__ = ("call_id", "start", "answered", "end", "last", "failed")
+
+    def __init__(self, call_id):
+        self.call_id = call_id
+        self.start = None
+        self.answered = None
+        self.end = None
+        self.last = None
+        self.failed = False
+
+    # Where the call stops counting towards concurrency, the last message when it never finished
+    def finish(self):
+        return self.end if self.end is not None else self.last
+
+
+# Collect per call INVITE / answer / BYE / final failure times from parsed messages (any role, in any order)
+def call_timings(messages):
+    calls = {}
+    for msg in messages:
+        record = msg.record
+        timestamp = record.timestamp
+        if timestamp is None:
+            continue
+
+        call = calls.get(record.call_id)
+        if call is None:
+            call = calls[record.call_id] = Call_Timing(record.call_id)
+        if call.last is None or timestamp > call.last:
+            call.last = timestamp
+
+        cseq_method = msg.cseq_method
+        if record.method == "INVITE" and record.to_tag is None:
+            if call.start is None or timestamp < call.start:
+                call.start = timestamp
+        elif record.method == "BYE":
+            if call.end is None or timestamp < call.end:
+                call.end = timestamp
+        elif record.method is None and cseq_method == "INVITE":
+            code = status_code(msg)
+            if code is None or code < 200:
+                continue
+            if code < 300:
+                if call.answered is None or timestamp < call.answered:
+                    call.answered = timestamp
+            elif call.answered is None and (call.end is None or timestamp < call.end):
+                call.end = timestamp
+                call.failed = True
+
+    # Only calls whose INVITE was captured count as arrivals
+    return [call for call in calls.values() if call.start is not None]
+
+
+# Nearest rank percentile of an already sorted, non empty list
+def percentile(values, rank):
+    index = max(0, math.ceil(rank / 100 * len(values)) - 1)
+    return values[index]
+
+
+def distribution(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+
+    result = {
+        "count": len(values),
+        "min": round(values[0], 3),
+        "mean": round(sum(values) / len(values), 3),
+        "max": round(values[-1], 3)
+    }
+    for rank in PERCENTILES:
+        result[f"p{rank}"] = round(percentile(values, rank), 3)
+    return result
+
+
+# Calls per second of a bucket covering covered seconds of the arrivals, a bucket cut short by the end of the
+# capture (the last or only one) is rated over the gaps between its arrivals like the overall average
+def bucket_rate(count, covered, interval):
+    if covered < interval and count > 1 and covered > 0:
+        return (count - 1) / covered
+    return count / interval
+
+
+# Call arrivals per interval as (seconds from the first INVITE, calls, calls per second)
+def arrival_rates(starts, interval=DEFAULT_INTERVAL):
+    if not starts:
+        return []
+    first = min(starts)
+    arrival_span = max(starts) - first
+    buckets = [0] * (int(arrival_span // interval) + 1)
+    for start in starts:
+        buckets[int((start - first) // interval)] += 1
+    return [(round(index * interval, 3), count,
+             round(bucket_rate(count, min(interval, arrival_span - index * interval), interval), 3))
+            for index, count in enumerate(buckets)]
+
+
+# Peak / time weighted average number of calls in progress, sweeping call start / finish events
+def concurrency(calls):
+    events = []
+    for call in calls:
+        events.append((call.start, 1))
+        events.append((max(call.start, call.finish()), -1))
+    # Finishes sort before starts at the same instant
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    peak = 0
+    peak_at = None
+    current = 0
+    area = 0.0
+    previous = None
+    for timestamp, change in events:
+        if previous is not None:
+            area += current * (timestamp - previous)
+        previous = timestamp
+        current += change
+        if current > peak:
+            peak = current
+            peak_at = timestamp
+
+    span = events[-1][0] - events[0][0] if events else 0
+    return peak, peak_at, (area / span if span > 0 else float(peak))
+
+
+# SIPp expresses rates as calls per rate period (ms), keep whole numbers of calls for low rates
+def sipp_rate(calls_per_second):
+    if calls_per_second >= 1:
+        return max(1, round(calls_per_second)), 1000
+    return max(1, round(calls_per_second * 60)), 60000
+
+
+# Merge consecutive intervals with the same rate into (offset, calls per second) steps
+def rate_schedule(rates):
+    schedule = []
+    for offset, _, calls_per_second in rates:
+        if not schedule or schedule[-1][1] != calls_per_second:
+            schedule.append((offset, calls_per_second))
+    return schedule
+
+
+def build_profile(calls, interval=DEFAULT_INTERVAL):
+    if not calls:
+        raise Exception("No INVITEs with timestamps found, can't derive a load profile!")
+
+    starts = [call.start for call in calls]
+    first = min(starts)
+    span = max(call.finish() for call in calls) - first
+    arrival_span = max(starts) - first
+    rates = arrival_rates(starts, interval)
+
+    average_cps = (len(calls) - 1) / arrival_span if arrival_span > 0 else float(len(calls))
+    # Never below the average, short bursts can still fall across bucket boundaries
+    peak_cps = max(max(calls_per_second for _, _, calls_per_second in rates), round(average_cps, 3))
+    peak, peak_at, average_concurrency = concurrency(calls)
+
+    rate, rate_period = sipp_rate(average_cps)
+    limit = max(1, math.ceil(peak * CONCURRENCY_HEADROOM))
+    arguments = ["-r", str(rate), "-rp", str(rate_period), "-l", str(limit), "-m", str(len(calls))]
+
+    # Stepped ramp from the first interval's rate up to the peak rate, in SIPp's own units
+    peak_rate, peak_period = sipp_rate(peak_cps)
+    start_rate = max(1, round(rates[0][2] * peak_period / 1000))
+    peak_index = max(range(len(rates)), key=lambda index: rates[index][2])
+    ramp_increase = max(1, math.ceil((peak_rate - start_rate) / peak_index)) if peak_index else 0
+    ramp = ["-r", str(start_rate), "-rp", str(peak_period), "-rate_increase", str(ramp_increase),
+            "-rate_interval", str(int(interval)), "-rate_max", str(peak_rate),
+            "-l", str(limit), "-m", str(len(calls))]
+
+    return {
+        "calls": len(calls),
+        "answered": sum(1 for call in calls if call.answered is not None),
+        "failed": sum(1 for call in calls if call.failed),
+        "unfinished": sum(1 for call in calls if call.end is None),
+        "capture_seconds": round(span, 3),
+        "interval_seconds": interval,
+        "average_calls_per_second": round(average_cps, 3),
+        "peak_calls_per_second": peak_cps,
+        "peak_concurrency": peak,
+        "peak_concurrency_offset": round(peak_at - first, 3) if peak_at is not None else None,
+        "average_concurrency": round(average_concurrency, 3),
+        # INVITE -> final BYE / failure (or last message for unfinished calls)
+        "call_seconds": distribution(call.finish() - call.start for call in calls),
+        # Answered calls only, 2xx -> BYE
+        "talk_seconds": distribution(call.end - call.answered for call in calls
+                                     if call.answered is not None and call.end is not None and not call.failed),
+        # INVITE -> 2xx
+        "setup_seconds": distribution(call.answered - call.start for call in calls if call.answered is not None),
+        "arrivals": [{"offset": offset, "calls": count, "calls_per_second": calls_per_second}
+                     for offset, count, calls_per_second in rates],
+        "sipp_arguments": arguments,
+        "sipp_ramp_arguments": ramp if ramp_increase else arguments,
+        "uac_command": "sipp " + " ".join(arguments) + " -sf UAC.xml -base_cseq 1 -i <local_ip> -t u1 "
+                       "-s <called_number> -p 5060 <peer_ip_address>",
+        "uas_command": "sipp --aa -base_cseq 1 -i <local_ip> -sf UAS.xml -p 5060 -l " + str(limit)
+    }
+
+
+# Write load_profile.json and rate_schedule.csv (seconds from start, calls per second) into a directory
+def save_profile(profile, directory):
+    os.makedirs(directory, exist_ok=True)
+    profile_file = os.path.join(directory, PROFILE_FILE)
+    with open(profile_file, 'w') as output:
+        json.dump(profile, output, indent=4)
+
+    schedule_file = os.path.join(directory, SCHEDULE_FILE)
+    with open(schedule_file, 'w', newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(["offset_seconds", "calls_per_second"])
+        for offset, calls_per_second in rate_schedule(
+                [(entry["offset"], entry["calls"], entry["calls_per_second"]) for entry in profile["arrivals"]]):
+            writer.writerow([offset, calls_per_second])
+
+    return profile_file, schedule_file
+
+
+def read_schedule(schedule_file):
+    with open(schedule_file, newline="") as schedule:
+        return [(float(row["offset_seconds"]), float(row["calls_per_second"])) for row in csv.DictReader(schedule)]
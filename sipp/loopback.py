@@ -0,0 +1,693 @@
+from sipp import agent
+from sipp.capture.sip_decoder import REQUEST_LINE, STATUS_LINE, canonical_header, header_tag
+
+from functools import lru_cache
+import asyncio
+import json
+import os
+import re
+import socket
+import time
+import xml.etree.ElementTree as ElementTree
+
+LOOPBACK = "127.0.0.1"
+DEFAULT_CALLS = 1
+DEFAULT_CONCURRENCY = 1000
+# Seconds a recv waits for its message, on top of the (scaled) pauses of both scenarios
+DEFAULT_TIMEOUT = 5.0
+# Pauses are skipped by default, 1.0 plays them at their full length
+DEFAULT_PAUSE_SCALE = 0.0
+DEFAULT_SERVICE = "service"
+DEFAULT_BASE_CSEQ = 1
+MEDIA_PORT = 6000
+SOCKET_BUFFER = 8 * 1024 * 1024
+# Time given to late messages once every call is done, they fail the call they belong to
+SETTLE_TIME = 0.1
+# Distinct failure reasons kept per scenario pair
+MAX_ERRORS = 5
+
+SEND = "send"
+RECV = "recv"
+PAUSE = "pause"
+NOP = "nop"
+
+# Elements SIPp accepts that have no bearing on the message flow
+IGNORED_ELEMENTS = ("label", "ResponseTimeRepartition", "CallLengthRepartition", "Reference")
+
+KEYWORD = re.compile(r"\[([^\[\]]+)\]")
+OFFSET_KEYWORD = re.compile(r"^(cseq|media_port|branch)([+-]\d+)$")
+SIMPLE_KEYWORDS = ("local_ip", "local_port", "remote_ip", "remote_port", "transport", "service", "call_id",
+                   "call_number", "pid", "branch", "cseq", "len", "media_ip", "media_port", "next_url",
+                   "peer_tag_param", "routes", "last_cseq_number", "last_message")
+CONTACT_URI = re.compile(r"<([^>]+)>|(sip:[^;\s,>]+)")
+
+
+# Keyword of a send template split out at load time, so unknown ones fail before any call is made
+class Keyword:
+    __slots__ = ("name", "offset", "header")
+
+    def __init__(self, name, offset=0, header=None):
+        self.name = name
+        self.offset = offset
+        self.header = header
+
+
+def parse_keyword(text):
+    if text in SIMPLE_KEYWORDS:
+        return Keyword(text)
+    match = OFFSET_KEYWORD.match(text)
+    if match:
+        return Keyword(match.group(1), int(match.group(2)))
+    if text.startswith("last_"):
+        return Keyword("last_header", header=text[5:].rstrip(":"))
+    if text.startswith("$"):
+        return Keyword("variable", header=text[1:])
+    if re.match(r"^field\d+", text):
+        raise ValueError(f"[{text}] needs an injection file (-inf), which the generated scenarios don't come with")
+    raise ValueError(f"unknown keyword [{text}]")
+
+
+# Template line as literal text / Keyword parts, lines without keywords stay plain strings
+def compile_line(line):
+    parts = []
+    position = 0
+    for match in KEYWORD.finditer(line):
+        if match.start() > position:
+            parts.append(line[position:match.start()])
+        parts.append(parse_keyword(match.group(1)))
+        position = match.end()
+    if position < len(line):
+        parts.append(line[position:])
+    return parts if position else line
+
+
+# Every message repeats the same few header names
+@lru_cache(maxsize=1024)
+def header_name(name):
+    return canonical_header(name)
+
+
+# One step of a scenario, only the fields of its kind are set
+class Step:
+    __slots__ = ("kind", "request", "response", "optional", "rtd", "start_rtd", "rrs", "milliseconds",
+                 "head", "body", "method", "eregs")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.request = None
+        self.response = None
+        self.optional = False
+        self.rtd = None
+        self.start_rtd = None
+        self.rrs = False
+        self.milliseconds = 0
+        self.head = []
+        self.body = []
+        self.method = None
+        self.eregs = []
+
+    def matches(self, message):
+        if self.request is not None:
+            return message.method == self.request
+        return message.status == self.response
+
+    def describe(self):
+        if self.kind == RECV:
+            return f"recv {self.request or self.response}"
+        if self.kind == SEND:
+            return f"send {self.method or 'response'}"
+        return self.kind
+
+
+# Send template as SIPp reads it: lines stripped, blank lines around the message dropped, the first blank
+# line inside it separating the headers from the body
+def compile_send(step, text):
+    lines = [line.strip() for line in (text or "").splitlines()]
+    while lines and not lines[0]:
+        lines.pop(0)
+    while lines and not lines[-1]:
+        lines.pop()
+    if not lines:
+        raise ValueError("empty <send>")
+
+    separator = lines.index("") if "" in lines else len(lines)
+    step.head = [compile_line(line) for line in lines[:separator]]
+    step.body = [compile_line(line) for line in lines[separator + 1:] if line]
+    first = lines[0].split(" ", 1)[0]
+    step.method = None if first.startswith("SIP/") else first
+
+
+def true_attribute(element, name):
+    return element.get(name, "false").lower() == "true"
+
+
+# Parsed SIPp scenario, raises ValueError for anything SIPp would refuse to load
+class Scenario:
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = []
+        try:
+            root = ElementTree.parse(path).getroot()
+        except ElementTree.ParseError as e:
+            raise ValueError(f"{path}: {e}")
+        if root.tag != "scenario":
+            raise ValueError(f"{path}: expected a <scenario> document")
+        self.name = root.get("name", "")
+
+        try:
+            for element in root:
+                step = self.__step(element)
+                if step is not None:
+                    self.steps.append(step)
+            self.__check_variables()
+        except ValueError as e:
+            raise ValueError(f"{path}: step {len(self.steps)}: {e}")
+        if not self.steps:
+            raise ValueError(f"{path}: scenario has no steps")
+
+        self.pause_milliseconds = sum(step.milliseconds for step in self.steps)
+        self.messages = sum(1 for step in self.steps if step.kind == SEND)
+        # The side whose scenario starts with a send places the call, the other waits for it
+        self.initiates = next((step.kind == SEND for step in self.steps if step.kind in (SEND, RECV)), False)
+
+    def __step(self, element):
+        if element.tag == "send":
+            step = Step(SEND)
+            step.start_rtd = element.get("start_rtd")
+            compile_send(step, element.text)
+        elif element.tag == "recv":
+            step = Step(RECV)
+            step.request = element.get("request")
+            step.response = element.get("response")
+            if (step.request is None) == (step.response is None):
+                raise ValueError("<recv> needs exactly one of request / response")
+            step.optional = true_attribute(element, "optional")
+            step.rrs = true_attribute(element, "rrs")
+            step.rtd = element.get("rtd")
+            for ereg in element.iter("ereg"):
+                step.eregs.append((re.compile(ereg.get("regexp", "")), ereg.get("search_in", "msg"),
+                                   ereg.get("header"), ereg.get("assign_to", "").split(",")))
+        elif element.tag == "pause":
+            step = Step(PAUSE)
+            step.milliseconds = int(element.get("milliseconds", "0"))
+        elif element.tag == "nop":
+            # Media replay (exec play_pcap_audio) is not part of the signalling check
+            step = Step(NOP)
+        elif element.tag in IGNORED_ELEMENTS:
+            return None
+        else:
+            raise ValueError(f"unsupported <{element.tag}>")
+        return step
+
+    def __check_variables(self):
+        assigned = {name.strip() for step in self.steps for ereg in step.eregs for name in ereg[3] if name.strip()}
+        for step in self.steps:
+            for line in step.head + step.body:
+                for part in line:
+                    if isinstance(part, Keyword) and part.name == "variable" and part.header not in assigned:
+                        raise ValueError(f"[${part.header}] is never assigned")
+
+
+# Received message, headers as (canonical name, full line) in arrival order
+class Message:
+    __slots__ = ("method", "status", "headers", "text")
+
+    def __init__(self, method, status, headers, text):
+        self.method = method
+        self.status = status
+        self.headers = headers
+        self.text = text
+
+    def header(self, name):
+        name = header_name(name)
+        values = [line.split(":", 1)[1].strip() for header, line in self.headers if header == name]
+        return ", ".join(values) if values else None
+
+    def header_line(self, name):
+        name = header_name(name)
+        lines = [line for header, line in self.headers if header == name]
+        if not lines:
+            return ""
+        if len(lines) == 1:
+            return lines[0]
+        return lines[0].split(":", 1)[0] + ": " + ", ".join(line.split(":", 1)[1].strip() for line in lines)
+
+    def describe(self):
+        return self.method if self.method is not None else self.status
+
+
+def parse_message(data):
+    head = data.split(b"\r\n\r\n", 1)[0]
+    lines = head.split(b"\r\n")
+    request = REQUEST_LINE.match(lines[0])
+    status = STATUS_LINE.match(lines[0]) if request is None else None
+    if request is None and status is None:
+        return None
+
+    headers = []
+    for line in lines[1:]:
+        colon = line.find(b":")
+        if colon <= 0:
+            continue
+        text = line.decode("utf-8", "replace")
+        headers.append((header_name(text[:colon].strip()), text))
+    return Message(request.group(1).decode() if request else None, status.group(1).decode() if status else None,
+                   headers, data.decode("utf-8", "replace"))
+
+
+# Tally for one UAC / UAS pair
+class Pair_Result:
+
+    def __init__(self, name, uac, uas):
+        self.name = name
+        self.uac = uac
+        self.uas = uas
+        self.calls = 0
+        self.passed = 0
+        self.failed = 0
+        self.messages = 0
+        self.late = 0
+        self.load_error = None
+        self.errors = {}
+        self.rtd = {}
+
+    # The pair couldn't be loaded, none of its calls are played
+    def unloadable(self, error):
+        self.load_error = str(error)
+
+    def fail(self, reason):
+        if reason in self.errors or len(self.errors) < MAX_ERRORS:
+            self.errors[reason] = self.errors.get(reason, 0) + 1
+
+    def ok(self):
+        return self.load_error is None and self.failed == 0 and self.late == 0
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "UAC": self.uac,
+            "UAS": self.uas,
+            "status": "ok" if self.ok() else "failed",
+            "calls": self.calls,
+            "passed": self.passed,
+            "failed": self.failed,
+            "late_messages": self.late,
+            "error": self.load_error,
+            "errors": self.errors,
+            "rtd_ms": {name: round(total / count * 1000, 3) for name, (total, count) in self.rtd.items()}
+        }
+
+
+# One side of one call stepping through its scenario
+class Scenario_Call:
+
+    def __init__(self, runner, role, scenario, call_id, call_number, result, timeout):
+        self.runner = runner
+        self.role = role
+        self.scenario = scenario
+        self.call_id = call_id
+        self.call_number = call_number
+        self.result = result
+        self.timeout = timeout
+        self.endpoint = runner.endpoints[role]
+        self.peer = runner.endpoints[agent.SERVER if role == agent.CLIENT else agent.CLIENT]
+
+        self.inbox = asyncio.Queue()
+        self.cseq = runner.base_cseq - 1
+        self.last = None
+        self.next_url = None
+        self.peer_tag = None
+        self.routes = None
+        self.variables = {}
+        self.rtd = {}
+        self.task = None
+        self.error = None
+        self.finished = False
+
+    def deliver(self, message):
+        if self.finished:
+            # Leftovers of a call that already failed say nothing new
+            if self.error is not None:
+                return
+            self.result.late += 1
+            self.result.fail(f"{self.role}: {message.describe()} received after the scenario ended")
+            return
+        self.inbox.put_nowait(message)
+
+    async def run(self):
+        steps = self.scenario.steps
+        index = 0
+        try:
+            while index < len(steps):
+                step = steps[index]
+                if step.kind == SEND:
+                    self.__send(step, index)
+                    index += 1
+                elif step.kind == RECV:
+                    index = await self.__recv(steps, index)
+                elif step.kind == PAUSE:
+                    if self.runner.pause_scale > 0:
+                        await asyncio.sleep(step.milliseconds / 1000 * self.runner.pause_scale)
+                    index += 1
+                else:
+                    index += 1
+        except asyncio.CancelledError:
+            self.error = self.error or "aborted"
+        except Exception as e:
+            self.error = f"{self.role} step {index}: {e}"
+        self.finished = True
+        # Anything already queued arrived after the last step it could have matched
+        while not self.inbox.empty():
+            self.deliver(self.inbox.get_nowait())
+        self.last = None
+        self.variables.clear()
+
+    async def __recv(self, steps, index):
+        if not self.inbox.empty():
+            message = self.inbox.get_nowait()
+        else:
+            try:
+                message = await asyncio.wait_for(self.inbox.get(), self.timeout)
+            except asyncio.TimeoutError:
+                raise Exception(f"timed out waiting for {steps[index].describe()}")
+
+        position = index
+        while position < len(steps) and steps[position].kind == RECV:
+            step = steps[position]
+            if step.matches(message):
+                self.__received(step, message)
+                return position + 1
+            if not step.optional:
+                break
+            position += 1
+        raise Exception(f"unexpected {message.describe()} while waiting for {steps[index].describe()}")
+
+    def __received(self, step, message):
+        self.last = message
+        contact = message.header("Contact")
+        if contact:
+            match = CONTACT_URI.search(contact)
+            if match:
+                self.next_url = match.group(1) or match.group(2)
+        tag = header_tag(message.header("To" if self.role == agent.CLIENT else "From"))
+        if tag is not None:
+            self.peer_tag = tag
+        if step.rrs:
+            self.routes = message.header("Record-Route")
+        if step.rtd is not None and step.rtd in self.rtd:
+            total, count = self.result.rtd.get(step.rtd, (0.0, 0))
+            self.result.rtd[step.rtd] = (total + time.perf_counter() - self.rtd.pop(step.rtd), count + 1)
+
+        for regexp, search_in, header, names in step.eregs:
+            text = message.header(header.rstrip(": ")) if search_in == "hdr" and header else message.text
+            match = regexp.search(text or "")
+            if match:
+                self.variables[names[0].strip()] = match.group(0)
+                for name, value in zip(names[1:], match.groups()):
+                    self.variables[name.strip()] = value or ""
+
+    def __send(self, step, index):
+        if step.method is not None and step.method not in ("ACK", "CANCEL"):
+            self.cseq += 1
+        body = "".join((line if isinstance(line, str) else self.__substitute(line, index, 0)) + "\r\n"
+                       for line in step.body)
+        length = len(body.encode("utf-8"))
+
+        head = []
+        for line in step.head:
+            if isinstance(line, str):
+                head.append(line)
+                continue
+            text = self.__substitute(line, index, length)
+            # SIPp drops a line that was nothing but keywords with no value i.e. a missing [last_Via:]
+            if text or not all(isinstance(part, Keyword) for part in line):
+                head.append(text)
+
+        if step.start_rtd is not None:
+            self.rtd[step.start_rtd] = time.perf_counter()
+        self.endpoint.send(("\r\n".join(head) + "\r\n\r\n" + body).encode("utf-8"), self.peer.address)
+        self.result.messages += 1
+
+    def __substitute(self, line, index, length):
+        output = []
+        for part in line:
+            output.append(part if isinstance(part, str) else self.__value(part, index, length))
+        return "".join(output)
+
+    def __value(self, keyword, index, length):
+        name = keyword.name
+        if name == "local_ip" or name == "media_ip":
+            return self.endpoint.address[0]
+        if name == "local_port":
+            return str(self.endpoint.address[1])
+        if name == "remote_ip":
+            return self.peer.address[0]
+        if name == "remote_port":
+            return str(self.peer.address[1])
+        if name == "transport":
+            return "UDP"
+        if name == "service":
+            return self.runner.service
+        if name == "call_id":
+            return self.call_id
+        if name == "call_number":
+            return str(self.call_number)
+        if name == "pid":
+            return str(self.runner.pid)
+        if name == "branch":
+            return f"z9hG4bK-{self.runner.pid}-{self.call_number}-{index + keyword.offset}"
+        if name == "cseq":
+            return str(self.cseq + keyword.offset)
+        if name == "len":
+            return str(length)
+        if name == "media_port":
+            return str(MEDIA_PORT + keyword.offset)
+        if name == "next_url":
+            if self.next_url is None:
+                raise Exception("[next_url] used before any Contact was received")
+            return self.next_url
+        if name == "peer_tag_param":
+            return f";tag={self.peer_tag}" if self.peer_tag else ""
+        if name == "routes":
+            return f"Route: {self.routes}" if self.routes else ""
+        if name == "last_cseq_number":
+            cseq = self.last.header("CSeq") if self.last is not None else None
+            return cseq.split()[0] if cseq else ""
+        if name == "last_message":
+            return self.last.text if self.last is not None else ""
+        if name == "last_header":
+            return self.last.header_line(keyword.header) if self.last is not None else ""
+        return self.variables.get(keyword.header, "")
+
+
+# Shared UDP socket of one side, incoming messages are handed to their call by Call-ID
+class Loopback_Endpoint(asyncio.DatagramProtocol):
+
+    def __init__(self, role):
+        self.role = role
+        self.calls = {}
+        self.transport = None
+        self.address = None
+        self.stray = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, option, SOCKET_BUFFER)
+            except OSError:
+                pass
+        self.address = sock.getsockname()
+
+    def datagram_received(self, data, addr):
+        message = parse_message(data)
+        call = self.calls.get(message.header("Call-ID")) if message is not None else None
+        if call is None:
+            self.stray += 1
+            return
+        call.deliver(message)
+
+    def send(self, data, address):
+        if self.transport is None:
+            raise Exception(f"{self.role} endpoint is not connected")
+        self.transport.sendto(data, address)
+
+
+# Plays UAC scenarios against their UAS over two loopback UDP sockets, up to concurrency calls at a time. A
+# pair passing only means it is self consistent, both halves come from the same (possibly wrong) dialog
+class Loopback_Runner:
+
+    def __init__(self, calls=DEFAULT_CALLS, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT,
+                 pause_scale=DEFAULT_PAUSE_SCALE, service=DEFAULT_SERVICE, base_cseq=DEFAULT_BASE_CSEQ):
+        self.calls = calls
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.pause_scale = pause_scale
+        self.service = service
+        self.base_cseq = base_cseq
+        self.pid = os.getpid()
+        self.endpoints = {}
+        self.call_number = 0
+
+    # pairs: [(name, UAC path, UAS path)], returns (summary dict, [Pair_Result])
+    def run(self, pairs):
+        return asyncio.run(self.__run(pairs))
+
+    async def __run(self, pairs):
+        loop = asyncio.get_running_loop()
+        transports = []
+        for role in (agent.CLIENT, agent.SERVER):
+            transport, endpoint = await loop.create_datagram_endpoint(
+                lambda role=role: Loopback_Endpoint(role), local_addr=(LOOPBACK, 0))
+            transports.append(transport)
+            self.endpoints[role] = endpoint
+
+        results = []
+        loaded = []
+        for name, uac, uas in pairs:
+            result = Pair_Result(name, uac, uas)
+            results.append(result)
+            try:
+                scenarios = {agent.CLIENT: Scenario(uac), agent.SERVER: Scenario(uas)}
+                if not any(scenario.initiates for scenario in scenarios.values()):
+                    raise ValueError("neither scenario starts with a send")
+            except (OSError, ValueError) as e:
+                result.unloadable(e)
+                continue
+            loaded.append((result, scenarios))
+
+        start = time.perf_counter()
+        limit = asyncio.Semaphore(self.concurrency)
+        tasks = []
+        for _ in range(self.calls):
+            for result, scenarios in loaded:
+                await limit.acquire()
+                task = asyncio.ensure_future(self.__call(result, scenarios))
+                task.add_done_callback(lambda _: limit.release())
+                tasks.append(task)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(SETTLE_TIME)
+
+        for transport in transports:
+            transport.close()
+
+        calls = sum(result.calls for result in results)
+        messages = sum(result.messages for result in results)
+        summary = {
+            "pairs": len(results),
+            "passed_pairs": sum(1 for result in results if result.ok()),
+            "calls": calls,
+            "passed": sum(result.passed for result in results),
+            "failed": sum(result.failed for result in results),
+            "stray_messages": sum(endpoint.stray for endpoint in self.endpoints.values()),
+            "concurrency": self.concurrency,
+            "seconds": round(elapsed, 3),
+            "calls_per_second": round(calls / elapsed, 1) if elapsed > 0 else 0.0,
+            "messages_per_second": round(messages / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        return summary, results
+
+    # Both sides of one call, started together and registered under the same Call-ID
+    async def __call(self, result, scenarios):
+        self.call_number += 1
+        call_id = f"{self.call_number}-{self.pid}@{LOOPBACK}"
+        timeout = self.timeout + self.pause_scale * sum(
+            scenario.pause_milliseconds for scenario in scenarios.values()) / 1000
+
+        sides = []
+        for role, scenario in scenarios.items():
+            call = Scenario_Call(self, role, scenario, call_id, self.call_number, result, timeout)
+            self.endpoints[role].calls[call_id] = call
+            sides.append(call)
+        for call in sides:
+            call.task = asyncio.ensure_future(call.run())
+
+        # One side failing leaves the other waiting on a message that won't come, it is stopped right away
+        pending = {call.task for call in sides}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if any(call.error for call in sides):
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                break
+
+        result.calls += 1
+        errors = [call.error for call in sides if call.error and call.error != "aborted"]
+        if errors:
+            result.failed += 1
+            for error in errors:
+                result.fail(error)
+        else:
+            result.passed += 1
+
+
+# (name, UAC, UAS) pairs from a UAC / UAS directory, a per dialog output directory or its index.json
+def find_pairs(source):
+    index_file = source if source.endswith(".json") else os.path.join(source, "index.json")
+    if os.path.isfile(index_file):
+        return index_pairs(index_file)
+
+    uac = os.path.join(source, agent.CLIENT + ".xml")
+    uas = os.path.join(source, agent.SERVER + ".xml")
+    if os.path.isfile(uac) and os.path.isfile(uas):
+        return [(source, uac, uas)]
+
+    # Directory of scenario pair directories
+    pairs = []
+    for name in sorted(os.listdir(source)):
+        directory = os.path.join(source, name)
+        if os.path.isfile(os.path.join(directory, agent.CLIENT + ".xml")) and \
+                os.path.isfile(os.path.join(directory, agent.SERVER + ".xml")):
+            pairs.append((directory, os.path.join(directory, agent.CLIENT + ".xml"),
+                          os.path.join(directory, agent.SERVER + ".xml")))
+    if not pairs:
+        raise ValueError(f"No UAC / UAS scenarios found in {source}")
+    return pairs
+
+
+# Index paths are relative to the index's directory
+def resolve_path(path, root):
+    return os.path.join(root, path)
+
+
+def index_pairs(index_file):
+    with open(index_file) as index:
+        dialogs = json.load(index)["dialogs"]
+
+    root = os.path.dirname(index_file)
+    pairs = []
+    seen = set()
+    for dialog in dialogs:
+        if not dialog.get(agent.CLIENT) or not dialog.get(agent.SERVER):
+            continue
+        pair = (resolve_path(dialog[agent.CLIENT], root), resolve_path(dialog[agent.SERVER], root))
+        # Unique flow output points many dialogs at the same pair
+        if pair in seen:
+            continue
+        seen.add(pair)
+        pairs.append((dialog.get("call_id") or os.path.dirname(pair[0]), pair[0], pair[1]))
+    return pairs
+
+
+def summary_text(summary, results, verbose=True):
+    lines = []
+    for result in results:
+        if not verbose and result.ok():
+            continue
+        status = "ok" if result.ok() else "FAILED"
+        lines.append(f"{status:<6} {result.passed}/{result.calls} calls  {result.name}")
+        if result.load_error:
+            lines.append(f"       {result.load_error}")
+        for error, count in result.errors.items():
+            lines.append(f"       {count} x {error}")
+    lines.append(f"{summary['passed_pairs']}/{summary['pairs']} scenario pairs passed, "
+                 f"{summary['passed']}/{summary['calls']} calls in {summary['seconds']}s "
+                 f"({summary['calls_per_second']} calls/s, {summary['messages_per_second']} messages/s, "
+                 f"up to {summary['concurrency']} concurrent)")
+    if summary["stray_messages"]:
+        lines.append(f"{summary['stray_messages']} messages matched no call")
+    return "\n".join(lines)
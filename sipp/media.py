@@ -0,0 +1,142 @@
+import sipp.agent as agent
+from sipp.capture.pcap_reader import Pcap_Reader, PCAPNG_SPB
+from sipp.capture.decode import decode_udp
+from sipp.dialogs import UNSAFE_CHARACTERS, MAX_DIRECTORY_NAME
+
+import bisect
+import os
+import socket
+import struct
+
+MEDIA_DIRECTORY = "media"
+
+# SIPp exec action able to replay each media type, anything else (rtcp included) is extracted but not played
+PLAY_ACTIONS = {
+    "audio": "play_pcap_audio",
+    "video": "play_pcap_video",
+}
+RTCP_SUFFIX = "_rtcp"
+
+OTHER_ROLE = {agent.CLIENT: agent.SERVER, agent.SERVER: agent.CLIENT}
+
+
+# Media endpoints (address / port) advertised in every call's SDPs, an endpoint reused by a later call
+# belongs to that call from the time its SDP was seen
+class Media_Index:
+    def __init__(self):
+        # (packed address, port) -> ([sdp times], [(call_id, role, kind)]) sorted on time
+        self.endpoints = {}
+        # Call-ID -> order of first appearance, keeps media directory names unique
+        self.calls = {}
+
+    # Register the media offered in a message, role is whoever sent the SDP
+    def add(self, role, msg):
+        record = msg.record
+        if msg.direction.value != "SEND":
+            role = OTHER_ROLE[role]
+        if record.call_id not in self.calls:
+            self.calls[record.call_id] = len(self.calls)
+
+        timestamp = record.timestamp if record.timestamp is not None else 0.0
+        for media, address, port in record.media:
+            try:
+                packed = socket.inet_aton(address)
+            except OSError:
+                continue
+            for stream_port, kind in [(port, media), (port + 1, media + RTCP_SUFFIX)]:
+                times, owners = self.endpoints.setdefault((packed, stream_port), ([], []))
+                owner = (record.call_id, role, kind)
+                index = bisect.bisect_right(times, timestamp)
+                # The same SDP is seen by both roles / on every proxy hop
+                if index and owners[index - 1] == owner:
+                    continue
+                times.insert(index, timestamp)
+                owners.insert(index, owner)
+
+    @classmethod
+    def from_messages(cls, pcap_dict):
+        index = cls()
+        for role in [agent.CLIENT, agent.SERVER]:
+            for msg in pcap_dict[role]:
+                if msg.record.media:
+                    index.add(role, msg)
+        return index
+
+    def __lookup(self, address, port, timestamp):
+        entry = self.endpoints.get((address, port))
+        if entry is None:
+            return None
+        times, owners = entry
+        # Media can race ahead of the SDP that announced it
+        return owners[max(0, bisect.bisect_right(times, timestamp) - 1)]
+
+    # (call_id, sending role, kind) for a datagram, matched on its source endpoint or else its destination
+    def owner(self, datagram, timestamp):
+        owner = self.__lookup(datagram.src, datagram.sport, timestamp)
+        if owner is not None:
+            return owner
+        owner = self.__lookup(datagram.dst, datagram.dport, timestamp)
+        if owner is not None:
+            call_id, role, kind = owner
+            return call_id, OTHER_ROLE[role], kind
+        return None
+
+
+def call_directory(index, call_id):
+    name = UNSAFE_CHARACTERS.sub("_", call_id or "unknown")[:MAX_DIRECTORY_NAME]
+    return f"{index.calls.get(call_id, 0):06d}_{name}"
+
+
+# Frames of a pcap capture are copied verbatim (record header included) along with the file header
+def write_pcap_stream(reader, outfile, frames):
+    view = reader.view
+    with open(outfile, "wb") as output:
+        output.write(view[0:24])
+        for offset, length, _, _ in frames:
+            output.write(view[offset:offset + length])
+
+
+# Pcapng blocks are turned into microsecond pcap records, the packet bytes themselves are copied as is
+def write_pcapng_stream(reader, outfile, frames):
+    view = reader.view
+    with open(outfile, "wb") as output:
+        output.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, frames[0][3]))
+        endian = reader.section_endian
+        for offset, length, timestamp, _ in frames:
+            block_type, = struct.unpack_from(endian + "I", view, offset)
+            if block_type == PCAPNG_SPB:
+                data_start = offset + 12
+                data_length = min(struct.unpack_from(endian + "I", view, offset + 8)[0], length - 16)
+            else:
+                data_start = offset + 28
+                data_length = min(struct.unpack_from(endian + "I", view, offset + 20)[0], length - 32)
+
+            seconds, microseconds = divmod(int(round(timestamp * 1000000)), 1000000)
+            output.write(struct.pack("<IIII", seconds, microseconds, data_length, data_length))
+            output.write(view[data_start:data_start + data_length])
+
+
+# Single pass over the capture picking out every call's RTP / RTCP, written as one pcap per
+# call / sending role / media type under <output_directory>/media/. Returns
+# {(call_id, role): {kind: path}}
+def extract_media(input_file, index, output_directory):
+    streams = {}
+    with Pcap_Reader(input_file) as reader:
+        for frame in reader:
+            datagram = decode_udp(frame.linktype, frame.data)
+            if datagram is None:
+                continue
+            owner = index.owner(datagram, frame.timestamp)
+            if owner is not None:
+                streams.setdefault(owner, []).append((frame.offset, frame.length, frame.timestamp, frame.linktype))
+
+        write_stream = write_pcap_stream if reader.format == "pcap" else write_pcapng_stream
+        media_files = {}
+        for (call_id, role, kind), frames in streams.items():
+            directory = os.path.join(output_directory, MEDIA_DIRECTORY, call_directory(index, call_id))
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{role}_{kind}.pcap")
+            write_stream(reader, path, frames)
+            media_files.setdefault((call_id, role), {})[kind] = path
+
+    return media_files
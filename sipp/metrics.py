@@ -0,0 +1,104 @@
+import json
+import time
+
+# Conversion stages, in pipeline order
+CACHE = "cache"        # parse cache lookups / stores
+DISSECT = "dissect"    # reading the capture (native reader, tshark fields or pyshark dissection)
+HEADERS = "headers"    # turning dissected packets into packet records, sdp excluded
+SDP = "sdp"            # sdp parsing / rewriting
+RENDER = "render"      # sip_methods template rendering
+FORMAT = "format"      # re-indenting the remaining actions (<recv>, <pause>...)
+WRITE = "write"        # scenario and index file writes
+
+STAGES = [CACHE, DISSECT, HEADERS, SDP, RENDER, FORMAT, WRITE]
+
+# Counters
+PACKETS_DISSECTED = "packets_dissected"
+PACKETS_CAPTURED = "packets_captured"
+PACKETS_DROPPED = "packets_dropped"
+FRAMES_READ = "frames_read"
+FRAMES_FILTERED = "frames_filtered"
+MESSAGES = "messages"
+MESSAGES_LATE = "messages_late"
+
+
+class Stage:
+    __slots__ = ("seconds", "calls", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.calls = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def as_dict(self):
+        return {
+            "seconds": round(self.seconds, 6),
+            "calls": self.calls,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
+
+
+# Wall time, call counts and bytes in / out per stage plus free form counters, cheap enough to always collect
+class Metrics:
+
+    def __init__(self):
+        self.stages = {name: Stage() for name in STAGES}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def add(self, name, seconds, bytes_in=0, bytes_out=0, calls=1):
+        stage = self.stages[name]
+        stage.seconds += seconds
+        stage.calls += calls
+        stage.bytes_in += bytes_in
+        stage.bytes_out += bytes_out
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Fold in the stages / counters collected by another Metrics (i.e. a worker process)
+    def merge(self, other):
+        for name, stage in other.stages.items():
+            self.add(name, stage.seconds, stage.bytes_in, stage.bytes_out, stage.calls)
+        for name, value in other.counters.items():
+            self.count(name, value)
+
+    # Time spent producing every item of a (lazy) iterable, i.e. the dissector behind a packet generator
+    def timed(self, name, iterable):
+        stage = self.stages[name]
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stage.seconds += time.perf_counter() - start
+                return
+            stage.seconds += time.perf_counter() - start
+            stage.calls += 1
+            yield item
+
+    def as_dict(self):
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 6),
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+            "counters": dict(self.counters)
+        }
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        lines = [f"{'stage':<10} {'calls':>10} {'seconds':>10} {'share':>7} {'bytes in':>12} {'bytes out':>12}"]
+        for name, stage in self.stages.items():
+            share = stage.seconds / wall * 100 if wall else 0.0
+            lines.append(f"{name:<10} {stage.calls:>10} {stage.seconds:>10.4f} {share:>6.1f}% "
+                         f"{stage.bytes_in:>12} {stage.bytes_out:>12}")
+        lines.append(f"{'wall':<10} {'':>10} {wall:>10.4f}")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<20} {value:>10}")
+        return "\n".join(lines)
+
+    def save(self, outfile):
+        with open(outfile, 'w') as output:
+            json.dump(self.as_dict(), output, indent=4)
@@ -1,22 +1,132 @@
-import pyshark
-
 import sipp.agent as agent
+import sipp.capture as capture
 from sipp.agent import sipp_agent
+from sipp.capture.capture_filter import Capture_Filter
+from sipp.capture import follow, native_source, tshark_source
+from sipp.capture.sip_decoder import canonical_header, header_keys, parse_headers
+from sipp.dialogs import Dialog_Index
+from sipp.fingerprint import Flow_Index
+from sipp.roles import Role_Index
+from sipp import live
+from sipp import load_profile
+from sipp import media
+from sipp import metrics
+from sipp import pipeline
+from sipp import sdp
+from sipp import spill
+from sipp import timing
 
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
+from itertools import repeat
+import io
+import json
 import os
-import re
+import time
+
+# Bump whenever parsing output changes, invalidates any cached parse results
+PARSER_VERSION = 6
+
+# Chunks handed to each worker when parsing a capture in parallel, evens out chunks that parse slower
+CHUNKS_PER_JOB = 4
+
+# Headers kept on every record besides the ones the parser reads itself (method, Call-ID, tags, CSeq, sdp)
+DEFAULT_HEADER_WHITELIST = ("Contact", "Record-Route", "User-Agent", "Server")
+
+
+# Everything decoded from a single SIP packet, parsed once and shared (read only) between roles. Addresses,
+# methods and status lines are shared strings, only whitelisted headers are kept and the native reader
+# keeps those as raw header lines that are decoded on access
+class packet_record:
+    __slots__ = ("src", "dst", "method", "status_code", "status_line", "headers", "sdp",
+                 "call_id", "from_tag", "to_tag", "timestamp", "cseq", "media")
 
+    def __init__(self, src, dst, method, status_code, status_line, headers, sdp,
+                 call_id, from_tag, to_tag, timestamp=None, cseq=None, media=()):
+        self.src = src
+        self.dst = dst
+        self.method = method
+        self.status_code = status_code
+        self.status_line = status_line
+        # dict, raw header lines (bytes) or None
+        self.headers = headers
+        self.sdp = sdp
+        self.call_id = call_id
+        self.from_tag = from_tag
+        self.to_tag = to_tag
+        self.timestamp = timestamp
+        self.cseq = cseq
+        # (media type, address, port) offered by the original sdp, before it was rewritten
+        self.media = media
 
-# Message object wrapper
+    @property
+    def header(self):
+        headers = self.headers
+        if headers is None:
+            return {}
+        if isinstance(headers, bytes):
+            return parse_headers(headers)
+        return headers
+
+
+# Message object wrapper, a lightweight per role view of a packet_record that only adds the direction
 class message:
-    def __init__(self):
-        self.direction = None
-        self.src = None
-        self.dst = None
-        self.method = None
-        self.header = None
-        self.sdp = ""
+    __slots__ = ("record", "direction")
+
+    def __init__(self, record, direction):
+        self.record = record
+        self.direction = direction
+
+    @property
+    def src(self):
+        return self.record.src
+
+    @property
+    def dst(self):
+        return self.record.dst
+
+    # On situations where we don't use a sip.Method, we will get the status code i.e. 100 TRYING, 183 etc...
+    # sent responses need the full status line, received ones only the code
+    @property
+    def method(self):
+        record = self.record
+        if record.method is not None:
+            return record.method
+        if self.direction == DIR.SEND:
+            return record.status_line
+        if self.direction == DIR.RECV:
+            return record.status_code
+        return None
+
+    @property
+    def header(self):
+        return self.record.header
+
+    @property
+    def sdp(self):
+        return self.record.sdp
+
+    @property
+    def call_id(self):
+        return self.record.call_id
+
+    @property
+    def from_tag(self):
+        return self.record.from_tag
+
+    @property
+    def to_tag(self):
+        return self.record.to_tag
+
+    @property
+    def timestamp(self):
+        return self.record.timestamp
+
+    # Method the CSeq refers to, identifies which request a response belongs to
+    @property
+    def cseq_method(self):
+        cseq = self.record.cseq
+        return cseq.split()[-1] if cseq else None
 
     # Basic validation
     # We require everything except for an SDP
@@ -52,126 +162,638 @@ class SIP_Parser:
 
     OUTPUT_DIRECTORY = "scenarios"
 
-    def __init__(self, client_addr, server_addr, proxy):
+    def __init__(self, client_addr, server_addr, proxy, backend=capture.PYSHARK, per_dialog=False,
+                 output_directory=None, cache=None, capture_filter=None,
+                 time_scale=timing.DEFAULT_TIME_SCALE, pause_threshold=timing.DEFAULT_PAUSE_THRESHOLD_MS,
+                 quiet=False, stage_metrics=None, unique_flows=False, extract_media=False,
+                 memory_limit=None, spill_directory=None, spill_buckets=None,
+                 header_whitelist=DEFAULT_HEADER_WHITELIST, jobs=1, dissector_pool=None, roles=(), log=None):
         self.uac_ip = client_addr
         self.uas_ip = server_addr
-        self.pcap_dict = {
-            agent.CLIENT: [],
-            agent.SERVER: []
-        }
+
+        # Client / server (addresses or CIDR ranges) plus any extra (label, endpoints) roles, every packet is
+        # classified against all of them in the same pass and each role gets a scenario of its own
+        self.role_index = Role_Index(client_addr, server_addr, roles)
+        self.roles = self.role_index.labels
+        self.pcap_dict = {role: [] for role in self.roles}
         self.proxy = proxy
 
-    # Extract useful information from packet
-    def __parse_packet(self, packet, ip_layer, address):
-        msg = message()
+        if backend not in capture.BACKENDS:
+            raise ValueError(f"Unknown capture backend {backend}, expected one of {capture.BACKENDS}")
+        self.backend = backend
 
-        # Get direction of packet
-        if address in ip_layer._all_fields["ip.src"]:
-            msg.direction = DIR.SEND
-        elif address in ip_layer._all_fields["ip.dst"]:
-            msg.direction = DIR.RECV
+        # Call-ID / tag index built while reading the capture, only needed for per dialog output
+        self.dialog_index = Dialog_Index(self.roles) if per_dialog or unique_flows else None
+
+        # Call flow fingerprints, only the first dialog of each distinct flow is rendered when set
+        self.flows = Flow_Index() if unique_flows else None
+
+        # Calls in progress while following a live capture (see follow_pcap)
+        self.live = None
+
+        # RTP / RTCP of every call copied out of the capture and replayed by the scenarios after the ACK
+        if extract_media and self.role_index.extra_roles:
+            raise ValueError("Media extraction only follows the client / server pair, it can't be combined "
+                             "with extra roles")
+        self.extract_media = extract_media
+        self.media_files = None
+        self.input_file = None
+
+        self.output_directory = output_directory if output_directory is not None else self.OUTPUT_DIRECTORY
+
+        # Optional Parse_Cache, skips dissection entirely when the same capture / endpoints were parsed before
+        self.cache = cache
+
+        # Only the client / server traffic is handed to the dissector unless told otherwise
+        if capture_filter is None:
+            capture_filter = Capture_Filter(self.role_index.addresses())
+        self.capture_filter = capture_filter
+
+        # Replay pacing, gaps between messages are scaled by time_scale (0 disables pauses)
+        self.time_scale = time_scale
+        self.pause_threshold = pause_threshold
+
+        # Per packet logging is skipped in quiet mode, printing is a real cost on large captures
+        self.quiet = quiet
+        # Text stream the parser logs to, stdout when None
+        self.log = log
+
+        # Per stage timings / counters (see sipp.metrics)
+        self.metrics = stage_metrics if stage_metrics is not None else metrics.Metrics()
+
+        # Headers held on to per message, everything else is dropped as the packet is parsed
+        self.header_whitelist = frozenset(header_whitelist)
+        self.keep_headers = header_keys(header_whitelist)
+
+        # Long lived tshark processes (see sipp.capture.dissector_pool) used by the tshark backend instead of
+        # starting a new tshark for every capture
+        self.dissector_pool = dissector_pool
+
+        # Worker processes parsing chunks of a single capture (native backend) / rendering spilled buckets
+        self.jobs = jobs
+        # Messages parsed by a chunk worker, handed back to the main parser in capture order
+        self.chunk_messages = None
+
+        # Bounded memory mode, parsed messages are spilled into Call-ID buckets on disk (see sipp.spill)
+        # instead of being held in pcap_dict, every bucket is then rendered on its own
+        if memory_limit is not None and (unique_flows or extract_media):
+            raise ValueError("Unique flows / media extraction need the whole capture in memory, "
+                             "they can't be combined with a memory limit")
+        self.memory_limit = memory_limit
+        self.spill_directory = spill_directory
+        self.spill_buckets = spill_buckets
+        self.spill = None
+
+    # Normalize an sdp body and pick out its media streams, recording the time spent against the sdp stage
+    def __normalize_sdp(self, body):
+        start = time.perf_counter()
+        sdp_str = sdp.normalize(body)
+        media = sdp.media_endpoints(body)
+        self.metrics.add(metrics.SDP, time.perf_counter() - start, len(body), len(sdp_str))
+        return sdp_str, media
+
+    # Extract useful information from a pyshark packet / ip layer
+    def __parse_pyshark_record(self, packet, ip_layer):
+        start = time.perf_counter()
+        sdp_seconds = self.metrics.stages[metrics.SDP].seconds
+        fields = packet.sip._all_fields
 
-        # Get source and destination
-        msg.src = ip_layer._all_fields["ip.src"]
-        msg.dst = ip_layer._all_fields["ip.dst"]
-        
         # Extract SDP / headers
+        headers_dict = None
         try:
             headers_dict = {}
-            
-            # Extract all fields from the SIP layer
-            for field_name in packet.sip.firld_names:
-                # Skip internal/special fields
-                if field_name.startswith("_"):
-                    continue
 
-                field_value = getattr(packet.sip, field_name)
-                header_name = field_name.replace("sip.", "")
-                headers_dict[header_name] = field_value
+            # Extract the whitelisted headers from the raw field names of the SIP layer ("sip.User-Agent"),
+            # field_names only holds their sanitized attribute names ("user_agent")
+            for field_name, value in fields.items():
+                if not field_name.startswith("sip."):
+                    continue
 
-            msg.header = headers_dict
+                header_name = canonical_header(field_name[len("sip."):])
+                if header_name in self.header_whitelist:
+                    headers_dict[header_name] = str(value)
         except Exception as e:
-            print("Failed in retrieving headers!", e)
+            print("Failed in retrieving headers!", e, file=self.log)
 
+        sdp_str = ""
+        media = ()
         try:
-            if "sip.Content-Type" in packet.sip._all_fields and packet.sip._all_fields["sip.Content-Type"] == "application/sdp":
-                # Replace media fields and ip addresses with sipp friendly variables
+            if fields.get("sip.Content-Type") == "application/sdp":
                 hex_sdp_str = packet.sip.msg_body.__str__().replace(":", '')
-                sdp_str = bytes.fromhex(hex_sdp_str).decode('ascii')
+                sdp_str, media = self.__normalize_sdp(bytes.fromhex(hex_sdp_str).decode('ascii'))
+        except Exception as e:
+            print("Failed in retrieving SDP!", e, file=self.log)
+            sdp_str = ""
+
+        timestamp = float(packet.sniff_timestamp) if hasattr(packet, "sniff_timestamp") else None
+
+        record = packet_record(
+            ip_layer._all_fields["ip.src"], ip_layer._all_fields["ip.dst"],
+            fields.get("sip.Method"), fields.get("sip.Status-Code"), fields.get("sip.Status-Line"),
+            headers_dict or None, sdp_str,
+            fields.get("sip.Call-ID"), fields.get("sip.from.tag"), fields.get("sip.to.tag"),
+            timestamp, fields.get("sip.CSeq"), media)
+
+        sdp_seconds = self.metrics.stages[metrics.SDP].seconds - sdp_seconds
+        self.metrics.add(metrics.HEADERS, time.perf_counter() - start - sdp_seconds)
+        return record
 
+    # Equivalent of __parse_pyshark_record for a SIP_Packet (native decoder or tshark fields output)
+    def __parse_sip_record(self, packet):
+        start = time.perf_counter()
+        sdp_seconds = self.metrics.stages[metrics.SDP].seconds
 
-                ip_addr_regex = re.compile(
-                    r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b')
-                sdp_str = re.sub(ip_addr_regex, "[local_ip]", sdp_str)
-                sdp_str = re.sub("m=audio\\s\\d+", "m=audio [media_port]", sdp_str)
-                msg.sdp = sdp_str.replace("\\xd\\xa", '\n')
+        # Whitelisted headers, still undecoded when they come from the native reader
+        headers = packet.raw_headers
+        if headers is None:
+            headers = {name: value for name, value in packet.headers.items()
+                       if name in self.header_whitelist} or None
 
-                # Format SDP if required, newer versions of python seem to concatenate SDP on a single line
-                sdp_pattern = r'\s(\w+)='
-                msg.sdp = re.sub(sdp_pattern, '\\n\\g<1>=', msg.sdp)
+        sdp_str = ""
+        media = ()
+        try:
+            if packet.header("Content-Type") == "application/sdp":
+                sdp_str, media = self.__normalize_sdp(packet.body.decode('ascii'))
         except Exception as e:
-            print("Failed in retrieving SDP!", e)
-            msg.sdp = ""
+            print("Failed in retrieving SDP!", e, file=self.log)
+            sdp_str = ""
 
+        record = packet_record(
+            packet.src, packet.dst,
+            packet.method, packet.status_code, packet.status_line,
+            headers, sdp_str,
+            packet.header("Call-ID"), packet.from_tag, packet.to_tag,
+            packet.timestamp, packet.header("CSeq"), media)
 
-        # On situations where we don't use a sip.Method, we will get the status code i.e. 100 TRYING, 183 etc...
-        if "sip.Method" not in packet.sip._all_fields:
-            if msg.direction == DIR.SEND:
-                msg.method = packet.sip._all_fields["sip.Status-Line"]
-            elif msg.direction == DIR.RECV:
-                msg.method = packet.sip._all_fields["sip.Status-Code"]
-        else:
-            msg.method = packet.sip._all_fields["sip.Method"]
+        sdp_seconds = self.metrics.stages[metrics.SDP].seconds - sdp_seconds
+        self.metrics.add(metrics.HEADERS, time.perf_counter() - start - sdp_seconds)
+        return record
+
+    # Roles involved in a packet and the direction for each, decided by the role index (cached per address)
+    def __roles_for(self, src, dst):
+        directions = {}
+        for role in self.role_index.roles_of(src):
+            directions[role] = DIR.SEND
+        for role in self.role_index.roles_of(dst):
+            directions.setdefault(role, DIR.RECV)
+        return directions
+
+    # Hand the shared record to every role that sent / received it
+    def __capture_record(self, record, directions):
+        for role in self.roles:
+            direction = directions.get(role)
+            if direction is None:
+                continue
+
+            msg = message(record, direction)
+            if (not msg.validate()):
+                raise ValueError("failed to validate!", msg.as_string())
+
+            if not self.quiet:
+                self.__log(msg)
+            self.__capture(role, msg)
+            self.metrics.count(metrics.MESSAGES)
 
-        if (not msg.validate()):
-            raise ValueError("failed to validate!", msg.as_string())
+    def __print_roles(self):
+        for role in self.roles:
+            print(f"{role}: ", self.role_index.describe(role), file=self.log)
 
-        print(f"{msg.method}{'(SDP)' if msg.sdp != '' else ''} {msg.direction} from: {msg.src} to: {msg.dst}")
-        return msg
+    def __log(self, msg):
+        print(f"{msg.method}{'(SDP)' if msg.sdp != '' else ''} {msg.direction} from: {msg.src} to: {msg.dst}",
+              file=self.log)
 
-    # Load the input pcap file and parse into a dictionary of key elements (see __message class)
-    def load_pcap_as_dict(self, input_file):
-        print(f"{agent.CLIENT}: ", self.uac_ip)
-        print(f"{agent.SERVER}: ", self.uas_ip)
+    # Store a parsed message against its role (and dialog when indexing)
+    def __capture(self, role, msg):
+        if self.chunk_messages is not None:
+            self.chunk_messages.append((role, msg))
+            return
 
-        capture = pyshark.FileCapture(input_file, display_filter="sip")
-        for packet in capture:
+        if self.spill is not None:
+            self.spill.add(role, msg)
+            return
+
+        if self.live is not None:
+            # Followed captures only hold calls in progress, messages of calls already written out are counted
+            if not self.live.add(role, msg):
+                self.metrics.count(metrics.MESSAGES_LATE)
+                if not self.quiet:
+                    print(f"late: {msg.record.method or msg.record.status_code} of {msg.call_id} arrived after "
+                          f"the call was written out ({self.live.written_outcome(msg.call_id)}), dropped",
+                          file=self.log)
+            return
+
+        self.pcap_dict[role].append(msg)
+        if self.dialog_index is not None:
+            self.dialog_index.add(role, msg)
+
+    def __load_pyshark(self, input_file):
+        import pyshark  # type: ignore
+
+        capture = pyshark.FileCapture(input_file, display_filter=self.capture_filter.display_filter())
+        for packet in self.metrics.timed(metrics.DISSECT, capture):
+            self.metrics.count(metrics.PACKETS_DISSECTED)
+            captured = False
             try:
                 if hasattr(packet, "sip"):
                     # We can have multiple ip layers...
                     for ip_layer in packet.get_multiple_layers('ip'):
-                        #try:
-                        # Capture A party packets
-                        if self.uac_ip in ip_layer._all_fields["ip.src"] or self.uac_ip in ip_layer._all_fields["ip.dst"]:
-                            self.pcap_dict[agent.CLIENT].append(
-                                self.__parse_packet(packet, ip_layer, self.uac_ip))
-
-                        # Capture B party packets
-                        if self.uas_ip in ip_layer._all_fields["ip.src"] or self.uas_ip in ip_layer._all_fields["ip.dst"]:
-                            self.pcap_dict[agent.SERVER].append(
-                                self.__parse_packet(packet, ip_layer, self.uas_ip))
-
-                        #except Exception as e:
-                        #    print("Invalid SIP packet layer!", e)
+                        directions = self.__roles_for(
+                            ip_layer._all_fields["ip.src"], ip_layer._all_fields["ip.dst"])
+                        if directions:
+                            self.__capture_record(self.__parse_pyshark_record(packet, ip_layer), directions)
+                            captured = True
             except OSError:
                 pass
-            
-        err = ""
-        if len(self.pcap_dict[agent.CLIENT]) == 0:
-            err += f"{self.uac_ip}"
-        if len(self.pcap_dict[agent.SERVER]) == 0:
-            err += f" {self.uas_ip}"
+            self.metrics.count(metrics.PACKETS_CAPTURED if captured else metrics.PACKETS_DROPPED)
+
+    # Sort SIP_Packets from either the native reader or tshark fields output into roles
+    def __load_packets(self, packets):
+        for packet in self.metrics.timed(metrics.DISSECT, packets):
+            self.__load_packet(packet)
+
+    def __load_packet(self, packet):
+        self.metrics.count(metrics.PACKETS_DISSECTED)
+        directions = self.__roles_for(packet.src, packet.dst)
+        if directions:
+            self.__capture_record(self.__parse_sip_record(packet), directions)
+            self.metrics.count(metrics.PACKETS_CAPTURED)
+        else:
+            self.metrics.count(metrics.PACKETS_DROPPED)
+
+    # Load the input pcap file and parse into a dictionary of key elements (see __message class). The native
+    # backend also takes a capture already in memory (bytes), which is never cached or split into chunks.
+    # pipelined reads, parses and stores the capture as overlapping stages (see __load_pipelined)
+    def load_pcap_as_dict(self, input_file, pipelined=False):
+        in_memory = isinstance(input_file, (bytes, bytearray, memoryview))
+        if in_memory and self.backend != capture.NATIVE and \
+                not (self.backend == capture.TSHARK and self.dissector_pool is not None):
+            raise ValueError(f"Only the {capture.NATIVE} backend (or {capture.TSHARK} with a dissector pool) "
+                             f"can read a capture held in memory")
+        capture_size = len(input_file) if in_memory else os.path.getsize(input_file)
+
+        self.input_file = input_file
+        self.__print_roles()
+
+        cache = None
+        cache_key = None
+        cached = None
+        if self.memory_limit is not None:
+            buckets = self.spill_buckets or spill.bucket_count(capture_size, self.memory_limit)
+            self.spill = spill.Spill_Buckets(buckets, self.memory_limit, self.spill_directory)
+            print(f"Spilling parsed messages into {buckets} buckets under {self.spill.directory}", file=self.log)
+        elif self.cache is not None and not in_memory:
+            cache = self.cache
+            start = time.perf_counter()
+            cache_key = cache.key(input_file, self.uac_ip, self.uas_ip, self.backend,
+                                  self.capture_filter.display_filter(), sorted(self.header_whitelist),
+                                  self.role_index.extra_roles, PARSER_VERSION)
+            cached = cache.get(cache_key)
+            self.metrics.add(metrics.CACHE, time.perf_counter() - start)
+            if cached is not None:
+                print(f"Loaded parsed capture from cache {cache.directory}", file=self.log)
+
+        # Every backend reads the whole capture file
+        self.metrics.stages[metrics.DISSECT].bytes_in += capture_size
+
+        if cached is not None:
+            self.pcap_dict = cached
+            if self.dialog_index is not None:
+                for role in self.roles:
+                    for msg in self.pcap_dict[role]:
+                        self.dialog_index.add(role, msg)
+        elif pipelined:
+            self.__load_pipelined(input_file)
+        elif self.backend == capture.NATIVE and self.jobs > 1 and not in_memory \
+                and capture_size >= 2 * native_source.MIN_CHUNK_SIZE:
+            self.__load_chunks(input_file)
+        elif self.backend == capture.NATIVE:
+            # Read the capture directly (memory mapped), no tshark process involved
+            self.__load_packets(native_source.read_sip_packets(
+                input_file, self.capture_filter, self.metrics,
+                spill.RELEASE_INTERVAL if self.spill is not None else None, self.keep_headers))
+        elif self.backend == capture.TSHARK and self.dissector_pool is not None:
+            # Streamed through an already running tshark
+            self.__load_packets(self.dissector_pool.read_sip_packets(input_file, self.capture_filter))
+        elif self.backend == capture.TSHARK:
+            # Single tshark process emitting only the fields we need
+            self.__load_packets(tshark_source.read_sip_packets(
+                input_file, self.capture_filter.display_filter()))
+        else:
+            self.__load_pyshark(input_file)
+
+        if self.spill is not None:
+            start = time.perf_counter()
+            self.spill.flush()
+            self.metrics.add(metrics.WRITE, time.perf_counter() - start)
+            counts = self.spill.counts
+        else:
+            counts = {role: len(self.pcap_dict[role]) for role in self.roles}
+
+        err = " ".join(self.role_index.describe(role) for role in self.roles if counts.get(role, 0) == 0)
 
         if (err != ""):
-            raise Exception(
+            raise ValueError(
                 f"No SIP-enabled packets matching {err} found in capture!")
         else:
             print(
-                f"Captured {len(self.pcap_dict[agent.CLIENT])} UAC packets & {len(self.pcap_dict[agent.SERVER])} UAS packets")
+                "Captured " + " & ".join(f"{counts[role]} {role} packets" for role in self.roles), file=self.log)
+
+        if cache is not None and cached is None:
+            start = time.perf_counter()
+            cache.put(cache_key, self.pcap_dict)
+            self.metrics.add(metrics.CACHE, time.perf_counter() - start)
+
+    # Parse byte ranges of the capture in worker processes, their messages are merged back in capture order
+    # (chunk order) so dialogs crossing a chunk boundary come back together as the merged stream is indexed
+    def __load_chunks(self, input_file):
+        chunks = native_source.capture_chunks(
+            input_file, min(self.jobs * CHUNKS_PER_JOB, os.path.getsize(input_file) // native_source.MIN_CHUNK_SIZE))
+        print(f"Parsing {len(chunks)} chunks with {self.jobs} workers", file=self.log)
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            for entries, chunk_metrics in executor.map(parse_capture_chunk, repeat(self.worker_settings()),
+                                                       repeat(input_file), chunks):
+                self.metrics.merge(chunk_metrics)
+                for role, msg in entries:
+                    if not self.quiet:
+                        self.__log(msg)
+                    self.__capture(role, msg)
+
+    # Settings for a parser of its own in a worker process / stage thread (see Worker_Settings)
+    def worker_settings(self):
+        return Worker_Settings(self.uac_ip, self.uas_ip, self.proxy, self.backend, self.role_index.extra_roles,
+                               self.capture_filter, self.header_whitelist, self.time_scale, self.pause_threshold,
+                               self.quiet)
+
+    # Packets of the capture straight from the backend's reader, what the pipeline's reader stage runs
+    def __packet_source(self, input_file, stage_metrics):
+        if self.backend == capture.NATIVE:
+            return native_source.read_sip_packets(
+                input_file, self.capture_filter, stage_metrics,
+                spill.RELEASE_INTERVAL if self.spill is not None else None, self.keep_headers)
+        if self.dissector_pool is not None:
+            return self.dissector_pool.read_sip_packets(input_file, self.capture_filter)
+        return tshark_source.read_sip_packets(input_file, self.capture_filter.display_filter())
+
+    # Read, parse and store the capture as overlapping stages (see sipp.pipeline): packets are read on a
+    # thread of their own and parsed on another thread, or on jobs worker processes, while the messages are
+    # stored here. on_batch is called after every parsed batch. Returns the messages stored per role
+    def __load_pipelined(self, input_file, on_batch=None):
+        if self.backend == capture.PYSHARK:
+            raise ValueError(f"The {capture.PYSHARK} backend can't be pipelined, use {capture.NATIVE} or "
+                             f"{capture.TSHARK}")
+
+        reader_metrics = metrics.Metrics()
+        packets = reader_metrics.timed(metrics.DISSECT, self.__packet_source(input_file, reader_metrics))
+        batches = pipeline.background(pipeline.batched(packets))
+
+        if self.jobs > 1:
+            print(f"Parsing with {self.jobs} workers", file=self.log)
+            parsed = pipeline.process_map(parse_packet_batch, batches, self.jobs,
+                                          initializer=init_pipeline_worker, initargs=(self.worker_settings(),))
+        else:
+            parsed = pipeline.background(map(self.worker_settings().parser(quiet=True).parse_packets, batches))
+
+        counts = dict.fromkeys(self.roles, 0)
+        try:
+            for entries, batch_metrics in parsed:
+                self.metrics.merge(batch_metrics)
+                for role, msg in entries:
+                    if not self.quiet:
+                        self.__log(msg)
+                    self.__capture(role, msg)
+                    counts[role] += 1
+                if on_batch is not None:
+                    on_batch()
+        finally:
+            parsed.close()
+            batches.close()
+
+        self.metrics.merge(reader_metrics)
+        return counts
+
+    # Parse a batch of packets into (role, message) pairs without storing them, along with the metrics
+    # collected doing so (see __load_pipelined)
+    def parse_packets(self, packets):
+        self.metrics = metrics.Metrics()
+        self.chunk_messages = []
+        for packet in packets:
+            self.__load_packet(packet)
+        return self.chunk_messages, self.metrics
+
+    # Parse a single chunk of the capture (see __load_chunks), returns its (role, message) pairs in capture order
+    def load_chunk(self, input_file, chunk):
+        self.chunk_messages = []
+        self.__load_packets(native_source.read_chunk_packets(
+            input_file, chunk, self.capture_filter, self.metrics, self.keep_headers))
+        return self.chunk_messages
+
+    # Store already parsed (role, message) pairs, i.e. read back from a spill bucket
+    def load_messages(self, entries):
+        for role, msg in entries:
+            self.__capture(role, msg)
+
+    # Derive arrival rates, concurrency and call durations from the capture and write a load profile with
+    # recommended sipp arguments plus a rate schedule next to the scenarios
+    def save_load_profile(self, interval=load_profile.DEFAULT_INTERVAL):
+        calls = load_profile.call_timings(
+            msg for role in self.roles for msg in self.pcap_dict[role])
+        profile = load_profile.build_profile(calls, interval)
+        profile_file, schedule_file = load_profile.save_profile(profile, self.output_directory)
+
+        print(f"Load profile: {profile['calls']} calls, {profile['average_calls_per_second']} cps average, "
+              f"{profile['peak_calls_per_second']} cps peak, {profile['peak_concurrency']} concurrent at peak",
+              file=self.log)
+        print(f"Recommended: {profile['uac_command']}", file=self.log)
+        print(f"Wrote {profile_file} and {schedule_file}", file=self.log)
+        return profile
+
+    # Follow a growing capture file, rotating capture files (glob pattern) or a network interface and write
+    # a UAC / UAS pair for every call as soon as it finishes (or idles out), until interrupted or, with
+    # idle_exit, once no new packets have arrived for that many seconds. Always reads with the native backend
+    def follow_pcap(self, source, a_party, b_party, scenario_name, interface=None,
+                    idle_timeout=live.DEFAULT_IDLE_TIMEOUT, max_dialogs=live.DEFAULT_MAX_DIALOGS,
+                    poll_interval=follow.POLL_INTERVAL, idle_exit=None):
+        self.__print_roles()
+
+        self.live = live.Live_Dialogs(idle_timeout, max_dialogs, roles=self.roles)
+        os.makedirs(self.output_directory, exist_ok=True)
+
+        packets = native_source.follow_sip_packets(source, self.capture_filter, self.metrics,
+                                                   poll_interval, idle_exit, interface, self.keep_headers)
+
+        written = 0
+        last_packet = time.monotonic()
+        with open(os.path.join(self.output_directory, "index.jsonl"), 'a') as index:
+            try:
+                # Not timed as dissection, most of the time goes on waiting for the capture to grow
+                for packet in packets:
+                    now = None
+                    if packet is None:
+                        # Nothing new, run the capture clock on with the wall clock so idle calls still time out
+                        if self.live.now is not None:
+                            now = self.live.now + time.monotonic() - last_packet
+                    else:
+                        last_packet = time.monotonic()
+                        self.__load_packet(packet)
+
+                    for call in self.live.pop_ready(now):
+                        written = self.__write_live_call(call, written, index, a_party, b_party, scenario_name)
+            except KeyboardInterrupt:
+                print("Stopped following, writing calls still in progress", file=self.log)
+            finally:
+                for call in self.live.flush():
+                    written = self.__write_live_call(call, written, index, a_party, b_party, scenario_name)
+        self.__report_late()
+
+        if self.flows is not None:
+            print(f"Wrote {len(self.flows)} unique flow scenarios for {written} dialogs to {self.output_directory}",
+                  file=self.log)
+        else:
+            print(f"Wrote {written} dialog scenarios to {self.output_directory}", file=self.log)
+        return written
+
+    # Messages that arrived after their call was written out are missing from its scenarios, say so
+    def __report_late(self):
+        if self.live is not None and self.live.late_messages:
+            print(f"Dropped {self.live.late_messages} messages of {self.live.late_calls} calls that arrived after "
+                  f"the call was written out, see --idle_timeout / --max_dialogs", file=self.log)
+
+    # Write every dialog of a finished call and append it to the index (one JSON object per line)
+    def __write_live_call(self, call, written, index, a_party, b_party, scenario_name):
+        for dialog in call.dialogs():
+            entry = self.__write_dialog(dialog, written, a_party, b_party, scenario_name)
+            entry["outcome"] = call.outcome
+            index.write(json.dumps(entry) + "\n")
+            index.flush()
+
+            print(f"{call.outcome}: {call.call_id} -> {os.path.join(self.output_directory, entry['directory'])}",
+                  file=self.log)
+            written += 1
+
+        if self.flows is not None:
+            self.flows.save(os.path.join(self.output_directory, "flows.json"))
+        return written
+
+    # Convert a capture into per dialog scenarios as a pipeline: while packets are still being read and parsed
+    # (see __load_pipelined) finished calls are rendered, so the first scenarios are written early. Calls are
+    # written in the order they first appeared, the output is the same as save_dialogs_to_xml's: a call
+    # that goes quiet (i.e. a long call between its ACK and BYE) is kept, holding back the calls after it,
+    # until it finishes or the capture ends. Only retransmissions arriving past the linger period of a written
+    # call are missing, they are counted and reported
+    def pipeline_to_xml(self, input_file, a_party, b_party, scenario_name):
+
+        if self.dialog_index == None:
+            raise Exception(
+                "No dialog index loaded! was the parser created with per_dialog enabled?")
+        if self.extract_media or self.memory_limit is not None:
+            raise ValueError("Media extraction / a memory limit need the whole capture parsed first, they can't "
+                             "be combined with pipelined per dialog output")
+
+        self.input_file = input_file
+        self.__print_roles()
+        self.metrics.stages[metrics.DISSECT].bytes_in += \
+            len(input_file) if isinstance(input_file, (bytes, bytearray, memoryview)) else os.path.getsize(input_file)
+
+        dialogs = self.live = live.Live_Dialogs(roles=self.roles, ordered=True)
+        os.makedirs(self.output_directory, exist_ok=True)
+
+        index = []
+        counts = self.__load_pipelined(input_file, lambda: self.__write_calls(
+            dialogs.pop_ready(), index, a_party, b_party, scenario_name))
+        self.__write_calls(dialogs.flush(), index, a_party, b_party, scenario_name)
+        self.__report_late()
+
+        err = " ".join(self.role_index.describe(role) for role in self.roles if counts[role] == 0)
+        if (err != ""):
+            raise ValueError(
+                f"No SIP-enabled packets matching {err} found in capture!")
+        print("Captured " + " & ".join(f"{counts[role]} {role} packets" for role in self.roles), file=self.log)
+
+        start = time.perf_counter()
+        self.dialog_index.save(os.path.join(self.output_directory, "index.json"), index)
+        if self.flows is not None:
+            self.flows.save(os.path.join(self.output_directory, "flows.json"))
+        self.metrics.add(metrics.WRITE, time.perf_counter() - start)
+
+        if self.flows is not None:
+            print(f"Wrote {len(self.flows)} unique flow scenarios for {len(index)} dialogs to {self.output_directory}",
+                  file=self.log)
+        else:
+            print(f"Wrote {len(index)} dialog scenarios to {self.output_directory}", file=self.log)
+        return index
+
+    # Write every dialog of the given finished calls, numbered on from the index they are appended to
+    def __write_calls(self, calls, index, a_party, b_party, scenario_name):
+        for call in calls:
+            for dialog in call.dialogs():
+                entry = self.__write_dialog(dialog, len(index), a_party, b_party, scenario_name)
+                entry["outcome"] = call.outcome
+                index.append(entry)
+
+    # Render a single dialog into its own directory and describe it for the index. With unique flows
+    # only the first dialog of each flow is rendered, later ones point at that dialog's scenarios
+    def __write_dialog(self, dialog, number, a_party, b_party, scenario_name):
+        entry = dialog.as_dict()
+
+        flow = None
+        if self.flows is not None:
+            flow, is_new = self.flows.add(dialog)
+            entry["flow"] = flow.digest
+            if not is_new:
+                entry.update(flow.written)
+                return entry
+
+        directory = os.path.join(self.output_directory, dialog.directory_name(number))
+        paths = self.__write_scenarios(dialog.pcap_dict, directory, a_party, b_party, scenario_name)
+        # Index paths are relative to the output directory (where the index is), whatever the working directory
+        written = {"directory": dialog.directory_name(number)}
+        written.update((role, os.path.relpath(paths[role], self.output_directory) if paths[role] else None)
+                       for role in self.roles)
+        if flow is not None:
+            flow.written = written
+
+        entry.update(written)
+        return entry
+
+    # Copy each call's media out of the capture once, before any scenario refers to it
+    def __prepare_media(self):
+        if not self.extract_media or self.media_files is not None:
+            return
+        if self.input_file is None:
+            raise Exception("No capture loaded! has load_pcap_as_dict been called?")
+
+        index = media.Media_Index.from_messages(self.pcap_dict)
+        self.media_files = media.extract_media(self.input_file, index, self.output_directory)
+        print(f"Extracted {len(self.media_files)} media streams to "
+              f"{os.path.join(self.output_directory, media.MEDIA_DIRECTORY)}", file=self.log)
+
+    # Start replaying the media a role sent during the call, paths are relative to the scenario directory
+    def __play_media(self, writer, role, call_id, directory):
+        for kind, path in (self.media_files or {}).get((call_id, role), {}).items():
+            action = media.PLAY_ACTIONS.get(kind)
+            if action is not None:
+                writer.play_media(action, os.path.relpath(path, directory))
+
+    def __send_to_writer(self, writer, data_dict, a_party, b_party, scenario_name, role=None, directory=None):
+        # Request / final response pairs, reported by SIPp as response times
+        rtd_starts, rtd_stops = timing.response_time_pairs(data_dict, DIR.SEND, DIR.RECV)
+        previous = None
+
+        # Media starts once the ACK for an answered INVITE has gone through, once per call
+        answered = set()
+        playing = set()
 
-    def __send_to_writer(self, writer, data_dict, a_party, b_party, scenario_name):
         # For each entry determine if we need to add additional information i.e. sdp
-        for scenario in data_dict:
+        for index, scenario in enumerate(data_dict):
+
+            # Wait as long as the original signalling did before sending
+            if scenario.direction == DIR.SEND:
+                pause = timing.pause_ms(previous, scenario.timestamp,
+                                        self.time_scale, self.pause_threshold)
+                if pause is not None:
+                    writer.wait(pause)
+            previous = scenario.timestamp
 
             # This argument list is passed to sip_methods so that the CDATA string can be built with additional information
             arguments = {
@@ -187,7 +809,7 @@ class SIP_Parser:
             # Check if we are dealing with a SIP method i.e. INVITE / ACK / BYE etc..
             if writer.is_method(scenario.method):
                 if scenario.direction == DIR.SEND:
-                    writer.send(scenario.method, arguments)
+                    writer.send(scenario.method, arguments, rtd_starts.get(index))
                 if scenario.direction == DIR.RECV:
                     writer.recv(scenario.method)
 
@@ -195,7 +817,56 @@ class SIP_Parser:
             elif scenario.direction == DIR.SEND:
                 writer.send_response(scenario.method, arguments)
             elif scenario.direction == DIR.RECV:
-                writer.recv_response(scenario.method)
+                writer.recv_response(scenario.method, rtd=rtd_stops.get(index))
+
+            if self.media_files:
+                record = scenario.record
+                if record.method is None and scenario.cseq_method == "INVITE" and (record.status_code or "").startswith("2"):
+                    answered.add(record.call_id)
+                elif record.method == "ACK" and record.call_id in answered and record.call_id not in playing:
+                    playing.add(record.call_id)
+                    self.__play_media(writer, role, record.call_id, directory)
+
+    # Render a UAC / UAS pair for the given role dictionary into a directory
+    def __write_scenarios(self, role_dict, directory, a_party, b_party, scenario_name):
+        # check whether directory already exists
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+            if not self.quiet:
+                print(f"Folder created! {directory}", file=self.log)
+
+        sinks = {role: os.path.join(directory, f"{role}.xml") for role in self.roles}
+        return self.__render_scenarios(role_dict, sinks, a_party, b_party, scenario_name, directory)
+
+    # Whether a role's scenario is rendered as a UAC, extra roles are when their first message is a request
+    # they sent i.e. the outgoing leg of a proxy
+    def __is_uac(self, role, messages):
+        if role == agent.CLIENT or role == agent.SERVER:
+            return role == agent.CLIENT
+        first = messages[0]
+        return first.direction == DIR.SEND and first.record.method is not None
+
+    # Render each role with messages into its sink (path or writable text / binary stream), returns the
+    # sink used per role or None for roles without messages (or without a sink)
+    def __render_scenarios(self, role_dict, sinks, a_party, b_party, scenario_name, directory=None):
+        written = {}
+        for role in self.roles:
+            if len(role_dict[role]) == 0 or sinks.get(role) is None:
+                written[role] = None
+                continue
+
+            is_uac = self.__is_uac(role, role_dict[role])
+            number = a_party if is_uac else b_party
+            written[role] = sinks[role]
+            writer = sipp_agent.SIPP_Agent(number, scenario_name, self.proxy, is_uac, self.metrics)
+            writer.stream(written[role])
+
+            # Determine the type of each packet for SIPP i.e. send / recv / response
+            self.__send_to_writer(
+                writer, role_dict[role], a_party, b_party, scenario_name, role, directory)
+            writer.close()
+
+        return written
 
     # Create SIPP XML scenarios with the extracted dictionary
     def save_pcap_to_xml(self, a_party, b_party, scenario_name):
@@ -203,20 +874,159 @@ class SIP_Parser:
         if self.pcap_dict == None:
             raise Exception(
                 "No pcap dictionary loaded! has load_pcap_as_dict been called?")
+        self.__prepare_media()
 
-        uac_writer = sipp_agent.SIPP_Agent(a_party, scenario_name, self.proxy, True)
-        uas_writer = sipp_agent.SIPP_Agent(b_party, scenario_name, self.proxy, False)
+        return self.__write_scenarios(self.pcap_dict, self.output_directory,
+                               a_party, b_party, scenario_name)
 
-        # Determine the type of each packet for SIPP i.e. send / recv / response
-        self.__send_to_writer(
-            uac_writer, self.pcap_dict[agent.CLIENT], a_party, b_party, scenario_name)
-        self.__send_to_writer(
-            uas_writer, self.pcap_dict[agent.SERVER], a_party, b_party, scenario_name)
+    # Render the UAC / UAS pair for the whole capture into the given sinks ({role: path or writable text /
+    # binary stream}) rather than the output directory
+    def stream_pcap_to_xml(self, sinks, a_party, b_party, scenario_name):
+
+        if self.pcap_dict == None:
+            raise Exception(
+                "No pcap dictionary loaded! has load_pcap_as_dict been called?")
+        return self.__render_scenarios(self.pcap_dict, sinks, a_party, b_party, scenario_name)
+
+    # (dialog description, {role: scenario XML bytes or None}) for every dialog, nothing touches the disk
+    def dialogs_to_xml_bytes(self, a_party, b_party, scenario_name):
+
+        if self.dialog_index == None:
+            raise Exception(
+                "No dialog index loaded! was the parser created with per_dialog enabled?")
+
+        for dialog in self.dialog_index.dialogs():
+            sinks = {role: io.BytesIO() for role in self.roles}
+            written = self.__render_scenarios(dialog.pcap_dict, sinks, a_party, b_party, scenario_name)
+            yield dialog.as_dict(), {role: sink.getvalue() if written[role] is not None else None
+                                     for role, sink in sinks.items()}
+
+    # Create one SIPP XML scenario pair per dialog (Call-ID / tags) plus an index file
+    def save_dialogs_to_xml(self, a_party, b_party, scenario_name):
+
+        if self.dialog_index == None:
+            raise Exception(
+                "No dialog index loaded! was the parser created with per_dialog enabled?")
+        self.__prepare_media()
+
+        index = []
+        for number, dialog in enumerate(self.dialog_index.dialogs()):
+            index.append(self.__write_dialog(dialog, number, a_party, b_party, scenario_name))
+
+        start = time.perf_counter()
+        self.dialog_index.save(os.path.join(self.output_directory, "index.json"), index)
+        if self.flows is not None:
+            self.flows.save(os.path.join(self.output_directory, "flows.json"))
+        self.metrics.add(metrics.WRITE, time.perf_counter() - start)
+
+        if self.flows is not None:
+            print(f"Wrote {len(self.flows)} unique flow scenarios for {len(index)} dialogs to {self.output_directory}",
+                  file=self.log)
+        else:
+            print(f"Wrote {len(index)} dialog scenarios to {self.output_directory}", file=self.log)
+        return index
+
+    # Render the dialogs of every spilled bucket into <output_directory>/bucket_NNNN/, up to jobs buckets at
+    # a time (one process each), plus an index.json covering all of them. Only a single bucket's messages
+    # are ever held in memory by each process
+    def save_spilled_to_xml(self, a_party, b_party, scenario_name, jobs=None):
+
+        if self.spill == None:
+            raise Exception(
+                "Nothing spilled! was the parser created with a memory_limit and has load_pcap_as_dict been called?")
+        jobs = self.jobs if jobs is None else jobs
+
+        settings = self.worker_settings()
+        bucket_files = self.spill.files()
+        directories = [os.path.join(self.output_directory, os.path.splitext(os.path.basename(bucket_file))[0])
+                       for bucket_file in bucket_files]
+        count = len(bucket_files)
+        arguments = [[settings] * count, bucket_files, directories,
+                     [a_party] * count, [b_party] * count, [scenario_name] * count]
+
+        index = []
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(render_spill_bucket, *arguments))
+        else:
+            results = map(render_spill_bucket, *arguments)
+
+        for directory, (entries, bucket_metrics) in zip(directories, results):
+            # Bucket entries are relative to the bucket's directory, the index is one level up
+            bucket = os.path.basename(directory)
+            for entry in entries:
+                entry.update((key, os.path.join(bucket, entry[key]))
+                             for key in ("directory",) + tuple(self.roles) if entry.get(key))
+            index.extend(entries)
+            self.metrics.merge(bucket_metrics)
+        self.spill.remove()
+
+        start = time.perf_counter()
+        os.makedirs(self.output_directory, exist_ok=True)
+        with open(os.path.join(self.output_directory, "index.json"), 'w') as output:
+            json.dump({"dialogs": index}, output, indent=4)
+        self.metrics.add(metrics.WRITE, time.perf_counter() - start)
+
+        print(f"Wrote {len(index)} dialog scenarios from {count} buckets to {self.output_directory}", file=self.log)
+        return index
+
+
+# Everything a parser started in a worker process / stage thread needs to parse packets and render dialogs
+# the same way as the parser handing it the work. Kept in one place so the chunk, pipeline and spill workers
+# can't drift apart, and picklable so it can be sent to worker processes
+class Worker_Settings:
+
+    def __init__(self, client_addr, server_addr, proxy, backend, roles, capture_filter, header_whitelist,
+                 time_scale, pause_threshold, quiet):
+        self.client_addr = client_addr
+        self.server_addr = server_addr
+        self.proxy = proxy
+        self.backend = backend
+        self.roles = roles
+        self.capture_filter = capture_filter
+        self.header_whitelist = header_whitelist
+        self.time_scale = time_scale
+        self.pause_threshold = pause_threshold
+        self.quiet = quiet
+
+    # New parser with these settings, options (per_dialog, output_directory, quiet...) are passed on as is
+    def parser(self, **options):
+        arguments = {
+            "roles": self.roles,
+            "capture_filter": self.capture_filter,
+            "header_whitelist": self.header_whitelist,
+            "time_scale": self.time_scale,
+            "pause_threshold": self.pause_threshold,
+            "quiet": self.quiet
+        }
+        arguments.update(options)
+        return SIP_Parser(self.client_addr, self.server_addr, self.proxy, self.backend, **arguments)
+
+
+# Parse one chunk of a capture with a parser of its own, runs in a worker process
+def parse_capture_chunk(settings, input_file, chunk):
+    parser = settings.parser(quiet=True)
+    return parser.load_chunk(input_file, chunk), parser.metrics
+
+
+# Parser of a pipeline worker process, set up once per process by init_pipeline_worker
+pipeline_parser = None
+
+
+def init_pipeline_worker(settings):
+    global pipeline_parser
+    pipeline_parser = settings.parser(quiet=True)
+
+
+# Parse one batch of packets read by the pipeline (see SIP_Parser.__load_pipelined), runs in a worker process
+def parse_packet_batch(packets):
+    if pipeline_parser is None:
+        raise Exception("Pipeline worker not set up! was the pool started with init_pipeline_worker?")
+    return pipeline_parser.parse_packets(packets)
 
-        # check whether directory already exists
-        if not os.path.exists(self.OUTPUT_DIRECTORY):
-            os.mkdir(self.OUTPUT_DIRECTORY)
-            print(f"Folder created! {self.OUTPUT_DIRECTORY}")
 
-        uac_writer.save(f"{self.OUTPUT_DIRECTORY}/UAC.xml")
-        uas_writer.save(f"{self.OUTPUT_DIRECTORY}/UAS.xml")
+# Render the dialogs of one spill bucket with a parser of its own, runs in a worker process when parallel
+def render_spill_bucket(settings, bucket_file, output_directory, a_party, b_party, scenario_name):
+    parser = settings.parser(per_dialog=True, output_directory=output_directory)
+    parser.load_messages(spill.read_bucket(bucket_file))
+    return parser.save_dialogs_to_xml(a_party, b_party, scenario_name), parser.metrics
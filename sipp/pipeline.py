@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import multiprocessing
+import queue
+import threading
+
+# Packets handed from one stage to the next at a time, queue hand-offs cost more than the packets themselves
+BATCH_SIZE = 256
+# Batches a stage queue holds before its producer blocks, this is what caps the memory between stages
+QUEUE_DEPTH = 16
+# Batches in flight per worker process when a stage runs on a process pool
+BATCHES_PER_JOB = 2
+# Seconds a blocked producer waits before checking whether its consumer has gone away
+PUT_INTERVAL = 0.1
+
+# End of a stage's output
+END = object()
+
+
+# Exception raised by a stage, re-raised where its output is consumed
+class Stage_Error:
+    def __init__(self, error):
+        self.error = error
+
+
+# Group the items of an iterable into lists of up to size items
+def batched(iterable, size=BATCH_SIZE):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Run an iterable on a thread of its own, its items are handed over through a queue holding at most depth
+# of them so a producer that gets ahead of its consumer blocks instead of piling items up in memory.
+# Exceptions are re-raised in the consumer, closing the returned generator stops the producer
+def background(iterable, depth=QUEUE_DEPTH):
+    items = queue.Queue(depth)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=PUT_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(END)
+        except BaseException as e:
+            put(Stage_Error(e))
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is END:
+                return
+            if isinstance(item, Stage_Error):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+# Worker processes are started from a clean process, forking while the stage threads run isn't safe
+def process_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+# Apply function to every item on jobs worker processes, results come back in input order. At most depth
+# items are in flight so the input is only read as fast as the workers get through it
+def process_map(function, items, jobs, depth=None, initializer=None, initargs=()):
+    depth = depth or jobs * BATCHES_PER_JOB
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=process_context(),
+                             initializer=initializer, initargs=initargs) as executor:
+        try:
+            for item in items:
+                pending.append(executor.submit(function, item))
+                if len(pending) >= depth:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
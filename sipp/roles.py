@@ -0,0 +1,51 @@
+import sipp.agent as agent
+from sipp.capture.address_table import Address_Table, parse_endpoints
+
+import re
+
+# Labels end up as scenario file names (<label>.xml)
+LABEL = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+# Parse an extra role of the form "LABEL=ADDRESS[,ADDRESS|CIDR...]"
+def parse_role(text):
+    label, separator, endpoints = text.partition("=")
+    if not separator or not label.strip() or not endpoints.strip():
+        raise ValueError(f"Invalid role {text!r}, expected LABEL=ADDRESS[,ADDRESS|CIDR...]")
+    return label.strip(), parse_endpoints(endpoints)
+
+
+# Every role taking part in a conversion: the client / server pair plus any extra roles (proxy legs,
+# trunks...), each with its own addresses / CIDR ranges. A packet is classified against all of them with
+# one lookup per address, see Address_Table
+class Role_Index:
+
+    def __init__(self, client, server, extra_roles=()):
+        self.endpoints = {}
+        self.table = Address_Table()
+        for label, endpoints in [(agent.CLIENT, client), (agent.SERVER, server)] + list(extra_roles):
+            if not LABEL.match(label):
+                raise ValueError(f"Invalid role label {label!r}, only letters, digits, '.', '_' and '-' are allowed")
+            if label in self.endpoints:
+                raise ValueError(f"Role {label} is defined more than once")
+            self.endpoints[label] = parse_endpoints(endpoints)
+            for endpoint in self.endpoints[label]:
+                self.table.add(endpoint, label)
+
+        # Client / server first, then extra roles in the order given
+        self.labels = list(self.endpoints)
+        self.extra_roles = [(label, self.endpoints[label]) for label in self.labels[2:]]
+
+    # Roles an address belongs to, the same address may play several
+    def roles_of(self, address):
+        return self.table.lookup(address)
+
+    # Every address / range of every role, what the capture filter lets through
+    def addresses(self):
+        addresses = []
+        for endpoints in self.endpoints.values():
+            addresses.extend(endpoint for endpoint in endpoints if endpoint not in addresses)
+        return addresses
+
+    def describe(self, label):
+        return ",".join(self.endpoints[label])
@@ -0,0 +1,196 @@
+from functools import lru_cache
+import re
+
+# Offset from [media_port] used for each media type, rtcp sits on the port above its stream
+MEDIA_PORT_OFFSETS = {
+    "audio": 0,
+    "video": 2,
+    "image": 4,
+    "application": 6,
+    "text": 8,
+}
+DEFAULT_MEDIA_PORT_OFFSET = 10
+
+# Normalized bodies are memoized, identical SDPs are very common across calls
+CACHE_SIZE = 4096
+
+IP_ADDRESS = re.compile(r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b')
+MEDIA_LINE = re.compile(r'^(\S+)\s+(\d+)(/\d+)?(\s.*)?$')
+RTCP_LINE = re.compile(r'^rtcp:(\d+)')
+
+# Older tshark / python combinations hand the body over on a single line, SDP types are always a
+# single lower case letter so only split in front of those (a=fmtp:111 minptime=10 must survive)
+INLINE_SEPARATOR = re.compile(r'\s+(?=[a-z]=)')
+
+
+def media_port(offset):
+    return "[media_port]" if offset == 0 else f"[media_port+{offset}]"
+
+
+# Precompiled substitution applied to the value of every line of the given type ("*" for all types)
+class Rule:
+    def __init__(self, line_type, pattern, replacement):
+        self.line_type = line_type
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self.replacement = replacement
+
+    def apply(self, value):
+        return self.pattern.sub(self.replacement, value)
+
+
+# Replace ip addresses with sipp friendly variables
+DEFAULT_RULES = [
+    Rule("*", IP_ADDRESS, "[local_ip]"),
+]
+
+
+# Media description, the m= line and every line that follows it up to the next m=
+class Media_Section:
+    __slots__ = ("media", "port", "port_count", "remainder", "lines")
+
+    def __init__(self, media, port, port_count, remainder):
+        self.media = media
+        self.port = port
+        self.port_count = port_count
+        self.remainder = remainder
+        # (type, value) pairs
+        self.lines = []
+
+    def media_line(self):
+        return f"{self.media} {self.port}{self.port_count or ''}{self.remainder or ''}"
+
+
+# Compact line model of a session description
+class Session_Description:
+    __slots__ = ("session", "media")
+
+    def __init__(self):
+        # (type, value) pairs before the first m= line
+        self.session = []
+        self.media = []
+
+    def lines(self):
+        for line_type, value in self.session:
+            yield line_type, value
+        for section in self.media:
+            yield "m", section.media_line()
+            for line_type, value in section.lines:
+                yield line_type, value
+
+    def serialize(self):
+        return "\n".join(f"{line_type}={value}" for line_type, value in self.lines())
+
+
+# Split a raw body into type / value pairs
+def split_lines(body):
+    body = body.replace("\\xd\\xa", "\n")
+    lines = body.splitlines()
+    if len(lines) == 1:
+        lines = INLINE_SEPARATOR.split(lines[0])
+
+    for line in lines:
+        line = line.strip()
+        if len(line) < 2 or line[1] != "=":
+            continue
+        yield line[0], line[2:]
+
+
+def parse(body):
+    description = Session_Description()
+    section = None
+
+    for line_type, value in split_lines(body):
+        if line_type == "m":
+            match = MEDIA_LINE.match(value)
+            if match is not None:
+                section = Media_Section(match.group(1), match.group(2), match.group(3), match.group(4))
+                description.media.append(section)
+                continue
+        if section is None:
+            description.session.append((line_type, value))
+        else:
+            section.lines.append((line_type, value))
+
+    return description
+
+
+# Media streams offered by a (raw, not yet rewritten) body as (media type, address, port) tuples,
+# a media level c= line overrides the session address. Disabled (port 0) streams are left out
+@lru_cache(maxsize=CACHE_SIZE)
+def media_endpoints(body):
+    description = parse(body)
+    session_address = None
+    for line_type, value in description.session:
+        if line_type == "c":
+            session_address = connection_address(value)
+
+    endpoints = []
+    for section in description.media:
+        address = session_address
+        for line_type, value in section.lines:
+            if line_type == "c":
+                address = connection_address(value)
+        if address is not None and section.port.isdigit() and int(section.port) != 0:
+            endpoints.append((section.media, address, int(section.port)))
+    return tuple(endpoints)
+
+
+# Address of a c= value, "IN IP4 10.0.0.1" (multicast TTL / count suffixes dropped)
+def connection_address(value):
+    parts = value.split()
+    if len(parts) < 3 or parts[1] != "IP4":
+        return None
+    return parts[2].split("/")[0]
+
+
+# Applies the rewrite rules to parsed descriptions, memoizing the serialized result per body
+class SDP_Rewriter:
+
+    def __init__(self, rules=None, port_offsets=None, cache_size=CACHE_SIZE):
+        rules = DEFAULT_RULES if rules is None else rules
+        self.port_offsets = MEDIA_PORT_OFFSETS if port_offsets is None else port_offsets
+
+        # Rules grouped per line type up front so every line only sees the rules that concern it
+        self.rules = {}
+        self.global_rules = [rule for rule in rules if rule.line_type == "*"]
+        for rule in rules:
+            if rule.line_type != "*":
+                self.rules.setdefault(rule.line_type, []).append(rule)
+
+        self.normalize = lru_cache(maxsize=cache_size)(self.__normalize)
+
+    def __rewrite(self, line_type, value):
+        for rule in self.rules.get(line_type, ()):
+            value = rule.apply(value)
+        for rule in self.global_rules:
+            value = rule.apply(value)
+        return line_type, value
+
+    def rewrite(self, description):
+        description.session = [self.__rewrite(line_type, value) for line_type, value in description.session]
+
+        for section in description.media:
+            offset = self.port_offsets.get(section.media, DEFAULT_MEDIA_PORT_OFFSET)
+            # Port 0 is a rejected / disabled stream and has to stay that way
+            if section.port != "0":
+                section.port = media_port(offset)
+
+            lines = []
+            for line_type, value in section.lines:
+                if line_type == "a":
+                    value = RTCP_LINE.sub(f"rtcp:{media_port(offset + 1)}", value)
+                lines.append(self.__rewrite(line_type, value))
+            section.lines = lines
+
+        return description
+
+    def __normalize(self, body):
+        return self.rewrite(parse(body)).serialize()
+
+
+default_rewriter = SDP_Rewriter()
+
+
+# Parse, rewrite and serialize an SDP body using the default rules
+def normalize(body):
+    return default_rewriter.normalize(body)
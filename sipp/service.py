@@ -0,0 +1,206 @@
+from sipp import api
+import sipp.capture as capture
+from sipp.capture import dissector_pool
+from sipp.roles import parse_role
+
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import socketserver
+import threading
+import time
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8642
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Largest capture accepted in a single request
+DEFAULT_MAX_CAPTURE_BYTES = 256 * 1024 * 1024
+
+ENCODING = "ISO-8859-1"
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+# Whether this worker process streams tshark backend requests through a long lived tshark
+USE_DISSECTOR_POOL = False
+
+
+# Runs once in every worker process as it starts, so no request pays for the imports
+def warm_worker(use_dissector_pool=False):
+    global USE_DISSECTOR_POOL
+    USE_DISSECTOR_POOL = use_dissector_pool
+    import sipp.parser  # noqa: F401
+    try:
+        import pyshark  # type: ignore  # noqa: F401
+    except ImportError:
+        pass
+
+
+# Held up long enough for the pool to start every worker, see Worker_Pool
+def worker_ready(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+# Conversion options from the query string, everything apart from client / server is optional
+def request_options(query):
+    def value(name, default=None):
+        return query.get(name, [default])[0]
+
+    client = value("client")
+    server = value("server")
+    if client is None or server is None:
+        raise ValueError("client and server are required")
+
+    backend = value("backend", capture.NATIVE)
+    if backend not in capture.BACKENDS:
+        raise ValueError(f"Unknown capture backend {backend}, expected one of {capture.BACKENDS}")
+
+    options = {
+        "client": client,
+        "server": server,
+        "a_number": value("a_number", api.DEFAULT_A_NUMBER),
+        "b_number": value("b_number", api.DEFAULT_B_NUMBER),
+        "scenario_name": value("scen_name", api.DEFAULT_SCENARIO_NAME),
+        "proxy": value("proxy", "false").lower() in TRUE_VALUES,
+        "backend": backend
+    }
+    if value("time_scale") is not None:
+        options["time_scale"] = float(value("time_scale"))
+    if value("pause_threshold") is not None:
+        options["pause_threshold"] = int(value("pause_threshold"))
+    if "extra_role" in query:
+        options["roles"] = [parse_role(role) for role in query["extra_role"]]
+    return options, value("per_dialog", "false").lower() in TRUE_VALUES
+
+
+def decode(xml):
+    return xml.decode(ENCODING) if xml is not None else None
+
+
+# Worker side of a request: convert the capture bytes, scenarios come back as text for the JSON response
+def convert_request(data, options, per_dialog):
+    pool = None
+    if USE_DISSECTOR_POOL and options["backend"] == capture.TSHARK:
+        pool = dissector_pool.shared_pool()
+    if per_dialog:
+        dialogs = []
+        for entry, scenarios in api.convert_dialogs(data, dissector_pool=pool, **options):
+            entry.update({role: decode(xml) for role, xml in scenarios.items()})
+            dialogs.append(entry)
+        return {"dialogs": dialogs}
+    return {"scenarios": {role: decode(xml) for role, xml in api.convert(data, dissector_pool=pool, **options).items()}}
+
+
+# Process pool started (and warmed) up front, conversions run concurrently up to the number of workers
+class Worker_Pool:
+
+    def __init__(self, workers=DEFAULT_WORKERS, use_dissector_pool=False):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_worker,
+                                            initargs=(use_dissector_pool,))
+        # Workers are otherwise only started as requests come in
+        self.pids = set(self.executor.map(worker_ready, [0.1] * workers))
+        # Requests are handled on a thread each, the counters are updated under this lock
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def convert(self, data, options, per_dialog):
+        with self.lock:
+            self.requests += 1
+        try:
+            return self.executor.submit(convert_request, data, options, per_dialog).result()
+        except Exception:
+            with self.lock:
+                self.failures += 1
+            raise
+
+    def status(self):
+        with self.lock:
+            return {"workers": self.workers, "requests": self.requests, "failures": self.failures}
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+# GET /health, POST /convert?client=..&server=..[&per_dialog=1&backend=..&a_number=..&extra_role=LABEL=..]
+# with the capture as the request body. Answers with JSON ({"scenarios": {role: xml}} / {"dialogs": [...]}),
+# or the bare XML of one role when asked for with role=UAC / role=UAS / role=LABEL
+class Conversion_Handler(BaseHTTPRequestHandler):
+
+    # Set on the subclass create_server makes
+    pool = None
+    max_capture_bytes = DEFAULT_MAX_CAPTURE_BYTES
+
+    # Unix socket clients have no address
+    def address_string(self):
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def reply(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self.reply(404, {"error": "not found"})
+            return
+        status = {"status": "ok"}
+        status.update(self.pool.status())  # type: ignore
+        self.reply(200, status)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/convert":
+            self.reply(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            self.reply(400, {"error": "the capture is expected as the request body"})
+            return
+        if length > self.max_capture_bytes:
+            self.reply(413, {"error": f"capture larger than {self.max_capture_bytes} bytes"})
+            return
+        data = self.rfile.read(length)
+
+        query = parse_qs(url.query)
+        try:
+            options, per_dialog = request_options(query)
+            result = self.pool.convert(data, options, per_dialog)  # type: ignore
+        except ValueError as e:
+            # Bad query or a capture with nothing to convert
+            self.reply(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self.reply(500, {"error": str(e)})
+            return
+
+        role = query.get("role", [None])[0]
+        if role is None:
+            self.reply(200, result)
+        elif role in result.get("scenarios", {}) and result["scenarios"][role] is not None:
+            self.reply(200, result["scenarios"][role].encode(ENCODING), "application/xml")
+        else:
+            self.reply(404, {"error": f"no {role} scenario"})
+
+
+class Unix_HTTP_Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+# HTTP server (TCP or, given unix_socket, a Unix domain socket) handing requests to a warm worker pool
+def create_server(pool, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None,
+                  max_capture_bytes=DEFAULT_MAX_CAPTURE_BYTES):
+    handler = type("Handler", (Conversion_Handler,), {"pool": pool, "max_capture_bytes": max_capture_bytes})
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return Unix_HTTP_Server(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
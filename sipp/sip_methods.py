@@ -15,6 +15,11 @@ MESSAGE = Transports Instant Messages
 UPDATE = Modifies the state of a session
 """
 
+from sipp.agent.xml_writer import format_action
+
+from functools import lru_cache
+import re
+
 SIP_HEADERS = [
     "INVITE",
     "ACK",
@@ -32,6 +37,53 @@ SIP_HEADERS = [
     "UPDATE"
 ]
 
+# Arguments substituted into compiled templates (proxy and sdp select the template instead)
+ARGUMENT_FIELDS = ("caller", "callee", "scenario_name", "routes", "subscriber", "event",
+                   "response_code", "contact")
+
+RENDER_CACHE_SIZE = 8192
+
+PLACEHOLDER = re.compile("\x00(\\w+)\x00")
+
+
+def placeholder(name):
+    return f"\x00{name}\x00"
+
+
+COUNTER = placeholder("counter")
+SDP = placeholder("sdp")
+
+
+# Stands in for the SIPP_Agent while templates are compiled
+class Placeholder_Agent:
+    def get_counter(self):
+        return COUNTER
+
+
+# Pre-indented template text with named placeholders, the sdp placeholder occupies its own line
+class Compiled_Template:
+    def __init__(self, text):
+        index = text.find(SDP)
+        if index == -1:
+            self.head, self.indentation, self.tail = text, None, ""
+        else:
+            line_start = text.rfind("\n", 0, index) + 1
+            self.head = text[:line_start - 1]
+            self.indentation = text[line_start:index]
+            self.tail = text[index + len(SDP):]
+
+    def render(self, values, sdp):
+        substitute = lambda match: values.get(match.group(1), match.group(0))
+        output = [PLACEHOLDER.sub(substitute, self.head)]
+        if self.indentation is not None:
+            # Every sdp line is re-indented to the placeholder, empty lines are stripped
+            for line in sdp.splitlines():
+                line = line.lstrip()
+                if line:
+                    output.append("\n" + self.indentation + line)
+        output.append(PLACEHOLDER.sub(substitute, self.tail))
+        return "".join(output)
+
 
 class Methods:
 
@@ -55,10 +107,11 @@ class Methods:
         """
 
     def __ACK(sipp_agent, arguments):
+        counter = sipp_agent.get_counter()  # type: ignore
         return f"""
         <![CDATA[
             ACK {"[next_url]" if arguments["proxy"] else "sip:[service]@[remote_ip]:[remote_port]"} SIP/2.0
-            Via: SIP/2.0/[transport] [local_ip]:[local_port];branch=[branch-{sipp_agent.get_counter()}]
+            Via: SIP/2.0/[transport] [local_ip]:[local_port];branch=[branch-{counter}]
             [last_From:]
             [last_To:]
             [last_Call-ID:]
@@ -73,7 +126,8 @@ class Methods:
         ]]>
         """
 
-        # TODO: we can insert an audio stream here if we want using:
+        # Captured media is replayed after the ACK with --media (see SIPP_Agent.play_media), a canned
+        # stream can be used instead:
         """
         <action>
             <exec rtp_stream="alaw08m.wav,-1"/>
@@ -310,6 +364,24 @@ class Methods:
             {arguments["sdp"]}
         ]]>
         """
+    def __RESPONSE(sipp_agent, arguments):
+        return f"""<![CDATA[
+                {arguments["response_code"]}
+                {"[last_Via:]" if arguments["proxy"] else ""}
+                [last_From:]
+                [last_To:];tag=[call_number]
+                [last_Call-ID:]
+                [last_CSeq:]
+                {"[last_Record-Route:]" if arguments["proxy"] else ""}
+                Contact: {arguments["contact"]} 
+                {"Content-Type: application/sdp" if arguments["sdp"] != "" else ""}
+                Content-Length: [len]
+                
+                {arguments["sdp"]}
+            ]]>"""
+
+    response = __RESPONSE
+
     call = {
         "INVITE": __INVITE,
         "ACK": __ACK,
@@ -326,3 +398,44 @@ class Methods:
         "MESSAGE": __MESSAGE,
         "UPDATE": __UPDATE
     }
+
+    # Formatted <send> action for a method (None for a response), repeated messages are a cache lookup
+    def render(self, method, sipp_agent, arguments):
+        values = tuple(str(arguments.get(field)) for field in ARGUMENT_FIELDS)
+        text = render_template(method, bool(arguments["proxy"]), values, arguments["sdp"])
+
+        # The branch counter changes on every message so it is filled in after the cache
+        if COUNTER in text:
+            text = text.replace(COUNTER, str(sipp_agent.get_counter()))
+        return text
+
+
+# (method, proxy, has sdp) -> Compiled_Template, shared by every agent
+compiled_templates = {}
+
+
+# Evaluate a template once with placeholders and normalize it the same way the agent formats actions
+def compile_template(method, proxy, has_sdp):
+    key = (method, proxy, has_sdp)
+    template = compiled_templates.get(key)
+    if template is None:
+        arguments = {field: placeholder(field) for field in ARGUMENT_FIELDS}
+        arguments["proxy"] = proxy
+        arguments["sdp"] = SDP if has_sdp else ""
+
+        function = Methods.response if method is None else Methods.call[method]
+        # The templates only call get_counter() on their agent
+        message = function(Placeholder_Agent(), arguments)  # type: ignore
+        action = f"""
+        <send>
+            {message}
+        </send>
+        """
+        template = compiled_templates[key] = Compiled_Template("".join(format_action(action)))
+    return template
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def render_template(method, proxy, values, sdp):
+    template = compile_template(method, proxy, sdp != "")
+    return template.render(dict(zip(ARGUMENT_FIELDS, values)), sdp)
@@ -0,0 +1,96 @@
+import math
+import os
+import pickle
+import shutil
+import tempfile
+import zlib
+
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+MINIMUM_BUCKETS = 16
+# Rough size of parsed messages in memory compared to the raw capture
+EXPANSION = 4
+# Fixed cost of a message / packet_record pair on top of its header and sdp strings
+MESSAGE_OVERHEAD = 300
+# Mapped capture pages already read are dropped every so many bytes while spilling
+RELEASE_INTERVAL = 64 * 1024 * 1024
+
+BUCKET_FILE = "bucket_{:04d}.pickle"
+
+
+# Number of buckets needed for each to fit in memory_limit once loaded back
+def bucket_count(capture_size, memory_limit=DEFAULT_MEMORY_LIMIT):
+    return max(MINIMUM_BUCKETS, math.ceil(capture_size * EXPANSION / memory_limit))
+
+
+def message_size(msg):
+    record = msg.record
+    size = MESSAGE_OVERHEAD + len(record.sdp or "")
+    headers = record.headers
+    if isinstance(headers, bytes):
+        return size + len(headers)
+    for name, value in (headers or {}).items():
+        size += len(name) + len(str(value))
+    return size
+
+
+# Parsed messages partitioned on a stable hash of their Call-ID into bucket files, buffered in memory
+# up to memory_limit. Every bucket holds whole calls so it can be rendered on its own (or in parallel)
+class Spill_Buckets:
+
+    def __init__(self, buckets, memory_limit=DEFAULT_MEMORY_LIMIT, directory=None):
+        self.buckets = buckets
+        self.memory_limit = memory_limit
+        self.owned = directory is None
+        self.directory = tempfile.mkdtemp(prefix="sippConverter-spill-") if directory is None else directory
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.buffers = [[] for _ in range(buckets)]
+        self.buffered = 0
+        # Messages spilled per role
+        self.counts = {}
+
+    def bucket(self, call_id):
+        return zlib.crc32((call_id or "").encode()) % self.buckets
+
+    def path(self, bucket):
+        return os.path.join(self.directory, BUCKET_FILE.format(bucket))
+
+    def add(self, role, msg):
+        self.buffers[self.bucket(msg.call_id)].append((role, msg))
+        self.counts[role] = self.counts.get(role, 0) + 1
+        self.buffered += message_size(msg)
+        if self.buffered >= self.memory_limit:
+            self.flush()
+
+    # Append every buffered message to its bucket file, a record shared by both roles is pickled once
+    def flush(self):
+        for bucket, entries in enumerate(self.buffers):
+            if not entries:
+                continue
+            with open(self.path(bucket), "ab") as output:
+                pickle.dump(entries, output, protocol=pickle.HIGHEST_PROTOCOL)
+            self.buffers[bucket] = []
+        self.buffered = 0
+
+    # Paths of the buckets that received anything
+    def files(self):
+        self.flush()
+        return [self.path(bucket) for bucket in range(self.buckets) if os.path.exists(self.path(bucket))]
+
+    def remove(self):
+        if self.owned:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        else:
+            for path in self.files():
+                os.remove(path)
+
+
+# (role, message) pairs of a bucket file in capture order
+def read_bucket(path):
+    with open(path, "rb") as bucket:
+        while True:
+            try:
+                entries = pickle.load(bucket)
+            except EOFError:
+                return
+            yield from entries
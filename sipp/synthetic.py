@@ -0,0 +1,218 @@
+import heapq
+import random
+import socket
+import struct
+
+CLIENT_ADDRESS = "10.0.0.1"
+SERVER_ADDRESS = "10.0.0.2"
+PROXY_NETWORK = "10.0.1."
+SIP_PORT = 5060
+RTP_INTERVAL = 0.02
+RTP_PAYLOAD = 160
+
+# Call flows as (seconds from call start, direction, start line, CSeq, carries sdp)
+# direction is ">" for caller -> callee and "<" for callee -> caller
+FLOWS = {
+    "basic": [
+        (0.00, ">", "INVITE sip:{callee}@{server} SIP/2.0", "1 INVITE", True),
+        (0.01, "<", "SIP/2.0 100 Trying", "1 INVITE", False),
+        (0.50, "<", "SIP/2.0 180 Ringing", "1 INVITE", False),
+        (2.00, "<", "SIP/2.0 200 OK", "1 INVITE", True),
+        (2.01, ">", "ACK sip:{callee}@{server} SIP/2.0", "1 ACK", False),
+        (30.0, ">", "BYE sip:{callee}@{server} SIP/2.0", "2 BYE", False),
+        (30.01, "<", "SIP/2.0 200 OK", "2 BYE", False),
+    ],
+    "prack": [
+        (0.00, ">", "INVITE sip:{callee}@{server} SIP/2.0", "1 INVITE", True),
+        (0.01, "<", "SIP/2.0 100 Trying", "1 INVITE", False),
+        (0.40, "<", "SIP/2.0 183 Session Progress", "1 INVITE", True),
+        (0.41, ">", "PRACK sip:{callee}@{server} SIP/2.0", "2 PRACK", False),
+        (0.42, "<", "SIP/2.0 200 OK", "2 PRACK", False),
+        (3.00, "<", "SIP/2.0 200 OK", "1 INVITE", True),
+        (3.01, ">", "ACK sip:{callee}@{server} SIP/2.0", "1 ACK", False),
+        (45.0, "<", "BYE sip:{caller}@{client} SIP/2.0", "1 BYE", False),
+        (45.01, ">", "SIP/2.0 200 OK", "1 BYE", False),
+    ],
+    "cancel": [
+        (0.00, ">", "INVITE sip:{callee}@{server} SIP/2.0", "1 INVITE", True),
+        (0.01, "<", "SIP/2.0 100 Trying", "1 INVITE", False),
+        (0.50, "<", "SIP/2.0 180 Ringing", "1 INVITE", False),
+        (5.00, ">", "CANCEL sip:{callee}@{server} SIP/2.0", "1 CANCEL", False),
+        (5.01, "<", "SIP/2.0 200 OK", "1 CANCEL", False),
+        (5.02, "<", "SIP/2.0 487 Request Terminated", "1 INVITE", False),
+        (5.03, ">", "ACK sip:{callee}@{server} SIP/2.0", "1 ACK", False),
+    ],
+    "reject": [
+        (0.00, ">", "INVITE sip:{callee}@{server} SIP/2.0", "1 INVITE", True),
+        (0.01, "<", "SIP/2.0 100 Trying", "1 INVITE", False),
+        (0.30, "<", "SIP/2.0 486 Busy Here", "1 INVITE", False),
+        (0.31, ">", "ACK sip:{callee}@{server} SIP/2.0", "1 ACK", False),
+    ],
+}
+
+DEFAULT_MIX = {"basic": 70, "prack": 10, "cancel": 10, "reject": 10}
+
+
+# Parse a flow mix of the form "basic=70,prack=10"
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in FLOWS:
+            raise ValueError(f"Unknown call flow {name}, expected one of {list(FLOWS)}")
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def build_sdp(address, port, extra_lines):
+    lines = [
+        "v=0",
+        f"o=- {port} {port} IN IP4 {address}",
+        "s=-",
+        f"c=IN IP4 {address}",
+        "t=0 0",
+        f"m=audio {port} RTP/AVP 0 8 101",
+        "a=rtpmap:0 PCMU/8000",
+        "a=rtpmap:8 PCMA/8000",
+        "a=rtpmap:101 telephone-event/8000",
+        "a=fmtp:101 0-15",
+        f"a=rtcp:{port + 1}",
+    ]
+    lines += [f"a=x-synthetic-{index}:{'x' * 32}" for index in range(extra_lines)]
+    lines.append("a=sendrecv")
+    return ("\r\n".join(lines) + "\r\n").encode()
+
+
+# Transactions started by the callee (its BYE and the response to it) have From / To and their tags swapped
+def build_sip(start_line, call_id, from_tag, to_tag, cseq, vias, body, caller, callee, from_callee=False):
+    local = f"<sip:{caller}@{CLIENT_ADDRESS}>", from_tag
+    remote = f"<sip:{callee}@{SERVER_ADDRESS}>", to_tag
+    if from_callee:
+        local, remote = remote, local
+    headers = [start_line]
+    headers += [f"Via: SIP/2.0/UDP {via}:{SIP_PORT};branch=z9hG4bK-{call_id}-{cseq.split()[0]}" for via in vias]
+    headers += [
+        f"From: {local[0]};tag={local[1]}",
+        f"To: {remote[0]}" + (f";tag={remote[1]}" if remote[1] else ""),
+        f"Call-ID: {call_id}",
+        f"CSeq: {cseq}",
+        "Max-Forwards: 70",
+    ]
+    if body:
+        headers.append("Content-Type: application/sdp")
+    headers.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + body
+
+
+def build_frame(src, dst, payload, ident, sport=SIP_PORT, dport=SIP_PORT):
+    udp = struct.pack(">HHHH", sport, dport, 8 + len(payload), 0) + payload
+    ip = struct.pack(">BBHHHBBH4s4s", 0x45, 0, 20 + len(udp), ident & 0xffff, 0, 64, 17, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    return b"\x00\x00\x5e\x00\x53\x02\x00\x00\x5e\x00\x53\x01\x08\x00" + ip + udp
+
+
+# Frames of a single call as (timestamp, frame bytes), one frame per hop for every message plus, once the
+# call is answered, rtp_packets RTP packets in each direction straight between the two parties
+def call_frames(number, flow, start, sdp_lines, proxies, rtp_packets=0):
+    call_id = f"{number:08d}@synthetic"
+    caller, callee = f"1{number:09d}", f"2{number:09d}"
+    path = [CLIENT_ADDRESS] + [f"{PROXY_NETWORK}{hop + 1}" for hop in range(proxies)] + [SERVER_ADDRESS]
+    hop_delay = 0.001
+
+    media_port = 10000 + (number % 20000) * 2
+    frames = []
+    for offset, direction, start_line, cseq, has_sdp in FLOWS[flow]:
+        start_line = start_line.format(caller=caller, callee=callee,
+                                       client=CLIENT_ADDRESS, server=SERVER_ADDRESS)
+        is_response = start_line.startswith("SIP/2.0")
+        to_tag = f"t{number}" if is_response and not start_line.startswith("SIP/2.0 100") \
+            or start_line.startswith(("ACK", "BYE", "PRACK")) else None
+
+        from_callee = (direction == "<") != is_response
+
+        hops = path if direction == ">" else path[::-1]
+        sender = hops[0]
+        media_address = CLIENT_ADDRESS if sender == CLIENT_ADDRESS else SERVER_ADDRESS
+        body = build_sdp(media_address, media_port, sdp_lines) if has_sdp else b""
+
+        for hop in range(len(hops) - 1):
+            vias = list(reversed(hops[:hop + 1]))
+            payload = build_sip(start_line, call_id, f"f{number}", to_tag, cseq, vias, body, caller, callee,
+                                from_callee)
+            frames.append((start + offset + hop * hop_delay,
+                           build_frame(hops[hop], hops[hop + 1], payload, number * 64 + len(frames))))
+
+        if rtp_packets and start_line == "SIP/2.0 200 OK" and cseq.endswith("INVITE"):
+            frames += rtp_frames(number, start + offset, media_port, rtp_packets)
+
+    frames.sort(key=lambda frame: frame[0])
+    return frames
+
+
+def rtp_frames(number, start, port, packets):
+    frames = []
+    for src, dst, ssrc in [(CLIENT_ADDRESS, SERVER_ADDRESS, number * 2), (SERVER_ADDRESS, CLIENT_ADDRESS, number * 2 + 1)]:
+        for sequence in range(packets):
+            header = struct.pack(">BBHII", 0x80, 0, sequence & 0xffff, sequence * RTP_PAYLOAD, ssrc & 0xffffffff)
+            frames.append((start + 0.005 + sequence * RTP_INTERVAL,
+                           build_frame(src, dst, header + b"\xff" * RTP_PAYLOAD, sequence, port, port)))
+    return frames
+
+
+# Generate calls lazily, merged into timestamp order
+def generate_frames(dialogs, mix=None, sdp_lines=0, proxies=0, call_rate=100.0, seed=1, rtp_packets=0):
+    weights = mix or DEFAULT_MIX
+    generator = random.Random(seed)
+    flows = generator.choices(list(weights), weights=list(weights.values()), k=dialogs)
+
+    calls = (iter(call_frames(number, flow, number / call_rate, sdp_lines, proxies, rtp_packets))
+             for number, flow in enumerate(flows))
+    return heapq.merge(*calls, key=lambda frame: frame[0])
+
+
+def write_pcap(output, frames):
+    output.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+    for timestamp, frame in frames:
+        seconds = int(timestamp)
+        output.write(struct.pack("<IIII", seconds, int(round((timestamp - seconds) * 1e6)) % 1000000,
+                                 len(frame), len(frame)))
+        output.write(frame)
+
+
+def pcapng_block(block_type, body):
+    body += b"\x00" * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def write_pcapng(output, frames):
+    output.write(pcapng_block(0x0a0d0d0a, struct.pack("<IHHq", 0x1a2b3c4d, 1, 0, -1)))
+    # Ethernet interface with nanosecond timestamps
+    output.write(pcapng_block(0x00000001, struct.pack("<HHI", 1, 0, 65535)
+                              + struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0)))
+    for timestamp, frame in frames:
+        nanoseconds = int(round(timestamp * 1e9))
+        output.write(pcapng_block(0x00000006, struct.pack("<IIIII", 0, nanoseconds >> 32,
+                                                          nanoseconds & 0xffffffff, len(frame), len(frame))
+                                  + frame))
+
+
+# Write a synthetic SIP capture, pcapng when the file name ends in .pcapng
+def write_capture(output_file, dialogs, mix=None, sdp_lines=0, proxies=0, call_rate=100.0, seed=1, rtp_packets=0):
+    frames = generate_frames(dialogs, mix, sdp_lines, proxies, call_rate, seed, rtp_packets)
+    count = 0
+
+    def counted():
+        nonlocal count
+        for frame in frames:
+            count += 1
+            yield frame
+
+    with open(output_file, "wb") as output:
+        if output_file.endswith(".pcapng"):
+            write_pcapng(output, counted())
+        else:
+            write_pcap(output, counted())
+
+    return count
@@ -0,0 +1,43 @@
+DEFAULT_TIME_SCALE = 1.0
+# Gaps shorter than this are treated as back to back signalling
+DEFAULT_PAUSE_THRESHOLD_MS = 50
+
+
+# Pause (ms) to insert before a message given the previous message time for the same role,
+# None when there is nothing worth waiting for
+def pause_ms(previous, current, time_scale=DEFAULT_TIME_SCALE, threshold_ms=DEFAULT_PAUSE_THRESHOLD_MS):
+    if previous is None or current is None or time_scale <= 0:
+        return None
+
+    gap = (current - previous) * 1000 * time_scale
+    if gap < threshold_ms:
+        return None
+    return int(round(gap))
+
+
+def status_code(msg):
+    code = msg.record.status_code
+    return int(code) if code is not None and code.isdigit() else None
+
+
+# Pair every sent request with the final response received for it (matched on the CSeq method) so
+# SIPp can report response times: returns ({start index: rtd name}, {response index: rtd name})
+def response_time_pairs(messages, send, recv):
+    starts = {}
+    stops = {}
+    pending = {}
+
+    for index, msg in enumerate(messages):
+        if msg.direction == send and msg.record.method is not None and msg.record.method != "ACK":
+            pending[msg.record.method] = index
+        elif msg.direction == recv and msg.record.method is None:
+            code = status_code(msg)
+            method = msg.cseq_method
+            if code is None or code < 200 or method not in pending:
+                continue
+
+            name = method.lower()
+            starts[pending.pop(method)] = name
+            stops[index] = name
+
+    return starts, stops
@@ -0,0 +1,79 @@
+from sipp import synthetic
+
+CALLER = "10.0.0.1"
+CALLEE = "10.0.0.2"
+
+SDP = b"v=0\r\no=- 1 1 IN IP4 {address}\r\ns=-\r\nc=IN IP4 {address}\r\nt=0 0\r\nm=audio 4000 RTP/AVP 0\r\n" \
+      b"a=rtpmap:0 PCMU/8000\r\n"
+
+
+def sdp_body(address):
+    return SDP.replace(b"{address}", address.encode())
+
+
+# SIP message as sent on the wire, From / To are given as (uri, tag)
+def sip_message(start_line, call_id, sender, receiver, cseq, body=b"", via=CALLER):
+    headers = [
+        start_line,
+        f"Via: SIP/2.0/UDP {via}:5060;branch=z9hG4bK-{call_id}-{cseq.split()[0]}",
+        f"From: <{sender[0]}>" + (f";tag={sender[1]}" if sender[1] else ""),
+        f"To: <{receiver[0]}>" + (f";tag={receiver[1]}" if receiver[1] else ""),
+        f"Call-ID: {call_id}",
+        f"CSeq: {cseq}",
+    ]
+    if body:
+        headers.append("Content-Type: application/sdp")
+    headers.append(f"Content-Length: {len(body)}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode() + body
+
+
+# Answered call hung up by the callee, as (src, dst, payload). Every message of the caller's direction has
+# From=caller;tag=f1 and To=callee;tag=t1, the callee's BYE (and its 200) swap them round
+def callee_bye_call(call_id="call-1", caller_tag="f1", callee_tag="t1"):
+    alice, bob = "sip:alice@" + CALLER, "sip:bob@" + CALLEE
+    caller, callee = (alice, caller_tag), (bob, callee_tag)
+    untagged = (bob, None)
+    return [
+        (CALLER, CALLEE, sip_message(f"INVITE {bob} SIP/2.0", call_id, caller, untagged, "1 INVITE",
+                                     sdp_body(CALLER))),
+        (CALLEE, CALLER, sip_message("SIP/2.0 100 Trying", call_id, caller, untagged, "1 INVITE")),
+        (CALLEE, CALLER, sip_message("SIP/2.0 180 Ringing", call_id, caller, callee, "1 INVITE")),
+        (CALLEE, CALLER, sip_message("SIP/2.0 200 OK", call_id, caller, callee, "1 INVITE", sdp_body(CALLEE))),
+        (CALLER, CALLEE, sip_message(f"ACK {bob} SIP/2.0", call_id, caller, callee, "1 ACK")),
+        (CALLEE, CALLER, sip_message(f"BYE {alice} SIP/2.0", call_id, callee, caller, "1 BYE", via=CALLEE)),
+        (CALLER, CALLEE, sip_message("SIP/2.0 200 OK", call_id, callee, caller, "1 BYE", via=CALLEE)),
+    ]
+
+
+# Same call hung up by the caller
+def caller_bye_call(call_id="call-1", caller_tag="f1", callee_tag="t1"):
+    alice, bob = "sip:alice@" + CALLER, "sip:bob@" + CALLEE
+    caller, callee = (alice, caller_tag), (bob, callee_tag)
+    return callee_bye_call(call_id, caller_tag, callee_tag)[:5] + [
+        (CALLER, CALLEE, sip_message(f"BYE {bob} SIP/2.0", call_id, caller, callee, "2 BYE")),
+        (CALLEE, CALLER, sip_message("SIP/2.0 200 OK", call_id, caller, callee, "2 BYE")),
+    ]
+
+
+# (timestamp, frame) pairs for (src, dst, payload) messages sent step seconds apart
+def frames(messages, start=1000.0, step=0.5):
+    return [(start + index * step, synthetic.build_frame(src, dst, payload, index))
+            for index, (src, dst, payload) in enumerate(messages)]
+
+
+def write_capture(path, messages, start=1000.0, step=0.5, pcapng=False):
+    with open(path, "wb") as output:
+        if pcapng:
+            synthetic.write_pcapng(output, frames(messages, start, step))
+        else:
+            synthetic.write_pcap(output, frames(messages, start, step))
+    return str(path)
+
+
+# Capture of (timestamp, (src, dst, payload)) messages, written in timestamp order
+def write_timed_capture(path, timed_messages):
+    timed = sorted(timed_messages, key=lambda item: item[0])
+    with open(path, "wb") as output:
+        synthetic.write_pcap(output, [(timestamp, synthetic.build_frame(src, dst, payload, index))
+                                      for index, (timestamp, (src, dst, payload)) in enumerate(timed)])
+    return str(path)
@@ -0,0 +1,72 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from sipp import api
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_paths_bytes_and_file_objects_convert_the_same(tmp_path):
+    path = write_capture(tmp_path / "call.pcap", callee_bye_call())
+    with open(path, "rb") as capture_file:
+        data = capture_file.read()
+
+    from_path = api.convert(path, CALLER, CALLEE, "1111", "2222", "test")
+    from_bytes = api.convert(data, CALLER, CALLEE, "1111", "2222", "test")
+    from_file = api.convert(io.BytesIO(data), CALLER, CALLEE, "1111", "2222", "test")
+
+    assert set(from_path) == {"UAC", "UAS"}
+    assert from_path == from_bytes == from_file
+    assert all(scenario is not None and scenario.startswith(b"<?xml") for scenario in from_path.values())
+
+
+def test_api_output_matches_the_command_line(tmp_path):
+    path = write_capture(tmp_path / "call.pcap", callee_bye_call())
+    subprocess.run([sys.executable, os.path.join(ROOT, "convert_capture.py"), "-i", path, "-c", CALLER,
+                    "-s", CALLEE, "-a", "1111", "-b", "2222", "-n", "test", "--backend", "native", "--no_cache",
+                    "-q"], cwd=tmp_path, check=True, capture_output=True)
+
+    converted = api.convert(path, CALLER, CALLEE, "1111", "2222", "test")
+
+    for role in ("UAC", "UAS"):
+        assert converted[role] == (tmp_path / "scenarios" / f"{role}.xml").read_bytes()
+
+
+def test_dialogs_come_back_with_their_descriptions(tmp_path):
+    path = write_capture(tmp_path / "calls.pcap", callee_bye_call("call-1") + callee_bye_call("call-2"))
+    with open(path, "rb") as capture_file:
+        data = capture_file.read()
+
+    dialogs = api.convert_dialogs(data, CALLER, CALLEE)
+
+    assert [entry["call_id"] for entry, _ in dialogs] == ["call-1", "call-2"]
+    assert all(set(scenarios) == {"UAC", "UAS"} and scenarios["UAC"] for _, scenarios in dialogs)
+
+
+def test_unsupported_sources_are_rejected():
+    with pytest.raises(ValueError):
+        api.convert(12345, CALLER, CALLEE)
+
+
+def test_parser_logging_goes_to_the_log_stream_only(tmp_path, capsys):
+    path = write_capture(tmp_path / "call.pcap", callee_bye_call())
+    log = io.StringIO()
+
+    api.convert(path, CALLER, CALLEE, quiet=False, log=log)
+    api.convert(path, CALLER, CALLEE, quiet=False)
+
+    assert "INVITE(SDP)" in log.getvalue() and "Captured 7 UAC packets & 7 UAS packets" in log.getvalue()
+    assert capsys.readouterr().out == ""
+
+
+def test_captures_without_sip_are_rejected_as_bad_input(tmp_path):
+    path = write_capture(tmp_path / "call.pcap", callee_bye_call())
+
+    with pytest.raises(ValueError, match="No SIP-enabled packets"):
+        api.convert(path, "10.9.9.9", CALLEE)
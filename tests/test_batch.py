@@ -0,0 +1,45 @@
+import json
+import os
+
+from sipp import batch, capture
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+OPTIONS = {
+    "client": CALLER, "server": CALLEE, "proxy": False, "backend": capture.NATIVE, "per_dialog": False,
+    "a_number": "1111", "b_number": "2222", "scen_name": "test", "quiet": True
+}
+
+
+def test_captures_are_found_and_get_distinct_directories(tmp_path):
+    for name in ("a.pcap", "b.PCAPNG", "notes.txt", os.path.join("rotated", "a.pcap")):
+        os.makedirs((tmp_path / name).parent, exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+
+    files = batch.find_captures(str(tmp_path))
+    nested = batch.find_captures(str(tmp_path / "**" / "*.pcap"))
+
+    assert files == [str(tmp_path / "a.pcap"), str(tmp_path / "b.PCAPNG")]
+    assert nested == [str(tmp_path / "a.pcap"), str(tmp_path / "rotated" / "a.pcap")]
+    assert list(batch.output_directories(nested, "out").values()) == \
+        [os.path.join("out", "a"), os.path.join("out", "a_1")]
+
+
+def test_batch_converts_every_capture_and_reports_failures(tmp_path):
+    captures = tmp_path / "captures"
+    captures.mkdir()
+    write_capture(captures / "one.pcap", callee_bye_call())
+    write_capture(captures / "two.pcapng", callee_bye_call("call-2"), pcapng=True)
+    (captures / "broken.pcap").write_bytes(b"not a capture")
+
+    summary = batch.run_batch(batch.find_captures(str(captures)), str(tmp_path / "out"), OPTIONS, jobs=2)
+
+    assert (summary["files"], summary["succeeded"], summary["failed"]) == (3, 2, 1)
+    results = {os.path.basename(result["input"]): result for result in summary["results"]}
+    assert results["broken.pcap"]["status"] == "failed"
+    assert "Unsupported capture format" in results["broken.pcap"]["error"]
+    for name in ("one.pcap", "two.pcapng"):
+        assert results[name]["packets"] == {"UAC": 7, "UAS": 7}
+        assert os.path.exists(os.path.join(results[name]["output"], "UAC.xml"))
+    with open(tmp_path / "out" / "summary.json") as summary_file:
+        assert json.load(summary_file)["succeeded"] == 2
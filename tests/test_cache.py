@@ -0,0 +1,62 @@
+import os
+
+from sipp import capture
+from sipp.cache import Parse_Cache
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, caller_bye_call, write_capture
+
+
+def test_key_follows_the_contents_and_parameters(tmp_path):
+    cache = Parse_Cache(str(tmp_path / "cache"))
+    first = write_capture(tmp_path / "first.pcap", callee_bye_call())
+    second = write_capture(tmp_path / "second.pcap", caller_bye_call())
+
+    assert cache.key(first, CALLER, CALLEE) == cache.key(first, CALLER, CALLEE)
+    assert cache.key(first, CALLER, CALLEE) != cache.key(first, CALLEE, CALLER)
+    assert cache.key(first, CALLER, CALLEE) != cache.key(second, CALLER, CALLEE)
+
+
+def test_entries_round_trip_and_unreadable_ones_are_dropped(tmp_path):
+    cache = Parse_Cache(str(tmp_path))
+    cache.put("good", {"UAC": [1, 2, 3]})
+    (tmp_path / "bad.cache").write_bytes(b"garbage")
+
+    assert cache.get("good") == {"UAC": [1, 2, 3]}
+    assert cache.get("missing") is None
+    assert cache.get("bad") is None
+    assert not (tmp_path / "bad.cache").exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = Parse_Cache(str(tmp_path), max_bytes=10 ** 9)
+    for number, name in enumerate(("old", "used", "new")):
+        cache.put(name, os.urandom(1000))
+        os.utime(tmp_path / f"{name}.cache", ns=(number * 10 ** 9, number * 10 ** 9))
+    # Reading an entry makes it the most recently used one
+    cache.get("old")
+
+    cache.max_bytes = 2100
+    cache.evict()
+
+    assert sorted(os.listdir(tmp_path)) == ["new.cache", "old.cache"]
+
+
+def test_second_parse_is_served_from_the_cache(tmp_path, capsys):
+    path = write_capture(tmp_path / "call.pcap", callee_bye_call())
+    cache = Parse_Cache(str(tmp_path / "cache"))
+
+    def parse():
+        parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, cache=cache, per_dialog=True, quiet=True)
+        parser.load_pcap_as_dict(path)
+        return parser
+
+    first = parse()
+    assert "from cache" not in capsys.readouterr().out
+    second = parse()
+    assert "Loaded parsed capture from cache" in capsys.readouterr().out
+
+    for role in ("UAC", "UAS"):
+        assert [msg.as_string() for msg in second.pcap_dict[role]] == [msg.as_string() for msg in first.pcap_dict[role]]
+    assert second.dialog_index is not None
+    assert len(list(second.dialog_index.dialogs())) == 1
@@ -0,0 +1,73 @@
+import socket
+
+import pytest
+
+from sipp.capture import native_source
+from sipp.capture.capture_filter import Capture_Filter, parse_frame_range
+from sipp.capture.decode import Datagram
+
+from helpers import CALLEE, CALLER, callee_bye_call, sip_message, write_capture
+
+
+def datagram(src, dst, sport=5060, dport=5060):
+    return Datagram(socket.inet_aton(src), socket.inet_aton(dst), sport, dport, b"")
+
+
+def test_display_and_capture_filters():
+    capture_filter = Capture_Filter([CALLER, "10.1.0.0/16"], ports=[5060, 5080], start_time=1.5, end_time=30,
+                                    first_frame=10, last_frame=200)
+
+    assert capture_filter.display_filter() == \
+        "sip && (ip.addr == 10.0.0.1 || ip.addr == 10.1.0.0/16) && (udp.port == 5060 || udp.port == 5080) && " \
+        "frame.time_relative >= 1.5 && frame.time_relative <= 30 && frame.number >= 10 && frame.number <= 200"
+    assert capture_filter.capture_filter() == "udp and (host 10.0.0.1 or net 10.1.0.0/16)"
+    assert Capture_Filter(None).display_filter() == "sip"
+    assert Capture_Filter(None).capture_filter() == "udp"
+
+
+def test_datagrams_are_matched_on_addresses_networks_and_ports():
+    capture_filter = Capture_Filter([CALLER, "10.1.0.0/16"], ports=[5060])
+
+    assert capture_filter.accepts_datagram(datagram(CALLER, "192.168.0.1"))
+    assert capture_filter.accepts_datagram(datagram("192.168.0.1", "10.1.200.3"))
+    assert not capture_filter.accepts_datagram(datagram("192.168.0.1", "10.2.0.1"))
+    assert capture_filter.accepts_datagram(datagram(CALLER, CALLEE, 40000, 5060))
+    assert not capture_filter.accepts_datagram(datagram(CALLER, CALLEE, 40000, 5080))
+    assert Capture_Filter(None).accepts_datagram(datagram("192.168.0.1", "192.168.0.2", 1, 2))
+
+
+def test_time_window_is_relative_to_the_first_frame():
+    capture_filter = Capture_Filter(None, start_time=1.0, end_time=2.0)
+    capture_filter.reset()
+
+    accepted = [capture_filter.accepts_frame(number, 100.0 + number * 0.5) for number in range(1, 7)]
+
+    # Frame 1 (at 100.5) starts the clock, 1.0 to 2.0 seconds later are frames 3 to 5
+    assert accepted == [False, False, True, True, True, False]
+
+
+def test_frame_range():
+    capture_filter = Capture_Filter(None, first_frame=2, last_frame=3)
+
+    assert [capture_filter.accepts_frame(number, 0.0) for number in range(1, 5)] == [False, True, True, False]
+    assert not capture_filter.past_end(3)
+    assert capture_filter.past_end(4)
+    assert parse_frame_range("10-20") == (10, 20)
+    assert parse_frame_range("10-") == (10, None)
+    assert parse_frame_range("-20") == (None, 20)
+    assert parse_frame_range(None) == (None, None)
+    with pytest.raises(ValueError):
+        parse_frame_range("10")
+
+
+def test_native_backend_applies_the_filter_before_decoding(tmp_path):
+    other = ("192.168.0.1", "192.168.0.2",
+             sip_message("OPTIONS sip:x SIP/2.0", "other", ("sip:a@x", "o1"), ("sip:b@y", None), "1 OPTIONS"))
+    messages = callee_bye_call()
+    path = write_capture(tmp_path / "mixed.pcap", messages[:3] + [other] + messages[3:])
+
+    packets = [packet for packet in native_source.read_sip_packets(path, Capture_Filter([CALLER, CALLEE], last_frame=6))
+               if packet is not None]
+
+    assert [packet.number for packet in packets] == [1, 2, 3, 5, 6]
+    assert {packet.header("Call-ID") for packet in packets} == {"call-1"}
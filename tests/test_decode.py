@@ -0,0 +1,139 @@
+import struct
+
+from sipp import synthetic
+from sipp.capture import decode, native_source
+from sipp.capture.capture_filter import Capture_Filter
+from sipp.capture.sip_decoder import header_keys, parse_headers, parse_sip
+from sipp.metrics import FRAMES_FILTERED, FRAMES_READ, Metrics
+
+from helpers import CALLEE, CALLER, callee_bye_call, sdp_body, write_capture
+
+INVITE = callee_bye_call()[0][2]
+ETHERNET = synthetic.build_frame(CALLER, CALLEE, INVITE, 1)
+IP = ETHERNET[14:]
+
+
+def datagram(linktype, data):
+    result = decode.decode_udp(linktype, data)
+    return result and (result.src, result.dst, result.sport, result.dport, bytes(result.payload))
+
+
+EXPECTED = (bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2]), 5060, 5060, INVITE)
+
+
+def test_link_layers_are_stripped():
+    vlan = ETHERNET[:12] + b"\x81\x00\x00\x07" + b"\x88\xa8\x00\x08" + ETHERNET[12:]
+    sll = b"\x00" * 14 + b"\x08\x00" + IP
+    sll2 = b"\x08\x00" + b"\x00" * 18 + IP
+    null = struct.pack("<I", 2) + IP
+
+    assert datagram(decode.LINKTYPE_ETHERNET, ETHERNET) == EXPECTED
+    assert datagram(decode.LINKTYPE_ETHERNET, vlan) == EXPECTED
+    assert datagram(decode.LINKTYPE_RAW, IP) == EXPECTED
+    assert datagram(decode.LINKTYPE_IPV4, IP) == EXPECTED
+    assert datagram(decode.LINKTYPE_LINUX_SLL, sll) == EXPECTED
+    assert datagram(decode.LINKTYPE_LINUX_SLL2, sll2) == EXPECTED
+    assert datagram(decode.LINKTYPE_NULL, null) == EXPECTED
+
+
+def test_non_udp_and_non_ipv4_are_rejected():
+    tcp = IP[:9] + b"\x06" + IP[10:]
+    ipv6 = ETHERNET[:12] + b"\x86\xdd" + ETHERNET[14:]
+
+    assert datagram(decode.LINKTYPE_RAW, tcp) is None
+    assert datagram(decode.LINKTYPE_ETHERNET, ipv6) is None
+    assert datagram(decode.LINKTYPE_ETHERNET, ETHERNET[:10]) is None
+    assert datagram(147, IP) is None
+
+
+# Split an IPv4 / UDP packet into fragments carrying size bytes (a multiple of 8) of its payload each
+def fragments(ip, size):
+    header, payload = ip[:20], ip[20:]
+    parts = []
+    for offset in range(0, len(payload), size):
+        part = payload[offset:offset + size]
+        more = 0x2000 if offset + size < len(payload) else 0
+        flags = struct.pack(">H", more | offset // 8)
+        parts.append(header[:2] + struct.pack(">H", 20 + len(part)) + header[4:6] + flags + header[8:] + part)
+    return parts
+
+
+def test_fragments_are_reassembled_in_any_order():
+    parts = fragments(IP, 128)
+    reassembler = decode.IPv4_Reassembler()
+
+    results = [decode.decode_udp(decode.LINKTYPE_RAW, part, reassembler) for part in reversed(parts)]
+
+    datagram = results[-1]
+    assert len(parts) > 2
+    assert results[:-1] == [None] * (len(parts) - 1)
+    assert datagram is not None and bytes(datagram.payload) == INVITE
+    assert reassembler.pending == {}
+    # Without a reassembler fragments are dropped
+    assert decode.decode_udp(decode.LINKTYPE_RAW, parts[0]) is None
+
+
+def test_request_is_decoded():
+    packet = parse_sip(INVITE)
+
+    assert packet is not None
+    assert (packet.method, packet.status_code, packet.status_line) == ("INVITE", None, None)
+    assert (packet.from_tag, packet.to_tag) == ("f1", None)
+    assert packet.headers["Call-ID"] == "call-1"
+    assert packet.headers["CSeq"] == "1 INVITE"
+    assert packet.body == sdp_body(CALLER)
+    assert packet.raw_headers is None
+
+
+def test_response_compact_and_folded_headers():
+    payload = b"SIP/2.0 180 Ringing\r\ni: call-9\r\nf: <sip:a@x>;tag=abc\r\nt: <sip:b@y>\r\n ;tag=def\r\n" \
+              b"CSeq: 1 INVITE\r\nX-Custom: one\r\nx-custom: two\r\nl: 4\r\n\r\nbodytrailing"
+
+    packet = parse_sip(payload, header_keys(["X-Custom"]))
+
+    assert packet is not None
+    assert (packet.method, packet.status_code, packet.status_line) == (None, "180", "SIP/2.0 180 Ringing")
+    assert packet.headers["Call-ID"] == "call-9"
+    assert (packet.from_tag, packet.to_tag) == ("abc", "def")
+    assert packet.body == b"body"
+    assert parse_headers(packet.raw_headers) == {"X-Custom": "one, two"}
+
+
+def test_non_sip_payloads_are_rejected():
+    assert parse_sip(b"\x80\x00" + b"\x00" * 170) is None
+    assert parse_sip(b"SIP/2.0 garbage\r\n\r\n") is None
+    assert parse_sip(b"INVITE sip:b@y HTTP/1.1\r\n\r\n") is None
+
+
+def test_read_sip_packets(tmp_path):
+    messages = callee_bye_call()
+    # An RTP packet in between is read but filtered out
+    rtp = (CALLER, CALLEE, b"\x80\x00" + b"\x00" * 170)
+    path = write_capture(tmp_path / "call.pcapng", messages[:4] + [rtp] + messages[4:], start=50.0, pcapng=True)
+    stage_metrics = Metrics()
+
+    packets = [packet for packet in native_source.read_sip_packets(path, metrics=stage_metrics) if packet is not None]
+
+    assert [packet.number for packet in packets] == [1, 2, 3, 4, 6, 7, 8]
+    assert [packet.method or packet.status_code for packet in packets] == \
+        ["INVITE", "100", "180", "200", "ACK", "BYE", "200"]
+    assert packets[0].timestamp == 50.0
+    assert (packets[0].src, packets[0].dst, packets[0].sport) == (CALLER, CALLEE, 5060)
+    assert (packets[-1].src, packets[-1].dst) == (CALLER, CALLEE)
+    assert stage_metrics.counters[FRAMES_READ] == 8
+    assert stage_metrics.counters[FRAMES_FILTERED] == 1
+
+
+def test_read_chunk_packets_matches_a_single_read(tmp_path):
+    messages = callee_bye_call("call-1") + callee_bye_call("call-2", "f2", "t2")
+    path = write_capture(tmp_path / "calls.pcap", messages)
+    capture_filter = Capture_Filter([CALLER, CALLEE])
+
+    whole = [(packet.number, packet.method or packet.status_code)
+             for packet in native_source.read_sip_packets(path, capture_filter) if packet is not None]
+    chunked = [(packet.number, packet.method or packet.status_code)
+               for chunk in native_source.capture_chunks(path, 3)
+               for packet in native_source.read_chunk_packets(path, chunk, capture_filter) if packet is not None]
+
+    assert chunked == whole
+    assert len(whole) == 14
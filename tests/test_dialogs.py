@@ -0,0 +1,72 @@
+import json
+import os
+
+from sipp import capture
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+
+def load_dialogs(path):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True)
+    parser.load_pcap_as_dict(path)
+    assert parser.dialog_index is not None
+    return list(parser.dialog_index.dialogs())
+
+
+def methods(messages):
+    return [msg.record.method or msg.record.status_code for msg in messages]
+
+
+def test_callee_bye_stays_in_its_dialog(tmp_path):
+    dialogs = load_dialogs(write_capture(tmp_path / "call.pcap", callee_bye_call()))
+
+    assert len(dialogs) == 1
+    dialog = dialogs[0]
+    assert (dialog.from_tag, dialog.to_tag) == ("f1", "t1")
+    assert methods(dialog.pcap_dict["UAC"]) == ["INVITE", "100", "180", "200", "ACK", "BYE", "200"]
+    assert methods(dialog.pcap_dict["UAS"]) == ["INVITE", "100", "180", "200", "ACK", "BYE", "200"]
+
+
+def test_forks_split_on_the_callee_tag(tmp_path):
+    messages = callee_bye_call()
+    # A second fork answering with its own tag and hanging up the same way
+    fork = callee_bye_call(callee_tag="t2")[2:]
+    dialogs = load_dialogs(write_capture(tmp_path / "forked.pcap", messages[:5] + fork[:3] + messages[5:] + fork[3:]))
+
+    assert [dialog.to_tag for dialog in dialogs] == ["t1", "t2"]
+    for dialog in dialogs:
+        # The untagged INVITE / 100 belong to every fork, the rest only to its own
+        assert methods(dialog.pcap_dict["UAC"]) == ["INVITE", "100", "180", "200", "ACK", "BYE", "200"]
+
+
+def test_calls_are_grouped_by_call_id(tmp_path):
+    first = callee_bye_call("call-1")
+    second = callee_bye_call("call-2", "f2", "t2")
+    interleaved = [message for pair in zip(first, second) for message in pair]
+    dialogs = load_dialogs(write_capture(tmp_path / "calls.pcap", interleaved))
+
+    assert [(dialog.call_id, dialog.to_tag) for dialog in dialogs] == [("call-1", "t1"), ("call-2", "t2")]
+    assert all(len(dialog.pcap_dict["UAC"]) == 7 for dialog in dialogs)
+
+
+def test_dialog_scenarios_and_index_are_written(tmp_path):
+    path = write_capture(tmp_path / "calls.pcap", callee_bye_call("call/1@host") + callee_bye_call("call-2", "f2", "t2"))
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True,
+                        output_directory=str(tmp_path / "scenarios"))
+    parser.load_pcap_as_dict(path)
+
+    entries = parser.save_dialogs_to_xml("1111", "2222", "test")
+
+    # Paths are relative to the index's directory
+    assert [(entry["directory"], entry["UAC"]) for entry in entries] == \
+        [("000000_call_1_host", os.path.join("000000_call_1_host", "UAC.xml")),
+         ("000001_call-2", os.path.join("000001_call-2", "UAC.xml"))]
+    with open(tmp_path / "scenarios" / "index.json") as index:
+        assert json.load(index) == {"dialogs": entries}
+    for entry in entries:
+        assert entry["messages"] == {"UAC": 7, "UAS": 7}
+        for role in ("UAC", "UAS"):
+            with open(tmp_path / "scenarios" / entry[role]) as scenario_file:
+                scenario = scenario_file.read()
+            assert scenario.count("<send") + scenario.count("<recv") == 7
@@ -0,0 +1,45 @@
+import pytest
+
+from sipp.capture import dissector_pool
+from sipp.capture.decode import decode_udp
+from sipp.capture.pcap_reader import Pcap_Reader
+
+from helpers import callee_bye_call, frames, write_capture
+
+
+def test_captures_stream_as_pcapng_sections_ending_in_a_marker(tmp_path):
+    first = write_capture(tmp_path / "first.pcap", callee_bye_call(), start=1000.25)
+    second = write_capture(tmp_path / "second.pcapng", callee_bye_call("call-2")[:3], start=2000.5, pcapng=True)
+
+    stream = b"".join(dissector_pool.capture_section(first)) + b"".join(dissector_pool.capture_section(second))
+    with Pcap_Reader(stream) as reader:
+        read = [(frame.timestamp, frame.linktype, bytes(frame.data)) for frame in reader]
+
+    expected = [(timestamp, 1, frame) for timestamp, frame in frames(callee_bye_call(), start=1000.25)]
+    assert read[:7] == expected
+    assert [timestamp for timestamp, _, _ in read[8:11]] == [2000.5, 2001.0, 2001.5]
+    datagrams = [decode_udp(linktype, data) if linktype == dissector_pool.LINKTYPE_RAW else None
+                 for _, linktype, data in read]
+    markers = [index for index, datagram in enumerate(datagrams)
+               if datagram is not None and bytes(datagram.payload) == dissector_pool.MARKER_PAYLOAD]
+    assert markers == [7, 11]
+
+
+def test_unreadable_capture_still_ends_in_a_marker():
+    section = dissector_pool.capture_section(b"not a capture")
+
+    blocks = [next(section), next(section)]
+    with pytest.raises(ValueError):
+        next(section)
+
+    with Pcap_Reader(b"".join(blocks)) as reader:
+        [marker] = [bytes(frame.data) for frame in reader]
+    assert marker == dissector_pool.marker_packet()
+
+
+def test_marker_lines_are_recognised():
+    marker = ["12", "0.0", dissector_pool.MARKER_ADDRESS, dissector_pool.MARKER_ADDRESS, "9", "9"]
+
+    assert dissector_pool.is_marker(marker)
+    assert not dissector_pool.is_marker(["12", "0.0", "10.0.0.1", "10.0.0.2", "9", "9"])
+    assert not dissector_pool.is_marker(["12"])
@@ -0,0 +1,32 @@
+import json
+
+from sipp import capture
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, caller_bye_call, write_capture
+
+
+def test_unique_flows_count_whole_calls(tmp_path):
+    messages = []
+    for number in range(3):
+        messages += callee_bye_call(f"callee-{number}", f"f{number}", f"t{number}")
+    messages += caller_bye_call("caller-0", "f9", "t9")
+    path = write_capture(tmp_path / "calls.pcap", messages)
+
+    output_directory = tmp_path / "scenarios"
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, output_directory=str(output_directory),
+                        unique_flows=True, quiet=True)
+    parser.load_pcap_as_dict(path)
+    index = parser.save_dialogs_to_xml("1111", "2222", "test")
+
+    with open(output_directory / "flows.json") as flows_file:
+        flows = json.load(flows_file)
+
+    assert len(index) == 4
+    assert flows["dialogs"] == 4
+    assert [(flow["count"], flow["sample_call_ids"]) for flow in flows["flows"]] == \
+        [(3, ["callee-0", "callee-1", "callee-2"]), (1, ["caller-0"])]
+    assert flows["flows"][0]["sequence"]["UAC"] == ">INVITE(SDP) <100 <180 <200(SDP) >ACK <BYE >200"
+    assert flows["flows"][1]["sequence"]["UAC"] == ">INVITE(SDP) <100 <180 <200(SDP) >ACK >BYE <200"
+    # Later dialogs of a flow point at the first one's scenarios
+    assert index[1]["UAC"] == index[0]["UAC"]
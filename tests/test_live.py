@@ -0,0 +1,104 @@
+import json
+import struct
+
+from sipp import capture
+from sipp.capture.follow import follow_frames
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, frames as capture_frames, write_capture
+
+
+def follow(path, output_directory):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, output_directory=str(output_directory),
+                        quiet=True)
+    written = parser.follow_pcap(path, "1111", "2222", "test", poll_interval=0.01, idle_exit=0.05)
+    with open(output_directory / "index.jsonl") as index:
+        return written, [json.loads(line) for line in index]
+
+
+def test_followed_callee_bye_is_one_dialog(tmp_path):
+    # The second call starts well after the first one's linger so the first is written while following
+    messages = callee_bye_call("call-1") + callee_bye_call("call-2", "f2", "t2")
+    path = write_capture(tmp_path / "live.pcap", messages, step=1.0)
+
+    written, entries = follow(path, tmp_path / "scenarios")
+
+    assert written == 2
+    assert [(entry["call_id"], entry["to_tag"], entry["outcome"]) for entry in entries] == \
+        [("call-1", "t1", "completed"), ("call-2", "t2", "completed")]
+    assert all(entry["messages"] == {"UAC": 7, "UAS": 7} for entry in entries)
+
+
+def test_followed_call_still_open_is_flushed(tmp_path):
+    path = write_capture(tmp_path / "live.pcap", callee_bye_call()[:5])
+
+    written, entries = follow(path, tmp_path / "scenarios")
+
+    assert written == 1
+    assert entries[0]["outcome"] == "flushed"
+    assert entries[0]["messages"] == {"UAC": 5, "UAS": 5}
+
+
+def test_growing_capture_is_read_as_it_is_written(tmp_path):
+    messages = callee_bye_call()
+    path = tmp_path / "growing.pcap"
+    write_capture(path, messages[:3])
+    frames = follow_frames(str(path), poll_interval=0.01)
+
+    first = [next(frames) for _ in range(3)]
+    assert next(frames) is None
+    with open(path, "ab") as output:
+        for timestamp, frame in capture_frames(messages)[3:]:
+            output.write(struct.pack("<IIII", int(timestamp), 0, len(frame), len(frame)) + frame)
+    rest = [next(frames) for _ in range(4)]
+    frames.close()
+
+    assert [frame.number if frame is not None else None for frame in first + rest] == list(range(1, 8))
+
+
+def test_rotated_files_are_followed_in_order(tmp_path):
+    messages = callee_bye_call()
+    write_capture(tmp_path / "ring_00001.pcap", messages[:4])
+    write_capture(tmp_path / "ring_00002.pcap", messages[4:], start=1002.0)
+
+    written, entries = follow(str(tmp_path / "ring_*.pcap"), tmp_path / "scenarios")
+
+    assert written == 1
+    assert (entries[0]["outcome"], entries[0]["messages"]) == ("completed", {"UAC": 7, "UAS": 7})
+
+
+def test_long_silent_call_is_kept_whole_by_default(tmp_path):
+    messages = callee_bye_call()
+    path = write_capture(tmp_path / "long.pcap", messages[:5])
+    # The BYE two minutes after the ACK
+    with open(path, "ab") as output:
+        for timestamp, frame in capture_frames(messages, start=1120.0, step=0.5)[5:]:
+            output.write(struct.pack("<IIII", int(timestamp), 0, len(frame), len(frame)) + frame)
+
+    written, entries = follow(path, tmp_path / "scenarios")
+
+    assert written == 1
+    assert (entries[0]["outcome"], entries[0]["messages"]) == ("completed", {"UAC": 7, "UAS": 7})
+
+
+def test_messages_of_a_timed_out_call_are_counted(tmp_path, capsys):
+    messages = callee_bye_call()
+    path = write_capture(tmp_path / "long.pcap", messages[:5])
+    # Another call moves the capture clock past the first one's idle timeout before its BYE
+    later = capture_frames(callee_bye_call("call-2", "f2", "t2")[:1], start=1070.0) + \
+        capture_frames(messages, start=1080.0, step=0.5)[5:]
+    with open(path, "ab") as output:
+        for timestamp, frame in later:
+            output.write(struct.pack("<IIII", int(timestamp), 0, len(frame), len(frame)) + frame)
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, output_directory=str(tmp_path / "scenarios"),
+                        quiet=True)
+
+    written = parser.follow_pcap(path, "1111", "2222", "test", idle_timeout=60.0, poll_interval=0.01,
+                                 idle_exit=0.05)
+
+    assert written == 2
+    assert parser.live is not None and parser.live.written_outcome("call-1") == "timeout"
+    # The BYE and its 200 OK, once for each role
+    assert (parser.live.late_messages, parser.live.late_calls) == (4, 1)
+    assert parser.metrics.counters["messages_late"] == 4
+    assert "Dropped 4 messages of 1 calls" in capsys.readouterr().out
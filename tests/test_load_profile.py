@@ -0,0 +1,42 @@
+from sipp import load_profile
+from sipp.load_profile import Call_Timing
+
+
+def timings(starts, duration=1.0):
+    calls = []
+    for number, start in enumerate(starts):
+        call = Call_Timing(f"call-{number}")
+        call.start = call.last = start
+        call.answered = start + 0.1
+        call.end = start + duration
+        calls.append(call)
+    return calls
+
+
+def test_capture_shorter_than_an_interval():
+    # 51 calls in half a second
+    profile = load_profile.build_profile(timings([index * 0.01 for index in range(51)]), interval=10.0)
+
+    assert profile["average_calls_per_second"] == 100.0
+    assert profile["peak_calls_per_second"] == 100.0
+    assert profile["arrivals"] == [{"offset": 0.0, "calls": 51, "calls_per_second": 100.0}]
+    assert profile["sipp_arguments"][:4] == ["-r", "100", "-rp", "1000"]
+
+
+def test_partial_last_bucket_is_rated_over_its_own_span():
+    # 10 cps for 25 seconds
+    rates = load_profile.arrival_rates([index * 0.1 for index in range(251)], interval=10.0)
+
+    assert [calls_per_second for _, _, calls_per_second in rates] == [10.0, 10.0, 10.0]
+
+
+def test_ramp_never_tops_out_below_the_start_rate():
+    # 1 cps for 20 seconds then 10 cps for 5 seconds
+    starts = [float(index) for index in range(20)] + [20 + index * 0.1 for index in range(51)]
+    profile = load_profile.build_profile(timings(starts), interval=10.0)
+    ramp = profile["sipp_ramp_arguments"]
+
+    assert profile["peak_calls_per_second"] >= profile["average_calls_per_second"]
+    assert int(ramp[ramp.index("-rate_max") + 1]) >= int(ramp[ramp.index("-r") + 1])
+    assert profile["peak_calls_per_second"] == 10.0
+
@@ -0,0 +1,41 @@
+from sipp import capture, loopback
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, caller_bye_call, write_capture
+
+
+def convert(tmp_path, messages):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True, time_scale=0,
+                        output_directory=str(tmp_path / "scenarios"))
+    parser.load_pcap_as_dict(write_capture(tmp_path / "calls.pcap", messages))
+    parser.save_dialogs_to_xml("1111", "2222", "test")
+    return loopback.find_pairs(str(tmp_path / "scenarios"))
+
+
+def test_converted_pairs_play_against_each_other(tmp_path):
+    pairs = convert(tmp_path, callee_bye_call("call-1") + caller_bye_call("call-2", "f2", "t2"))
+
+    summary, results = loopback.Loopback_Runner(calls=5, concurrency=4, timeout=5).run(pairs)
+
+    assert [name for name, _, _ in pairs] == ["call-1", "call-2"]
+    # Index paths are found next to the index, not under the working directory
+    assert all(uac.startswith(str(tmp_path / "scenarios")) for _, uac, _ in pairs)
+    assert (summary["pairs"], summary["passed_pairs"], summary["calls"], summary["passed"]) == (2, 2, 10, 10)
+    assert summary["stray_messages"] == 0
+    assert all(result.ok() for result in results)
+    assert "2/2 scenario pairs passed" in loopback.summary_text(summary, results)
+
+
+def test_mismatched_pairs_fail(tmp_path):
+    uac, uas = convert(tmp_path, caller_bye_call())[0][1:]
+    # The UAS answers with a 486 its UAC never expects
+    with open(uas) as scenario:
+        broken = scenario.read().replace("SIP/2.0 200 OK", "SIP/2.0 486 Busy Here", 1)
+    (tmp_path / "broken.xml").write_text(broken)
+
+    summary, results = loopback.Loopback_Runner(calls=2, timeout=1).run(
+        [("broken", uac, str(tmp_path / "broken.xml")), ("missing", uac, str(tmp_path / "missing.xml"))])
+
+    assert (summary["passed_pairs"], summary["failed"]) == (0, 2)
+    assert results[0].errors and not results[0].load_error
+    assert results[1].load_error
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from sipp import capture, synthetic
+from sipp.capture.pcap_reader import Pcap_Reader
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, frames
+
+RTP = b"\x80\x00" + b"\x00" * 170
+RTCP = b"\x80\xc8" + b"\x00" * 26
+
+
+# The call with RTP both ways after the 200 OK (both SDPs offer port 4000), an RTCP report from the
+# caller and RTP between two other hosts that belongs to no call
+def call_with_media():
+    signalling = frames(callee_bye_call())
+    media = []
+    for number in range(5):
+        timestamp = 1001.6 + number * 0.02
+        media.append((timestamp, synthetic.build_frame(CALLER, CALLEE, RTP, number, 4000, 4000)))
+        media.append((timestamp + 0.01, synthetic.build_frame(CALLEE, CALLER, RTP, number, 4000, 4000)))
+    media.append((1001.9, synthetic.build_frame(CALLER, CALLEE, RTCP, 9, 4001, 4001)))
+    media.append((1001.95, synthetic.build_frame("10.9.9.1", "10.9.9.2", RTP, 9, 4000, 4000)))
+    return signalling[:4] + media + signalling[4:], media
+
+
+def packets(path):
+    with Pcap_Reader(path) as reader:
+        return [(frame.timestamp, bytes(frame.data)) for frame in reader]
+
+
+@pytest.mark.parametrize("pcapng", [False, True])
+def test_media_is_extracted_per_call_role_and_kind(tmp_path, pcapng):
+    capture_frames, media = call_with_media()
+    path = str(tmp_path / ("call.pcapng" if pcapng else "call.pcap"))
+    with open(path, "wb") as output:
+        (synthetic.write_pcapng if pcapng else synthetic.write_pcap)(output, capture_frames)
+    output_directory = tmp_path / "scenarios"
+
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True, extract_media=True,
+                        output_directory=str(output_directory))
+    parser.load_pcap_as_dict(path)
+    [entry] = parser.save_dialogs_to_xml("1111", "2222", "test")
+
+    directory = output_directory / "media" / "000000_call-1"
+    assert sorted(os.listdir(directory)) == ["UAC_audio.pcap", "UAC_audio_rtcp.pcap", "UAS_audio.pcap"]
+    assert [data for _, data in packets(str(directory / "UAC_audio.pcap"))] == [frame for _, frame in media[0:10:2]]
+    assert [data for _, data in packets(str(directory / "UAS_audio.pcap"))] == [frame for _, frame in media[1:10:2]]
+    assert [timestamp for timestamp, _ in packets(str(directory / "UAC_audio.pcap"))] == \
+        pytest.approx([timestamp for timestamp, _ in media[0:10:2]], abs=1e-6)
+
+    # Each side replays the audio it sent, paths are relative to its scenario directory
+    with open(output_directory / entry["UAC"]) as scenario:
+        assert 'play_pcap_audio="../media/000000_call-1/UAC_audio.pcap"' in scenario.read()
+    with open(output_directory / entry["UAS"]) as scenario:
+        assert 'play_pcap_audio="../media/000000_call-1/UAS_audio.pcap"' in scenario.read()
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+
+from sipp import metrics
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_merge_and_timed():
+    first = metrics.Metrics()
+    first.add(metrics.SDP, 0.5, 100, 80)
+    first.count(metrics.MESSAGES, 2)
+    second = metrics.Metrics()
+    second.add(metrics.SDP, 0.25, 50, 40, calls=2)
+    second.count(metrics.MESSAGES)
+    second.count(metrics.FRAMES_READ, 7)
+
+    first.merge(second)
+    items = list(first.timed(metrics.DISSECT, iter("abc")))
+
+    assert first.as_dict()["stages"][metrics.SDP] == {"seconds": 0.75, "calls": 3, "bytes_in": 150, "bytes_out": 120}
+    assert first.counters == {metrics.MESSAGES: 3, metrics.FRAMES_READ: 7}
+    assert items == ["a", "b", "c"]
+    assert first.stages[metrics.DISSECT].calls == 3
+    assert list(first.as_dict()["stages"]) == metrics.STAGES
+
+
+def test_convert_capture_writes_stage_metrics(tmp_path):
+    path = write_capture(tmp_path / "call.pcap", callee_bye_call())
+    metrics_file = tmp_path / "metrics.json"
+
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "convert_capture.py"), "-i", path, "-c", CALLER, "-s", CALLEE,
+         "--backend", "native", "--no_cache", "-q", "--metrics", "--metrics-json", str(metrics_file)],
+        cwd=tmp_path, capture_output=True, text=True)
+
+    assert completed.returncode == 0, completed.stderr
+    assert "stage" in completed.stdout and "wall" in completed.stdout
+    assert "Folder created!" not in completed.stdout
+    with open(metrics_file) as output:
+        saved = json.load(output)
+    stages, counters = saved["stages"], saved["counters"]
+    assert stages[metrics.DISSECT]["bytes_in"] == os.path.getsize(path)
+    assert stages[metrics.SDP]["calls"] == 2
+    assert stages[metrics.RENDER]["calls"] == 7
+    assert stages[metrics.WRITE]["bytes_out"] == \
+        sum(os.path.getsize(tmp_path / "scenarios" / name) for name in ("UAC.xml", "UAS.xml"))
+    assert counters[metrics.MESSAGES] == 14
@@ -0,0 +1,107 @@
+import struct
+
+import pytest
+
+from sipp import synthetic
+from sipp.capture.pcap_reader import Pcap_Reader
+
+from helpers import callee_bye_call, frames, write_capture
+
+
+def pcap_header(endian="<", magic=0xa1b2c3d4, linktype=1):
+    return struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 65535, linktype)
+
+
+def pcap_record(seconds, fraction, data, endian="<"):
+    return struct.pack(endian + "IIII", seconds, fraction, len(data), len(data)) + data
+
+
+def read(capture):
+    with Pcap_Reader(capture) as reader:
+        return [(frame.number, frame.timestamp, frame.linktype, bytes(frame.data)) for frame in reader]
+
+
+def test_pcap_frames_and_timestamps(tmp_path):
+    messages = callee_bye_call()
+    path = write_capture(tmp_path / "call.pcap", messages, start=1000.25, step=0.5)
+
+    read_frames = read(path)
+
+    assert [number for number, _, _, _ in read_frames] == list(range(1, 8))
+    assert [timestamp for _, timestamp, _, _ in read_frames] == pytest.approx([1000.25 + 0.5 * i for i in range(7)])
+    assert [data for _, _, _, data in read_frames] == [frame for _, frame in frames(messages)]
+    assert all(linktype == 1 for _, _, linktype, _ in read_frames)
+
+
+def test_pcapng_matches_pcap(tmp_path):
+    messages = callee_bye_call()
+    pcap = read(write_capture(tmp_path / "call.pcap", messages, start=1000.25))
+    pcapng = read(write_capture(tmp_path / "call.pcapng", messages, start=1000.25, pcapng=True))
+
+    assert [(number, data) for number, _, _, data in pcapng] == [(number, data) for number, _, _, data in pcap]
+    assert [timestamp for _, timestamp, _, _ in pcapng] == pytest.approx([timestamp for _, timestamp, _, _ in pcap])
+
+
+def test_big_endian_nanosecond_pcap():
+    capture = pcap_header(">", 0xa1b23c4d, 101) + pcap_record(10, 500000000, b"\x45" + b"\x00" * 27, ">")
+
+    assert read(capture) == [(1, 10.5, 101, b"\x45" + b"\x00" * 27)]
+
+
+def test_truncated_last_record_is_dropped():
+    capture = pcap_header() + pcap_record(1, 0, b"a" * 40) + pcap_record(2, 0, b"b" * 40)[:-10]
+
+    assert [number for number, _, _, _ in read(capture)] == [1]
+
+
+def test_pcapng_tsresol_tsoffset_and_simple_packets():
+    # Microsecond interface (the default resolution) offset by 100 seconds, then a simple packet block
+    options = struct.pack("<HHq", 14, 8, 100) + struct.pack("<HH", 0, 0)
+    capture = synthetic.pcapng_block(0x0a0d0d0a, struct.pack("<IHHq", 0x1a2b3c4d, 1, 0, -1)) + \
+        synthetic.pcapng_block(0x00000001, struct.pack("<HHI", 228, 0, 65535) + options) + \
+        synthetic.pcapng_block(0x00000006, struct.pack("<IIIII", 0, 0, 2500000, 4, 4) + b"data") + \
+        synthetic.pcapng_block(0x00000003, struct.pack("<I", 6) + b"simple")
+
+    assert read(capture) == [(1, 102.5, 228, b"data"), (2, 0.0, 228, b"simple")]
+
+
+def test_unsupported_and_empty_captures(tmp_path):
+    with pytest.raises(ValueError):
+        Pcap_Reader(b"not a capture")
+    with pytest.raises(ValueError):
+        Pcap_Reader(b"")
+    empty = tmp_path / "empty.pcap"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError):
+        Pcap_Reader(str(empty))
+
+
+@pytest.mark.parametrize("pcapng", [False, True])
+def test_chunks_cover_every_frame_once(tmp_path, pcapng):
+    messages = callee_bye_call("call-1") + callee_bye_call("call-2", "f2", "t2")
+    path = write_capture(tmp_path / "calls.pcap", messages, pcapng=pcapng)
+    expected = read(path)
+
+    with Pcap_Reader(path) as reader:
+        chunks = reader.chunks(4)
+        chunked = [(frame.number, frame.timestamp, frame.linktype, bytes(frame.data))
+                   for chunk in chunks for frame in reader.chunk_frames(chunk)]
+
+    assert len(chunks) == 4
+    assert chunked == expected
+    assert all(chunk.first_timestamp == expected[0][1] for chunk in chunks)
+
+
+def test_new_frames_resume_a_growing_capture(tmp_path):
+    messages = callee_bye_call()
+    path = tmp_path / "growing.pcap"
+    write_capture(path, messages[:3])
+
+    with Pcap_Reader(str(path)) as reader:
+        assert [frame.number for frame in reader] == [1, 2, 3]
+        with open(path, "ab") as output:
+            for timestamp, frame in frames(messages)[3:]:
+                output.write(pcap_record(int(timestamp), 0, frame))
+        assert reader.refresh()
+        assert [frame.number for frame in reader.new_frames()] == [4, 5, 6, 7]
+        assert not reader.refresh()
@@ -0,0 +1,121 @@
+import os
+import threading
+
+import pytest
+
+from sipp import capture, pipeline
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture, write_timed_capture
+
+
+def square(value):
+    return value * value
+
+
+def test_batched():
+    assert list(pipeline.batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(pipeline.batched([], 3)) == []
+
+
+def test_background_producer_is_bounded_and_stops_when_closed():
+    produced = []
+    stopped = threading.Event()
+
+    def producer():
+        try:
+            for value in range(1000):
+                produced.append(value)
+                yield value
+        finally:
+            stopped.set()
+
+    items = pipeline.background(producer(), depth=2)
+    assert [next(items) for _ in range(3)] == [0, 1, 2]
+    # At most depth items wait in the queue, plus the one the producer is blocked handing over
+    assert len(produced) <= 3 + 2 + 1
+    items.close()
+    assert stopped.wait(1)
+
+
+def test_background_reraises_producer_errors():
+    def producer():
+        yield 1
+        raise KeyError("broken")
+
+    items = pipeline.background(producer())
+    assert next(items) == 1
+    with pytest.raises(KeyError):
+        next(items)
+
+
+def test_process_map_keeps_the_input_order():
+    assert list(pipeline.process_map(square, range(20), jobs=2, depth=3)) == [value * value for value in range(20)]
+
+
+def convert(path, output_directory, pipelined, jobs=1):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True, jobs=jobs,
+                        output_directory=str(output_directory))
+    if pipelined:
+        index = parser.pipeline_to_xml(path, "1111", "2222", "test")
+    else:
+        parser.load_pcap_as_dict(path)
+        index = parser.save_dialogs_to_xml("1111", "2222", "test")
+    scenarios = {}
+    for entry in index:
+        for role in ("UAC", "UAS"):
+            with open(os.path.join(output_directory, entry[role])) as scenario:
+                scenarios[entry[role]] = scenario.read()
+    return parser, index, scenarios
+
+
+def assert_same_output(path, tmp_path, jobs=1):
+    _, index, scenarios = convert(path, tmp_path / "staged", False)
+    parser, pipelined_index, pipelined_scenarios = convert(path, tmp_path / "pipelined", True, jobs)
+
+    assert pipelined_scenarios == scenarios
+    assert [{key: value for key, value in entry.items() if key != "outcome"} for entry in pipelined_index] == index
+    assert parser.live is not None and parser.live.late_messages == 0
+    return pipelined_index
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_pipelined_dialogs_match_the_staged_conversion(tmp_path, jobs):
+    messages = []
+    for number in range(6):
+        messages += callee_bye_call(f"call-{number}", f"f{number}", f"t{number}")
+    path = write_capture(tmp_path / "calls.pcap", messages, step=0.01)
+
+    index = assert_same_output(path, tmp_path, jobs)
+
+    assert all(entry["outcome"] == "completed" for entry in index)
+
+
+def test_long_calls_are_not_cut_short_or_reordered(tmp_path):
+    timed = []
+    for number in range(20):
+        call = callee_bye_call(f"call-{number}", f"f{number}", f"t{number}")
+        start = number * 1.0
+        # Every other call is hung up two minutes after its ACK, the rest after 5 seconds
+        hang_up = start + (120.0 if number % 2 == 0 else 5.0)
+        timed += [(start + index * 0.01, message) for index, message in enumerate(call[:5])]
+        timed += [(hang_up + index * 0.01, message) for index, message in enumerate(call[5:])]
+    path = write_timed_capture(tmp_path / "long.pcap", timed)
+
+    index = assert_same_output(path, tmp_path)
+
+    assert [entry["call_id"] for entry in index] == [f"call-{number}" for number in range(20)]
+    assert all((entry["outcome"], entry["messages"]) == ("completed", {"UAC": 7, "UAS": 7}) for entry in index)
+
+
+def test_unfinished_calls_are_written_at_the_end(tmp_path):
+    # The first call never hangs up, the others wait for it and come out in order with it at the end
+    messages = callee_bye_call("call-0")[:5]
+    for number in range(1, 4):
+        messages += callee_bye_call(f"call-{number}", f"f{number}", f"t{number}")
+    path = write_capture(tmp_path / "calls.pcap", messages, step=10.0)
+
+    index = assert_same_output(path, tmp_path)
+
+    assert [(entry["call_id"], entry["outcome"]) for entry in index] == \
+        [("call-0", "flushed"), ("call-1", "completed"), ("call-2", "completed"), ("call-3", "completed")]
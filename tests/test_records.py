@@ -0,0 +1,80 @@
+from sipp import capture, metrics
+from sipp.parser import DIR, SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+
+def parse(path, **options):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, quiet=True, **options)
+    parser.load_pcap_as_dict(path)
+    return parser
+
+
+def test_roles_share_one_record_per_packet(tmp_path):
+    parser = parse(write_capture(tmp_path / "call.pcap", callee_bye_call()))
+    uac, uas = parser.pcap_dict["UAC"], parser.pcap_dict["UAS"]
+
+    assert all(client.record is server.record for client, server in zip(uac, uas))
+    assert [msg.direction for msg in uac] == [DIR.SEND, DIR.RECV, DIR.RECV, DIR.RECV, DIR.SEND, DIR.RECV, DIR.SEND]
+    assert all(client.direction != server.direction for client, server in zip(uac, uas))
+    assert parser.metrics.counters[metrics.MESSAGES] == 14
+
+
+def test_responses_read_as_status_line_when_sent_and_code_when_received(tmp_path):
+    parser = parse(write_capture(tmp_path / "call.pcap", callee_bye_call()))
+    ringing_uac, ringing_uas = parser.pcap_dict["UAC"][2], parser.pcap_dict["UAS"][2]
+
+    assert ringing_uac.method == "180"
+    assert ringing_uas.method == "SIP/2.0 180 Ringing"
+    assert ringing_uac.cseq_method == "INVITE"
+    assert ringing_uac.sdp == "" and parser.pcap_dict["UAC"][3].sdp.startswith("v=0\no=- 1 1 IN IP4 [local_ip]")
+
+
+def test_records_keep_only_whitelisted_headers_undecoded(tmp_path):
+    invite = callee_bye_call()[0]
+    payload = invite[2].replace(b"CSeq: 1 INVITE\r\n",
+                                b"CSeq: 1 INVITE\r\nContact: <sip:alice@10.0.0.1>\r\nUser-Agent: phone\r\n"
+                                b"X-Trace: abc\r\nx-trace: def\r\nSubject: dropped\r\n")
+    path = write_capture(tmp_path / "call.pcap", [(invite[0], invite[1], payload)] + callee_bye_call()[1:])
+
+    default = parse(path).pcap_dict["UAC"][0]
+    custom = parse(path, header_whitelist=("X-Trace",)).pcap_dict["UAC"][0]
+
+    assert not hasattr(default.record, "__dict__")
+    assert isinstance(default.record.headers, bytes)
+    assert default.header == {"Contact": "<sip:alice@10.0.0.1>", "User-Agent": "phone"}
+    assert custom.header == {"X-Trace": "abc, def"}
+    # Nothing kept at all leaves no header storage behind
+    assert parse(path, header_whitelist=()).pcap_dict["UAC"][0].record.headers is None
+
+
+class Pyshark_Layer:
+    # pyshark keeps the raw field names in _all_fields and exposes sanitized lowercase attribute names
+    def __init__(self, fields):
+        self._all_fields = fields
+
+    @property
+    def field_names(self):
+        return [name.replace("sip.", "").replace("-", "_").replace(".", "_").lower() for name in self._all_fields]
+
+
+class Pyshark_Packet:
+    def __init__(self, fields):
+        self.sip = Pyshark_Layer(fields)
+        self.sniff_timestamp = "1000.5"
+
+
+def test_pyshark_records_keep_whitelisted_headers():
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.PYSHARK, quiet=True,
+                        header_whitelist=("Contact", "User-Agent", "Call-ID"))
+    packet = Pyshark_Packet({
+        "sip.Request-Line": "INVITE sip:bob@10.0.0.2 SIP/2.0", "sip.Method": "INVITE",
+        "sip.Call-ID": "call-1", "sip.from.tag": "f1", "sip.CSeq": "1 INVITE",
+        "sip.Contact": "<sip:alice@10.0.0.1>", "sip.contact.uri": "sip:alice@10.0.0.1",
+        "sip.User-Agent": "phone", "sip.Server": "not kept"})
+    ip_layer = Pyshark_Layer({"ip.src": CALLER, "ip.dst": CALLEE})
+
+    record = parser._SIP_Parser__parse_pyshark_record(packet, ip_layer)  # type: ignore
+
+    assert record.headers == {"Call-ID": "call-1", "Contact": "<sip:alice@10.0.0.1>", "User-Agent": "phone"}
+    assert (record.method, record.call_id, record.from_tag, record.timestamp) == ("INVITE", "call-1", "f1", 1000.5)
@@ -0,0 +1,75 @@
+import socket
+
+import pytest
+
+from sipp import api, capture
+from sipp.capture.address_table import Address_Table, parse_endpoints
+from sipp.parser import DIR, SIP_Parser
+from sipp.roles import Role_Index, parse_role
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+PROXY = "10.0.0.3"
+
+
+def test_endpoints_are_normalized():
+    assert parse_endpoints("10.0.0.1, 10.0.1.7/24,10.0.0.1/32") == ["10.0.0.1", "10.0.1.0/24"]
+    assert parse_endpoints(["10.0.0.1", "10.0.0.2,10.0.0.1"]) == ["10.0.0.1", "10.0.0.2"]
+    with pytest.raises(ValueError):
+        parse_endpoints("10.0.0.256")
+    with pytest.raises(ValueError):
+        parse_endpoints(" , ")
+    assert parse_role("EDGE=10.0.0.3,10.1.0.0/16") == ("EDGE", ["10.0.0.3", "10.1.0.0/16"])
+    with pytest.raises(ValueError):
+        parse_role("EDGE")
+
+
+def test_address_table_matches_addresses_and_every_enclosing_range():
+    table = Address_Table()
+    table.add("10.0.0.0/8", "wide")
+    table.add("10.1.0.0/16", "narrow")
+    table.add("10.1.2.3", "host")
+    table.add("10.1.2.3/32", "other host")
+
+    assert table.lookup("10.1.2.3") == ("host", "other host", "narrow", "wide")
+    assert table.lookup("10.1.9.9") == ("narrow", "wide")
+    assert table.lookup_packed(socket.inet_aton("10.200.0.1")) == ("wide",)
+    assert table.lookup("192.168.0.1") == ()
+    assert table.lookup("not an address") == ()
+    # Adding an entry drops cached answers
+    table.add("192.168.0.0/24", "lan")
+    assert table.lookup("192.168.0.1") == ("lan",)
+
+
+def test_role_labels_are_checked():
+    with pytest.raises(ValueError):
+        Role_Index(CALLER, CALLEE, [("bad label", ["10.0.0.3"])])
+    with pytest.raises(ValueError):
+        Role_Index(CALLER, CALLEE, [("UAC", ["10.0.0.3"])])
+    index = Role_Index("10.0.0.0/31", CALLEE, [("PROXY", [PROXY, CALLEE])])
+    assert index.labels == ["UAC", "UAS", "PROXY"]
+    assert index.roles_of(CALLEE) == ("UAS", "PROXY")
+    assert index.addresses() == ["10.0.0.0/31", CALLEE, PROXY]
+
+
+# The call through a proxy, every message is seen on the caller / proxy leg and again on the proxy / callee
+# leg
+def proxied_call():
+    messages = []
+    for src, dst, payload in callee_bye_call():
+        messages.append((src, PROXY, payload) if src == CALLER else (PROXY, dst, payload))
+        messages.append((PROXY, dst, payload) if src == CALLER else (src, PROXY, payload))
+    return messages
+
+
+def test_extra_roles_get_scenarios_of_their_own(tmp_path):
+    path = write_capture(tmp_path / "proxied.pcap", proxied_call())
+    parser = SIP_Parser("10.0.0.0/31", CALLEE, True, capture.NATIVE, quiet=True, roles=[parse_role(f"PROXY={PROXY}")])
+    parser.load_pcap_as_dict(path)
+
+    assert {role: len(messages) for role, messages in parser.pcap_dict.items()} == {"UAC": 7, "UAS": 7, "PROXY": 14}
+    assert [msg.direction for msg in parser.pcap_dict["PROXY"][:2]] == [DIR.RECV, DIR.SEND]
+
+    scenarios = api.convert(path, "10.0.0.0/31", CALLEE, proxy=True, roles=[parse_role(f"PROXY={PROXY}")])
+    assert set(scenarios) == {"UAC", "UAS", "PROXY"}
+    assert all(scenario for scenario in scenarios.values())
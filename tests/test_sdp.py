@@ -0,0 +1,59 @@
+from sipp import sdp
+
+BODY = "v=0\r\no=- 1 1 IN IP4 10.0.0.1\r\ns=-\r\nc=IN IP4 10.0.0.1\r\nt=0 0\r\n" \
+       "m=audio 4000 RTP/AVP 0 101\r\na=rtcp:4001\r\na=fmtp:101 0-15\r\n" \
+       "m=video 4002/2 RTP/AVP 96\r\nc=IN IP4 10.0.0.9/127\r\n" \
+       "m=text 0 RTP/AVP 98\r\n"
+
+
+def test_addresses_and_media_ports_are_rewritten():
+    assert sdp.normalize(BODY).split("\n") == [
+        "v=0",
+        "o=- 1 1 IN IP4 [local_ip]",
+        "s=-",
+        "c=IN IP4 [local_ip]",
+        "t=0 0",
+        "m=audio [media_port] RTP/AVP 0 101",
+        "a=rtcp:[media_port+1]",
+        "a=fmtp:101 0-15",
+        "m=video [media_port+2]/2 RTP/AVP 96",
+        "c=IN IP4 [local_ip]/127",
+        "m=text 0 RTP/AVP 98",
+    ]
+
+
+def test_single_line_bodies_are_split_on_line_types():
+    body = "v=0 o=- 1 1 IN IP4 1.2.3.4 a=fmtp:111 minptime=10 m=audio 5000 RTP/AVP 0"
+
+    assert sdp.normalize(body).split("\n") == \
+        ["v=0", "o=- 1 1 IN IP4 [local_ip]", "a=fmtp:111 minptime=10", "m=audio [media_port] RTP/AVP 0"]
+    assert sdp.normalize("v=0\\xd\\xam=audio 5000 RTP/AVP 0") == "v=0\nm=audio [media_port] RTP/AVP 0"
+
+
+def test_media_endpoints_use_the_most_specific_connection_line():
+    assert sdp.media_endpoints(BODY) == (("audio", "10.0.0.1", 4000), ("video", "10.0.0.9", 4002))
+    assert sdp.media_endpoints("v=0\nc=IN IP6 ::1\nm=audio 4000 RTP/AVP 0") == ()
+
+
+def test_custom_rules_and_port_offsets():
+    rewriter = sdp.SDP_Rewriter(rules=sdp.DEFAULT_RULES + [sdp.Rule("s", r".+", "[service]"),
+                                                           sdp.Rule("a", r"^ptime:\d+", "ptime:20")],
+                                port_offsets={"audio": 4})
+
+    normalized = rewriter.normalize("v=0\ns=Talk to 10.0.0.1\nm=audio 4000 RTP/AVP 0\na=ptime:30\na=rtcp:4001")
+
+    assert normalized.split("\n") == \
+        ["v=0", "s=[service]", "m=audio [media_port+4] RTP/AVP 0", "a=ptime:20", "a=rtcp:[media_port+5]"]
+    # Other media types fall back to the default offset
+    assert rewriter.normalize("m=image 5000 udptl t38") == \
+        f"m=image [media_port+{sdp.DEFAULT_MEDIA_PORT_OFFSET}] udptl t38"
+
+
+def test_identical_bodies_are_normalized_once():
+    rewriter = sdp.SDP_Rewriter()
+
+    first = rewriter.normalize(BODY)
+    second = rewriter.normalize(BODY)
+
+    assert first is second
+    assert rewriter.normalize.cache_info().hits == 1
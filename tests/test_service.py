@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from sipp import capture, service
+from sipp.service import Worker_Pool
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+
+@pytest.fixture
+def pool():
+    pool = Worker_Pool(workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_concurrent_requests_are_all_counted(pool, tmp_path):
+    with open(write_capture(tmp_path / "call.pcap", callee_bye_call()), "rb") as capture_file:
+        data = capture_file.read()
+    options = {"client": CALLER, "server": CALLEE, "backend": capture.NATIVE}
+
+    def convert(index):
+        # Every fourth request gets a capture that can't be read
+        try:
+            return pool.convert(data if index % 4 else b"not a capture", options, False)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as threads:
+        results = list(threads.map(convert, range(40)))
+
+    assert pool.status() == {"workers": 2, "requests": 40, "failures": 10}
+    assert all(set(result["scenarios"]) == {"UAC", "UAS"} for result in results if result is not None)
+
+
+def test_http_conversion(pool, tmp_path):
+    with open(write_capture(tmp_path / "call.pcap", callee_bye_call()), "rb") as capture_file:
+        data = capture_file.read()
+    server = service.create_server(pool, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{service.DEFAULT_HOST}:{server.socket.getsockname()[1]}"
+
+    def post(query, body=data):
+        request = urllib.request.Request(f"{url}/convert?{query}", data=body, method="POST")
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers["Content-Type"], response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers["Content-Type"], e.read()
+
+    try:
+        status, _, body = post(f"client={CALLER}&server={CALLEE}")
+        assert status == 200 and set(json.loads(body)["scenarios"]) == {"UAC", "UAS"}
+        status, content_type, body = post(f"client={CALLER}&server={CALLEE}&role=UAS&scen_name=test")
+        assert (status, content_type) == (200, "application/xml")
+        assert b'<scenario name="test">' in body
+        status, _, body = post(f"client={CALLER}&server={CALLEE}&per_dialog=1")
+        assert [dialog["call_id"] for dialog in json.loads(body)["dialogs"]] == ["call-1"]
+        assert post(f"client={CALLER}")[0] == 400
+        assert post(f"client={CALLER}&server={CALLEE}&backend=other")[0] == 400
+        with urllib.request.urlopen(f"{url}/health") as response:
+            assert json.loads(response.read()) == {"status": "ok", "workers": 2, "requests": 3, "failures": 0}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+# Stands in for Worker_Pool, every conversion fails with error
+class Failing_Pool:
+    def __init__(self, error):
+        self.error = error
+
+    def convert(self, data, options, per_dialog):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, status", [
+    (ValueError("No SIP-enabled packets matching client 10.0.0.1 found in capture!"), 400),
+    (RuntimeError("worker died"), 500),
+])
+def test_only_bad_input_is_a_client_error(error, status):
+    server = service.create_server(Failing_Pool(error), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{service.DEFAULT_HOST}:{server.socket.getsockname()[1]}"
+    request = urllib.request.Request(f"{url}/convert?client={CALLER}&server={CALLEE}", data=b"capture",
+                                     method="POST")
+    try:
+        with pytest.raises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(request)
+        assert raised.value.code == status
+        assert json.loads(raised.value.read()) == {"error": str(error)}
+    finally:
+        server.shutdown()
+        server.server_close()
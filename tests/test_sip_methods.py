@@ -0,0 +1,62 @@
+import pytest
+
+from sipp import sip_methods
+from sipp.agent.sipp_agent import SIPP_Agent
+from sipp.agent.xml_writer import format_action
+from sipp.sip_methods import Methods
+
+SDP = "v=0\no=- 1 1 IN IP4 [local_ip]\ns=-\nc=IN IP4 [local_ip]\nt=0 0\nm=audio [media_port] RTP/AVP 0"
+
+ARGUMENTS = {
+    "caller": "1111", "callee": "2222", "scenario_name": "test", "routes": "[routes]", "subscriber": "3333",
+    "event": "presence", "response_code": "SIP/2.0 180 Ringing", "contact": "<sip:[local_ip]:[local_port]>"
+}
+
+
+def agent(counter=3):
+    sipp_agent = SIPP_Agent(1, "test", False, True)
+    sipp_agent.message_counter = counter
+    return sipp_agent
+
+
+# What the agent rendered before templates were compiled: the method evaluated with the real arguments
+# and the whole action re-indented
+def evaluated(method, sipp_agent, arguments):
+    function = Methods.response if method is None else Methods.call[method]
+    return "".join(format_action(f"""
+        <send>
+            {function(sipp_agent, arguments)}
+        </send>
+        """))
+
+
+@pytest.mark.parametrize("method", [None] + sip_methods.SIP_HEADERS)
+@pytest.mark.parametrize("proxy", [False, True])
+@pytest.mark.parametrize("sdp", ["", SDP])
+def test_compiled_templates_render_what_the_methods_evaluate_to(method, proxy, sdp):
+    arguments = dict(ARGUMENTS, proxy=proxy, sdp=sdp)
+
+    assert Methods().render(method, agent(), arguments) == evaluated(method, agent(), arguments)
+
+
+def test_branch_counter_is_filled_in_after_the_cache():
+    arguments = dict(ARGUMENTS, proxy=False, sdp="")
+
+    first = Methods().render("ACK", agent(3), arguments)
+    second = Methods().render("ACK", agent(4), arguments)
+
+    assert "[branch-3]" in first and "[branch-4]" in second
+    assert first.replace("[branch-3]", "[branch-4]") == second
+
+
+def test_templates_are_compiled_once_per_variant():
+    sip_methods.compiled_templates.clear()
+    sip_methods.render_template.cache_clear()
+    methods = Methods()
+
+    for caller in ("1111", "1112", "1111"):
+        methods.render("BYE", agent(), dict(ARGUMENTS, caller=caller, proxy=False, sdp=""))
+    methods.render("BYE", agent(), dict(ARGUMENTS, proxy=True, sdp=""))
+
+    assert set(sip_methods.compiled_templates) == {("BYE", False, False), ("BYE", True, False)}
+    assert sip_methods.render_template.cache_info().hits == 1
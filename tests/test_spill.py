@@ -0,0 +1,69 @@
+import os
+
+from sipp import capture, spill
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, caller_bye_call, write_capture
+
+
+def calls_capture(tmp_path):
+    messages = []
+    for number in range(6):
+        call = callee_bye_call if number % 2 else caller_bye_call
+        messages += call(f"call-{number}", f"f{number}", f"t{number}")
+    return write_capture(tmp_path / "calls.pcap", messages)
+
+
+def scenarios(directory):
+    contents = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(".xml"):
+                with open(os.path.join(root, name)) as scenario:
+                    contents[(os.path.basename(root).split("_", 1)[1], name)] = scenario.read()
+    return contents
+
+
+def test_buckets_hold_whole_calls_and_flush_at_the_limit(tmp_path):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, quiet=True)
+    parser.load_pcap_as_dict(calls_capture(tmp_path))
+    buckets = spill.Spill_Buckets(4, memory_limit=2000, directory=str(tmp_path / "spill"))
+
+    for role in parser.roles:
+        for msg in parser.pcap_dict[role]:
+            buckets.add(role, msg)
+            assert buckets.buffered < 2000
+    files = buckets.files()
+
+    read_back = [list(spill.read_bucket(path)) for path in files]
+    assert buckets.counts == {"UAC": 42, "UAS": 42}
+    assert sum(len(entries) for entries in read_back) == 84
+    # Every call is read back from a single bucket, in capture order
+    for number in range(6):
+        holding = [entries for entries in read_back if any(msg.call_id == f"call-{number}" for _, msg in entries)]
+        assert len(holding) == 1
+        timestamps = [msg.timestamp for role, msg in holding[0] if role == "UAC" and msg.call_id == f"call-{number}"]
+        assert len(timestamps) == 7 and timestamps == sorted(timestamps)
+    buckets.remove()
+    assert os.listdir(tmp_path / "spill") == []
+
+
+def test_spilled_conversion_matches_the_in_memory_one(tmp_path):
+    path = calls_capture(tmp_path)
+    in_memory = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True,
+                           output_directory=str(tmp_path / "memory"))
+    in_memory.load_pcap_as_dict(path)
+    in_memory.save_dialogs_to_xml("1111", "2222", "test")
+    spilled = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, quiet=True, memory_limit=4096, spill_buckets=3,
+                         output_directory=str(tmp_path / "spilled"))
+    spilled.load_pcap_as_dict(path)
+    index = spilled.save_spilled_to_xml("1111", "2222", "test", jobs=2)
+
+    assert len(index) == 6
+    # Bucket entries are rebased onto the index's directory
+    assert all(entry["directory"].startswith("bucket_") and (tmp_path / "spilled" / entry["UAC"]).is_file()
+               for entry in index)
+    assert scenarios(tmp_path / "spilled") == scenarios(tmp_path / "memory")
+    assert len(scenarios(tmp_path / "memory")) == 12
+    # The temporary spill directory is gone once the buckets are rendered
+    assert spilled.spill is not None and not os.path.exists(spilled.spill.directory)
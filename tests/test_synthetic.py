@@ -0,0 +1,29 @@
+from sipp import capture, synthetic
+from sipp.capture.sip_decoder import parse_sip
+from sipp.parser import SIP_Parser
+
+
+def test_callee_requests_swap_from_and_to():
+    frames = synthetic.call_frames(7, "prack", 0.0, 0, 0)
+    bye, ok = [parse_sip(frame[42:]) for _, frame in frames[-2:]]
+
+    assert bye is not None and ok is not None
+    assert bye.method == "BYE"
+    assert (bye.from_tag, bye.to_tag) == ("t7", "f7")
+    assert (bye.header("From") or "").startswith("<sip:2000000007@")
+    assert ok.status_code == "200"
+    assert (ok.from_tag, ok.to_tag) == ("t7", "f7")
+
+
+def test_every_generated_call_is_one_dialog(tmp_path):
+    path = str(tmp_path / "calls.pcapng")
+    synthetic.write_capture(path, 40, {"basic": 1, "prack": 1, "cancel": 1, "reject": 1})
+
+    parser = SIP_Parser(synthetic.CLIENT_ADDRESS, synthetic.SERVER_ADDRESS, False, capture.NATIVE,
+                        per_dialog=True, quiet=True)
+    parser.load_pcap_as_dict(path)
+    assert parser.dialog_index is not None
+    dialogs = list(parser.dialog_index.dialogs())
+
+    assert len(dialogs) == 40
+    assert len({dialog.call_id for dialog in dialogs}) == 40
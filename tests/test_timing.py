@@ -0,0 +1,55 @@
+import io
+import xml.etree.ElementTree as ElementTree
+
+from sipp import capture, timing
+from sipp.parser import DIR, SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, caller_bye_call, write_capture
+
+
+def test_pause_ms():
+    assert timing.pause_ms(10.0, 10.5) == 500
+    assert timing.pause_ms(10.0, 10.5, time_scale=0.1) == 50
+    assert timing.pause_ms(10.0, 10.5, time_scale=0.01) is None
+    assert timing.pause_ms(10.0, 10.5, time_scale=0) is None
+    assert timing.pause_ms(10.0, 10.04) is None
+    assert timing.pause_ms(10.0, 10.04, threshold_ms=10) == 40
+    assert timing.pause_ms(None, 10.0) is None
+
+
+def parse(tmp_path, messages, **options):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, quiet=True, **options)
+    parser.load_pcap_as_dict(write_capture(tmp_path / "call.pcap", messages, step=1.0))
+    sinks = {"UAC": io.BytesIO(), "UAS": io.BytesIO()}
+    parser.stream_pcap_to_xml(sinks, "1111", "2222", "test")
+    return parser, {role: ElementTree.fromstring(sink.getvalue()) for role, sink in sinks.items()}
+
+
+def test_requests_are_paired_with_their_final_response(tmp_path):
+    parser, _ = parse(tmp_path, caller_bye_call())
+    uac = parser.pcap_dict["UAC"]
+
+    starts, stops = timing.response_time_pairs(uac, DIR.SEND, DIR.RECV)
+
+    # INVITE -> 200 and BYE -> 200, the 100 / 180 don't stop the INVITE's timer and the ACK has no response
+    assert starts == {0: "invite", 5: "bye"}
+    assert stops == {3: "invite", 6: "bye"}
+    assert timing.status_code(uac[2]) == 180 and timing.status_code(uac[0]) is None
+
+
+def test_scenarios_pause_before_sent_messages(tmp_path):
+    _, scenarios = parse(tmp_path, callee_bye_call(), time_scale=0.5)
+
+    # Gaps are measured from the role's previous message, whichever way it went: every message is sent
+    # one capture second (halved) after the one before it
+    assert [pause.get("milliseconds") for pause in scenarios["UAC"].iter("pause")] == ["500", "500"]
+    assert [pause.get("milliseconds") for pause in scenarios["UAS"].iter("pause")] == ["500"] * 4
+    # The pause goes in right before the message it holds back
+    actions = [action.tag for action in scenarios["UAC"]]
+    assert actions[actions.index("pause") + 1] == "send"
+
+
+def test_time_scale_zero_disables_pauses(tmp_path):
+    _, scenarios = parse(tmp_path, callee_bye_call(), time_scale=0)
+
+    assert all(len(list(scenario.iter("pause"))) == 0 for scenario in scenarios.values())
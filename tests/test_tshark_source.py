@@ -0,0 +1,111 @@
+import sys
+
+import pytest
+
+from sipp.capture import tshark_source
+from sipp.capture.tshark_source import AGGREGATOR, FIELDS, PAYLOAD_FIELDS
+
+from helpers import CALLEE, CALLER, callee_bye_call, sdp_body
+
+
+# One line of tshark -T fields output, fields not given are printed empty
+def fields_line(payload=True, **values):
+    fields = FIELDS + (PAYLOAD_FIELDS if payload else [])
+    return "\t".join(values.get(field.replace(".", "_").replace("-", "_"), "") for field in fields) + "\n"
+
+
+def invite_line(payload=True, **values):
+    fields = {
+        "frame_number": "1", "frame_time_epoch": "1000.5", "ip_src": CALLER, "ip_dst": CALLEE,
+        "udp_srcport": "5060", "udp_dstport": "5060", "sip_Method": "INVITE", "sip_Call_ID": "call-1",
+        "sip_CSeq": "1 INVITE", "sip_from_tag": "f1", "sip_Content_Type": "application/sdp",
+        "sip_Content_Length": str(len(sdp_body(CALLER))), "udp_payload": callee_bye_call()[0][2].hex(),
+    }
+    fields.update(values)
+    return fields_line(payload, **fields)
+
+
+def test_body_from_msg_body():
+    [packet] = tshark_source.parse_line(invite_line(False, sip_msg_body=sdp_body(CALLER).hex(":")))
+
+    assert packet.body == sdp_body(CALLER)
+    assert (packet.method, packet.from_tag, packet.to_tag) == ("INVITE", "f1", None)
+    assert packet.headers == {"Call-ID": "call-1", "CSeq": "1 INVITE", "Content-Type": "application/sdp"}
+
+
+def test_payload_fields_are_only_requested_when_needed():
+    assert "udp.payload" not in tshark_source.tshark_command("in.pcap", "sip")
+    assert tshark_source.tshark_command("in.pcap", "sip", payload=True)[-4:] == \
+        ["-e", "udp.payload", "-e", "tcp.payload"]
+
+
+def test_missing_msg_body_without_payload_fields():
+    with pytest.raises(tshark_source.Body_Unavailable):
+        tshark_source.parse_line(invite_line(False, sip_msg_body="Message Body"))
+
+    [packet] = tshark_source.parse_line(invite_line(False, sip_Content_Type="", sip_Content_Length="0"))
+    assert packet.body == b""
+
+
+def test_empty_msg_body_falls_back_to_the_payload():
+    [packet] = tshark_source.parse_line(invite_line(), payload=True)
+
+    assert packet.body == sdp_body(CALLER)
+
+
+def test_msg_body_label_falls_back_to_the_payload():
+    [packet] = tshark_source.parse_line(invite_line(sip_msg_body="Message Body"), payload=True)
+
+    assert packet.body == sdp_body(CALLER)
+
+
+def test_tunnelled_message_uses_the_inner_payload():
+    tunnel = "ab" * 8
+    line = invite_line(ip_src="192.168.0.1" + AGGREGATOR + CALLER, ip_dst="192.168.0.2" + AGGREGATOR + CALLEE,
+                       udp_payload=tunnel + AGGREGATOR + callee_bye_call()[0][2].hex())
+
+    packets = tshark_source.parse_line(line, payload=True)
+
+    assert [(packet.src, packet.dst) for packet in packets] == [("192.168.0.1", "192.168.0.2"), (CALLER, CALLEE)]
+    assert all(packet.body == sdp_body(CALLER) for packet in packets)
+
+
+def test_short_lines_are_skipped():
+    assert tshark_source.parse_line("1\t1000.5\n") == []
+
+
+# Stands in for a tshark whose -T fields output has no sip.msg_body, only the payload fields carry the body
+def fake_tshark(tmp_path, lines, payload_lines):
+    (tmp_path / "lines").write_text("".join(lines))
+    (tmp_path / "payload_lines").write_text("".join(payload_lines))
+    (tmp_path / "runs").write_text("")
+    script = tmp_path / "tshark"
+    script.write_text(f"""#!{sys.executable}
+import sys
+name = "payload_lines" if "udp.payload" in sys.argv else "lines"
+with open({str(tmp_path / "runs")!r}, "a") as runs:
+    runs.write(name + "\\n")
+sys.stdout.write(open({str(tmp_path)!r} + "/" + name).read())
+""")
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_capture_is_read_again_with_the_payload_fields_from_where_it_stopped(tmp_path, monkeypatch):
+    monkeypatch.setattr(tshark_source, "PAYLOAD_NEEDED", set())
+    bye = dict(frame_number="3", sip_Method="BYE", sip_CSeq="2 BYE", sip_Content_Type="", sip_Content_Length="0",
+               udp_payload="")
+    lines = [invite_line(False, frame_number="1", sip_msg_body=sdp_body(CALLER).hex()),
+             invite_line(False, frame_number="2"), invite_line(False, **bye)]
+    payload_lines = [invite_line(frame_number="1"), invite_line(frame_number="2"), invite_line(True, **bye)]
+    tshark = fake_tshark(tmp_path, lines, payload_lines)
+
+    packets = list(tshark_source.read_sip_packets("in.pcap", tshark=tshark))
+
+    assert [(packet.number, packet.method) for packet in packets] == [(1, "INVITE"), (2, "INVITE"), (3, "BYE")]
+    assert [packet.body for packet in packets] == [sdp_body(CALLER), sdp_body(CALLER), b""]
+    assert tshark_source.PAYLOAD_NEEDED == {tshark}
+
+    # The next capture asks for the payload fields straight away
+    list(tshark_source.read_sip_packets("in.pcap", tshark=tshark))
+    assert (tmp_path / "runs").read_text().split() == ["lines", "payload_lines", "payload_lines"]
@@ -0,0 +1,83 @@
+import pytest
+
+from sipp import capture, metrics
+from sipp.capture import native_source
+from sipp.parser import SIP_Parser
+from sipp.roles import parse_role
+
+from helpers import CALLEE, CALLER, callee_bye_call, caller_bye_call, write_capture
+
+
+def two_calls(tmp_path):
+    return write_capture(tmp_path / "calls.pcap", callee_bye_call("call-1") + caller_bye_call("call-2", "f2", "t2"))
+
+
+def methods(parser, role):
+    return [(msg.call_id, msg.record.method or msg.record.status_code) for msg in parser.pcap_dict[role]]
+
+
+def test_worker_parser_shares_the_settings():
+    parser = SIP_Parser(CALLER, CALLEE, True, capture.NATIVE, time_scale=0.5, pause_threshold=10, quiet=True,
+                        header_whitelist=("Call-ID", "CSeq"), roles=[parse_role("PROXY=10.0.0.3")])
+
+    worker = parser.worker_settings().parser(per_dialog=True, quiet=False)
+
+    assert worker.roles == parser.roles
+    assert (worker.uac_ip, worker.uas_ip, worker.proxy, worker.backend) == (CALLER, CALLEE, True, capture.NATIVE)
+    assert (worker.time_scale, worker.pause_threshold) == (0.5, 10)
+    assert worker.header_whitelist == parser.header_whitelist
+    assert worker.capture_filter is parser.capture_filter
+    assert worker.dialog_index is not None and not worker.quiet
+
+
+def test_pipelined_load_matches_a_plain_load(tmp_path):
+    path = two_calls(tmp_path)
+    plain = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, quiet=True)
+    plain.load_pcap_as_dict(path)
+    pipelined = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, quiet=True)
+    pipelined.load_pcap_as_dict(path, pipelined=True)
+
+    for role in plain.roles:
+        assert methods(pipelined, role) == methods(plain, role)
+    assert len(plain.pcap_dict["UAC"]) == 14
+
+
+def test_pyshark_backend_is_not_pipelined(tmp_path):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.PYSHARK, quiet=True)
+
+    with pytest.raises(ValueError):
+        parser.load_pcap_as_dict(two_calls(tmp_path), pipelined=True)
+
+
+def test_spilled_buckets_render_every_dialog(tmp_path):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, output_directory=str(tmp_path / "scenarios"),
+                        quiet=True, memory_limit=1024 * 1024, spill_directory=str(tmp_path / "spill"),
+                        spill_buckets=2)
+    parser.load_pcap_as_dict(two_calls(tmp_path))
+
+    index = parser.save_spilled_to_xml("1111", "2222", "test", jobs=1)
+
+    assert sorted((entry["call_id"], entry["to_tag"]) for entry in index) == [("call-1", "t1"), ("call-2", "t2")]
+    for entry in index:
+        assert (tmp_path / "scenarios" / entry["directory"] / "UAC.xml").exists()
+
+
+def test_chunked_parse_matches_a_single_pass(tmp_path, monkeypatch, capsys):
+    messages = []
+    for number in range(20):
+        messages += callee_bye_call(f"call-{number}", f"f{number}", f"t{number}")
+    path = write_capture(tmp_path / "calls.pcap", messages, step=0.01)
+    single = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True)
+    single.load_pcap_as_dict(path)
+
+    monkeypatch.setattr(native_source, "MIN_CHUNK_SIZE", 4096)
+    chunked = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, per_dialog=True, quiet=True, jobs=2)
+    chunked.load_pcap_as_dict(path)
+
+    assert "Parsing 8 chunks with 2 workers" in capsys.readouterr().out
+    for role in single.roles:
+        assert methods(chunked, role) == methods(single, role)
+    assert chunked.dialog_index is not None and single.dialog_index is not None
+    assert [(dialog.call_id, len(dialog.pcap_dict["UAC"])) for dialog in chunked.dialog_index.dialogs()] == \
+        [(dialog.call_id, len(dialog.pcap_dict["UAC"])) for dialog in single.dialog_index.dialogs()]
+    assert chunked.metrics.counters[metrics.FRAMES_READ] == 140
@@ -0,0 +1,99 @@
+import io
+import xml.etree.ElementTree as ElementTree
+
+from sipp import capture
+from sipp.agent.sipp_agent import SIPP_Agent
+from sipp.agent.xml_writer import Scenario_Writer, formatted_action
+from sipp.parser import SIP_Parser
+
+from helpers import CALLEE, CALLER, callee_bye_call, write_capture
+
+ACTION = """
+        <send>
+            <![CDATA[
+
+                INVITE sip:[service]@[remote_ip] SIP/2.0
+
+                Content-Length: [len]
+
+                v=0
+
+            ]]>
+        </send>
+        """
+
+
+# Tags lose their indentation, the message keeps the CDATA's plus CDATA_INDENTATION. Only the blank line
+# separating the headers from the body survives
+def test_actions_are_reindented_and_blank_lines_dropped():
+    assert formatted_action(ACTION).split("\n") == [
+        "",
+        "",
+        "<send>",
+        "            <![CDATA[",
+        "                INVITE sip:[service]@[remote_ip] SIP/2.0",
+        "                Content-Length: [len]",
+        "                ",
+        "                v=0",
+        "            ]]>",
+        "</send>",
+        "",
+    ]
+
+
+def test_writer_streams_to_paths_text_and_binary_sinks(tmp_path):
+    binary = io.BytesIO()
+    text = io.StringIO()
+    for sink in (str(tmp_path / "scenario.xml"), text, binary):
+        writer = Scenario_Writer(sink)
+        writer.begin("test")
+        writer.write("\n<pause milliseconds=\"10\"/>")
+        writer.end()
+        writer.close()
+        writer.close()
+
+    written = (tmp_path / "scenario.xml").read_text(encoding="ISO-8859-1")
+    assert written == text.getvalue() == binary.getvalue().decode("ISO-8859-1")
+    assert written.startswith("<?xml version=\"1.0\" encoding=\"ISO-8859-1\" ?>")
+    # The caller's binary sink is left open
+    assert not binary.closed
+    assert writer.metrics.stages["write"].bytes_out == len(written)
+
+
+def test_actions_queued_before_streaming_are_written_first():
+    agent = SIPP_Agent(1, "test", False, True)
+    agent.wait(100)
+    sink = io.StringIO()
+    agent.stream(sink)
+    agent.wait(200)
+    agent.close()
+
+    scenario = ElementTree.fromstring(sink.getvalue().encode("ISO-8859-1"))
+    assert [pause.get("milliseconds") for pause in scenario.iter("pause")] == ["100", "200"]
+
+
+def test_save_writes_the_same_document_as_streaming(tmp_path):
+    saved, streamed = SIPP_Agent(1, "test", False, True), SIPP_Agent(1, "test", False, True)
+    sink = io.StringIO()
+    streamed.stream(sink)
+    for agent in (saved, streamed):
+        agent.wait(100)
+        agent.recv_response("200")
+    saved.save(str(tmp_path / "UAC.xml"))
+    streamed.close()
+
+    assert (tmp_path / "UAC.xml").read_text(encoding="ISO-8859-1") == sink.getvalue()
+    assert saved.parse_scenario(ACTION) == formatted_action(ACTION)
+
+
+def test_streamed_scenarios_are_well_formed(tmp_path):
+    parser = SIP_Parser(CALLER, CALLEE, False, capture.NATIVE, quiet=True)
+    parser.load_pcap_as_dict(write_capture(tmp_path / "call.pcap", callee_bye_call()))
+    sinks = {"UAC": io.BytesIO(), "UAS": io.BytesIO()}
+
+    parser.stream_pcap_to_xml(sinks, "1111", "2222", "test")
+
+    for role, sink in sinks.items():
+        scenario = ElementTree.fromstring(sink.getvalue())
+        assert scenario.get("name") == "test"
+        assert len(list(scenario.iter("send"))) + len(list(scenario.iter("recv"))) == 7
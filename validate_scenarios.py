@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import sys
+
+from sipp import loopback
+
+
+# Play generated UAC scenarios against their UAS over local UDP, no SIPp / docker needed. Shows every pair
+# loads and plays through against itself, not that it matches the capture it came from
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check generated UAC / UAS scenario pairs load and play through against each other over loopback UDP (a self consistency check, not a comparison with the capture)")
+
+    parser.add_argument("-i", "--input", help="Directory holding UAC.xml / UAS.xml, a per dialog output directory or its index.json",
+                        default=None)
+    parser.add_argument("--uac", help="UAC scenario, with --uas instead of --input (optional)",
+                        default=None)
+    parser.add_argument("--uas", help="UAS scenario, with --uac instead of --input (optional)",
+                        default=None)
+    parser.add_argument("-m", "--calls", help="Calls played per scenario pair (optional)",
+                        type=int, default=loopback.DEFAULT_CALLS)
+    parser.add_argument("-l", "--concurrency", help="Calls in progress at the same time (optional)",
+                        type=int, default=loopback.DEFAULT_CONCURRENCY)
+    parser.add_argument("--timeout", help="Seconds a recv waits for its message, on top of the scaled pauses (optional)",
+                        type=float, default=loopback.DEFAULT_TIMEOUT)
+    parser.add_argument("--pause_scale", "--pause-scale", help="Multiplier for <pause> lengths, 0 skips them and 1 plays them as written (optional)",
+                        type=float, default=loopback.DEFAULT_PAUSE_SCALE)
+    parser.add_argument("-s", "--service", help="Value of [service], as sipp -s (optional)",
+                        default=loopback.DEFAULT_SERVICE)
+    parser.add_argument("--base_cseq", help="First [cseq] value, as sipp -base_cseq (optional)",
+                        type=int, default=loopback.DEFAULT_BASE_CSEQ)
+    parser.add_argument("--json", help="Write the per pair results and summary to this file (optional)",
+                        default=None)
+    parser.add_argument("-q", "--quiet", help="Only list the pairs that failed",
+                        default=False, action="store_true")
+    args = parser.parse_args()
+
+    if args.input is not None:
+        pairs = loopback.find_pairs(args.input)
+    elif args.uac is not None and args.uas is not None:
+        pairs = [(args.uac, args.uac, args.uas)]
+    else:
+        parser.error("either -i/--input or both --uac and --uas are required")
+
+    runner = loopback.Loopback_Runner(args.calls, args.concurrency, args.timeout, args.pause_scale,
+                                      args.service, args.base_cseq)
+    summary, results = runner.run(pairs)
+    print(loopback.summary_text(summary, results, not args.quiet))
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(dict(summary, results=[result.as_dict() for result in results]), output, indent=4)
+
+    if summary["passed_pairs"] != summary["pairs"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()